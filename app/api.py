@@ -0,0 +1,383 @@
+"""
+HTTP/JSON API over the protein data, for pipelines and scripts.
+
+Serves the dataset of the Streamlit app on the standard library's threaded
+HTTP server, reading it through the on-disk cache (see datacache.py), so it
+can run next to the app:
+    python app/api.py --port 8600
+
+Endpoints (GET or HEAD):
+    /api/v1                                     dataset version and shape
+    /api/v1/resolve?q=THBS1[&id_type=...]       ranked matches of any identifier, or
+                                                the exact SeqIds of an identifier of id_type
+    /api/v1/proteins/<SeqId>                    per-sample intensities and sample metadata
+    /api/v1/proteins/<id>?id_type=...           the same, for the best SeqId of an identifier
+    /api/v1/volcano[?column=&case=&control=]    published volcano table, or a computed contrast
+    /api/v1/plots/<SeqId>/<correlation|boxplot>.png[?id_type=...]
+
+Tables are JSON in pandas' "split" orientation (columns, then rows) by
+default, or Arrow IPC streams with ?format=arrow or
+Accept: application/vnd.apache.arrow.stream (needs pyarrow). Bodies are
+gzip-compressed for clients sending Accept-Encoding: gzip.
+
+A response depends only on the dataset version, the URL and its encoding, so
+its ETag is derived from these three and If-None-Match is answered with 304
+before any work is done. Encoded bodies are kept in a size-bounded LRU, and
+plots share the process-wide render cache.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import re
+import sys
+import threading
+import traceback
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, unquote, urlsplit
+
+import matplotlib
+matplotlib.use("Agg")
+import numpy as np
+
+from datacache import METADATA_PATH, PROTEINS_PATH, VOLCANO_PATH, load_dataset
+from dataplane import freeze
+from differential import Contrast, contrast_columns, differential_expression
+from identifiers import ID_TYPES
+from instrumentation import count, span
+from plots.Correlation import plot_correlation
+from plots.boxplot import draw_boxplot
+from plots.render import RenderCache, render_cache
+
+API_PREFIX = "/api/v1"
+JSON_TYPE = "application/json"
+ARROW_TYPE = "application/vnd.apache.arrow.stream"
+PNG_TYPE = "image/png"
+PLOT_KINDS = ["correlation", "boxplot"]
+DEFAULT_PORT = 8600
+RESPONSE_CACHE_BYTES = int(os.environ.get("SCLEROBASE_API_CACHE_MB", 64)) * 1024 * 1024
+# Computed contrasts kept per process
+MAX_CONTRASTS = 32
+
+
+class ApiError(Exception):
+    """A request that cannot be answered, with the HTTP status to answer it with."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def error_response(status, message):
+    """(status, headers, body) of an error, as a JSON body that clients must not cache."""
+    body = json.dumps({"error": message}).encode()
+    return status, {"Content-Type": JSON_TYPE, "Cache-Control": "no-store"}, body
+
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    return str(value)
+
+
+def _frame_json(frame):
+    # pandas writes NaN as null and numpy scalars as plain numbers
+    return json.loads(frame.to_json(orient="split", index=False, date_format="iso"))
+
+
+def _arrow_stream(frame, metadata):
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise ApiError(HTTPStatus.NOT_ACCEPTABLE, "Arrow responses need pyarrow; request JSON instead.") from None
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    table = table.replace_schema_metadata({
+        **(table.schema.metadata or {}),
+        **{key.encode(): json.dumps(value, default=_json_default).encode() for key, value in metadata.items()},
+    })
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+def _matches_etag(if_none_match, etag):
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or any(tag.removeprefix("W/") == etag for tag in tags)
+
+
+class ProteinApi:
+    """The API's endpoints over one loaded dataset, independent of the HTTP server."""
+
+    def __init__(self, metadata, store, volcano, cache_bytes=RESPONSE_CACHE_BYTES):
+        """
+        Parameters:
+        - metadata (pd.DataFrame), store (ProteinStore), volcano (pd.DataFrame): as returned by
+          datacache.load_dataset; they are only read.
+        - cache_bytes (int): Size bound of the cache of encoded responses.
+        """
+        self.metadata = metadata
+        self.store = store
+        self.volcano = volcano
+        self.version = store.version or "unversioned"
+        self.responses = RenderCache(cache_bytes, name="api_responses")
+        self._contrasts = {}
+        self._contrasts_lock = threading.Lock()
+
+    def get(self, target, headers):
+        """
+        Answer a GET request.
+
+        Parameters:
+        - target (str): Request path with its query string, e.g. "/api/v1/volcano?format=arrow".
+        - headers (mapping): Request headers; Accept, Accept-Encoding and If-None-Match are used.
+
+        Returns:
+        tuple: (status, headers dict, body bytes).
+        """
+        url = urlsplit(target)
+        path = unquote(url.path).rstrip("/")
+        query = dict(parse_qsl(url.query))
+        table_format = "arrow" if query.get("format") == "arrow" or ARROW_TYPE in headers.get("Accept", "") else "json"
+        use_gzip = "gzip" in headers.get("Accept-Encoding", "") and not path.endswith(".png")
+
+        representation = json.dumps([self.version, path, sorted(query.items()), table_format, use_gzip])
+        etag = f'"{hashlib.sha256(representation.encode()).hexdigest()[:32]}"'
+        response_headers = {
+            "ETag": etag,
+            "Cache-Control": "no-cache",
+            "Vary": "Accept, Accept-Encoding",
+            "X-Dataset-Version": self.version,
+        }
+        if _matches_etag(headers.get("If-None-Match", ""), etag):
+            count("api.not_modified")
+            return HTTPStatus.NOT_MODIFIED, response_headers, b""
+
+        cached = self.responses.get(representation)
+        if cached is not None:
+            content_type, body = cached.split(b"\n", 1)
+        else:
+            try:
+                with span("api.request", path=path):
+                    content_type, body = self._route(path, query, table_format)
+            except ApiError as error:
+                return error_response(error.status, str(error))
+            content_type = content_type.encode()
+            if use_gzip:
+                body = gzip.compress(body, compresslevel=6, mtime=0)
+            if content_type != PNG_TYPE.encode():
+                self.responses.put(representation, content_type + b"\n" + body)
+
+        response_headers["Content-Type"] = content_type.decode()
+        if use_gzip:
+            response_headers["Content-Encoding"] = "gzip"
+        return HTTPStatus.OK, response_headers, body
+
+    def _route(self, path, query, table_format):
+        if path == API_PREFIX:
+            return self._json(self.dataset_info())
+        if path == f"{API_PREFIX}/resolve":
+            return self._json(self.resolve(query.get("q", ""), query.get("id_type"), query.get("limit")))
+        if path == f"{API_PREFIX}/volcano":
+            return self._table(*self.volcano_table(query), table_format)
+        match = re.fullmatch(f"{API_PREFIX}/proteins/(.+)", path)
+        if match:
+            return self._table(*self.protein_table(self.seq_id(match[1], query.get("id_type"))), table_format)
+        match = re.fullmatch(f"{API_PREFIX}/plots/(.+)/({'|'.join(PLOT_KINDS)})\\.png", path)
+        if match:
+            return PNG_TYPE, self.plot(self.seq_id(match[1], query.get("id_type")), match[2])
+        raise ApiError(HTTPStatus.NOT_FOUND, f"Unknown endpoint {path}; see {API_PREFIX}.")
+
+    def _json(self, payload):
+        return JSON_TYPE, json.dumps(payload, default=_json_default, separators=(",", ":")).encode()
+
+    def _table(self, frame, metadata, table_format):
+        if table_format == "arrow":
+            return ARROW_TYPE, _arrow_stream(frame, metadata)
+        return self._json({**metadata, "table": _frame_json(frame)})
+
+    def dataset_info(self):
+        """Version and size of the dataset, and the contrasts /volcano accepts."""
+        n_samples, n_seqids = self.store.shape
+        return {
+            "version": self.version,
+            "samples": n_samples,
+            "seq_ids": n_seqids,
+            "id_types": self.store.index.id_types,
+            "contrasts": contrast_columns(self.metadata),
+        }
+
+    def resolve(self, q, id_type=None, limit=None):
+        """
+        Resolve an identifier to SeqIds.
+
+        With id_type, q must equal an identifier of that type; without it, q is
+        searched across all reference types and the best matches are returned.
+        """
+        if not q.strip():
+            raise ApiError(HTTPStatus.BAD_REQUEST, "Missing query parameter q.")
+        if id_type is not None:
+            if id_type not in ID_TYPES:
+                raise ApiError(HTTPStatus.BAD_REQUEST, f"Invalid ID type. Choose from {ID_TYPES}.")
+            if id_type not in self.store.index.id_types or not self.store.seqids_for(id_type, q):
+                raise ApiError(HTTPStatus.NOT_FOUND, f"No data found for {id_type} = {q}.")
+            matches = [(q, id_type, "exact", 1.0)]
+        else:
+            try:
+                limit = 20 if limit is None else int(limit)
+            except ValueError:
+                raise ApiError(HTTPStatus.BAD_REQUEST, f"limit must be an integer, not '{limit}'.") from None
+            matches = self.store.search.search(q, limit=limit)
+
+        return {"query": q, "matches": [
+            {
+                "value": value,
+                "id_type": match_type,
+                "kind": kind,
+                "score": score,
+                "seq_ids": self.store.seqids_for(match_type, value),
+                "best_seq_id": self.store.best_seqid(match_type, value),
+                "symbol": self.store.index.symbol(match_type, value),
+            }
+            for value, match_type, kind, score in matches
+        ]}
+
+    def seq_id(self, key, id_type=None):
+        """Return the SeqId named by key, or the best SeqId of the identifier key of id_type."""
+        if id_type is None:
+            if key not in self.store.seqid_pos:
+                raise ApiError(HTTPStatus.NOT_FOUND, f"Unknown SeqId '{key}'; pass id_type to look up another identifier.")
+            return key
+        if id_type not in self.store.index.id_types:
+            raise ApiError(HTTPStatus.BAD_REQUEST, f"Invalid ID type. Choose from {self.store.index.id_types}.")
+        seq_id = self.store.best_seqid(id_type, key)
+        if seq_id is None:
+            raise ApiError(HTTPStatus.NOT_FOUND, f"No data found for {id_type} = {key}.")
+        return seq_id
+
+    def _annotations(self, seq_id):
+        return json.loads(self.store.annotations.iloc[self.store.seqid_pos[seq_id]].to_json())
+
+    def protein_table(self, seq_id):
+        """
+        Return (table, metadata) of one SeqId: one row per measured sample with
+        its intensity and its row of sample metadata, and the SeqId's annotations.
+        """
+        final_data, _ = self.store.protein_frame(seq_id)
+        samples = final_data[[name for name in ["SampleId", "Intensity", "mrss"] if name in final_data.columns]]
+        sample_metadata = self.metadata.drop_duplicates("SubjectID").rename(columns={"SubjectID": "SampleId"})
+        table = samples.merge(sample_metadata, on="SampleId", how="left", suffixes=("", "_metadata"))
+        return table, {"seq_id": seq_id, "annotations": self._annotations(seq_id), "version": self.version}
+
+    def volcano_table(self, query):
+        """Return (table, metadata) of the published volcano table, or of the contrast column/case/control in query."""
+        names = ["column", "case", "control"]
+        given = [name for name in names if name in query]
+        if not given:
+            return self.volcano, {"contrast": "Published: SSc vs Healthy", "version": self.version}
+        if len(given) < len(names):
+            raise ApiError(HTTPStatus.BAD_REQUEST, "A contrast needs all of column, case and control.")
+
+        levels = contrast_columns(self.metadata).get(query["column"])
+        if levels is None:
+            raise ApiError(HTTPStatus.BAD_REQUEST, f"Column '{query['column']}' cannot be used as a contrast.")
+        # Query levels are text; metadata levels may be numbers
+        by_text = {str(level): level for level in levels}
+        for name in ["case", "control"]:
+            if query[name] not in by_text:
+                raise ApiError(HTTPStatus.BAD_REQUEST, f"Level '{query[name]}' not found; choose from {list(by_text)}.")
+        contrast = Contrast(query["column"], by_text[query["case"]], by_text[query["control"]])
+        return self.differential(contrast), {"contrast": contrast.title, "version": self.version}
+
+    def differential(self, contrast):
+        """Differential expression of a contrast, computed once and kept for the next MAX_CONTRASTS requests."""
+        with self._contrasts_lock:
+            table = self._contrasts.get(contrast)
+        if table is None:
+            try:
+                table = differential_expression(self.store, contrast)
+            except ValueError as error:
+                raise ApiError(HTTPStatus.BAD_REQUEST, str(error)) from None
+            with self._contrasts_lock:
+                self._contrasts[contrast] = table
+                while len(self._contrasts) > MAX_CONTRASTS:
+                    self._contrasts.pop(next(iter(self._contrasts)))
+        return table
+
+    def plot(self, seq_id, kind):
+        """Return the PNG bytes of the correlation or box plot of a SeqId, from the shared render cache."""
+        protein_name = self._annotations(seq_id).get("TargetFullName") or seq_id
+        key = (kind, seq_id, self.store.version, protein_name)
+        if kind == "correlation":
+            final_data, metadata_info = self.store.protein_frame(seq_id)
+            if metadata_info.empty:
+                raise ApiError(HTTPStatus.NOT_FOUND, f"No metadata found for the samples of SeqId {seq_id}.")
+            return render_cache.get_or_render(key, lambda: plot_correlation(final_data, metadata_info, protein_name))
+
+        summary = self.store.condition_summary
+        conditions, box_stats = summary.box_stats(seq_id) if summary is not None else ([], [])
+        if not box_stats:
+            raise ApiError(HTTPStatus.NOT_FOUND, f"No samples with a condition measure SeqId {seq_id}.")
+        return render_cache.get_or_render(key, lambda: draw_boxplot(conditions, box_stats, protein_name))
+
+
+class ApiRequestHandler(BaseHTTPRequestHandler):
+    """Passes GET and HEAD requests to the server's ProteinApi."""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self._respond(send_body=True)
+
+    def do_HEAD(self):
+        self._respond(send_body=False)
+
+    def _respond(self, send_body):
+        try:
+            status, headers, body = self.server.api.get(self.path, self.headers)
+        except Exception:
+            # Answer rather than drop the connection, whatever went wrong
+            self.log_error("Error answering %s:\n%s", self.path, traceback.format_exc())
+            count("api.error")
+            status, headers, body = error_response(HTTPStatus.INTERNAL_SERVER_ERROR, "Internal server error.")
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+
+
+def make_server(api, host="127.0.0.1", port=DEFAULT_PORT):
+    """Return a threaded HTTP server answering with api; port 0 picks a free port."""
+    server = ThreadingHTTPServer((host, port), ApiRequestHandler)
+    server.daemon_threads = True
+    server.api = api
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the protein data over HTTP/JSON.")
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to listen on (default: 127.0.0.1).")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"Port to listen on (default: {DEFAULT_PORT}).")
+    parser.add_argument("--metadata", default=METADATA_PATH)
+    parser.add_argument("--proteins-data", default=PROTEINS_PATH, help="ADAT or long-format protein CSV.")
+    parser.add_argument("--volcano", default=VOLCANO_PATH)
+    args = parser.parse_args(argv)
+
+    metadata, store, volcano = freeze(load_dataset(args.metadata, args.proteins_data, args.volcano))
+    server = make_server(ProteinApi(metadata, store, volcano), args.host, args.port)
+    print(f"Serving dataset {store.version} on http://{args.host}:{server.server_port}{API_PREFIX}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+"""
+Persistent on-disk cache of the parsed app data.
+
+The typed tables behind get_data (metadata, annotations and volcano
+statistics) are written once to a cache directory as Parquet tables, and the
+protein matrix and the store's lookup structures (identifier and search
+indexes, chosen SeqIds, per-condition summary) as .npy arrays. Later processes
+read the tables back and memory-map the arrays read-only in milliseconds,
+instead of parsing the source files again; processes mapping the same entry,
+such as the workers started by serve.py, share one copy of the arrays.
+
+Entries are keyed by the SHA-256 of every source file. A manifest also records
+each source's size and mtime, so an unchanged file is not re-hashed; when a
+source changes, the cache is rebuilt automatically.
+
+Prebuild the caches of every cohort in the manifest (e.g. during a deploy)
+with registry.py:
+    python app/registry.py
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from dataloader import load_protein_store
+from instrumentation import timed
+from mapped import load_arrays, save_arrays
+from protein_store import ProteinStore
+
+# Source files of the app's dataset
+CORE_DATA_PATH = Path(__file__).parent.parent / "Core data"
+METADATA_PATH = str(CORE_DATA_PATH / "somalogic_metadata.csv")
+PROTEINS_PATH = str(CORE_DATA_PATH / "SS-2342309_v4.1_other.hybNorm.medNormInt.plateScale.adat")
+VOLCANO_PATH = str(CORE_DATA_PATH / "SSC_all_Healthy_allproteins.csv")
+
+# Bump when the cached layout changes so existing caches are rebuilt
+CACHE_VERSION = 2
+MANIFEST_NAME = "manifest.json"
+
+
+def default_cache_dir(proteins_path):
+    """
+    Cache directory of one protein data file: a directory named after the file
+    in $SCLEROBASE_CACHE_DIR, or in .cache next to the file, so datasets kept
+    side by side (see registry.py) do not replace each other's entries.
+    """
+    base = Path(os.environ.get("SCLEROBASE_CACHE_DIR", Path(proteins_path).parent / ".cache"))
+    return base / Path(proteins_path).name
+
+
+def _file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as source:
+        for chunk in iter(lambda: source.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _read_manifest(cache_dir):
+    try:
+        with open(cache_dir / MANIFEST_NAME) as manifest_file:
+            return json.load(manifest_file)
+    except (OSError, ValueError):
+        return {}
+
+
+def source_fingerprint(sources, manifest=None):
+    """
+    Return (key, sources_info) for the given source paths.
+
+    The SHA-256 of a file is reused from the manifest when its size and mtime
+    are unchanged, and recomputed otherwise.
+    """
+    known = (manifest or {}).get("sources", {})
+    sources_info = {}
+    for name, path in sources.items():
+        stat = os.stat(path)
+        entry = known.get(name, {})
+        if entry.get("path") == str(path) and entry.get("size") == stat.st_size and entry.get("mtime_ns") == stat.st_mtime_ns:
+            sha256 = entry["sha256"]
+        else:
+            sha256 = _file_digest(path)
+        sources_info[name] = {"path": str(path), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": sha256}
+
+    key = hashlib.sha256(
+        json.dumps([CACHE_VERSION] + [sources_info[name]["sha256"] for name in sorted(sources_info)]).encode()
+    ).hexdigest()[:16]
+    return key, sources_info
+
+
+def write_cache(entry_dir, metadata, store, volcano):
+    """Write the parsed tables of one dataset into entry_dir."""
+    entry_dir.mkdir(parents=True, exist_ok=True)
+    metadata.to_parquet(entry_dir / "metadata.parquet")
+    volcano.to_parquet(entry_dir / "volcano.parquet")
+
+    np.save(entry_dir / "intensities.npy", store.values)
+    samples = pd.DataFrame({"SampleId": store.sample_ids})
+    if store.mrss is not None:
+        samples["mrss"] = store.mrss
+    samples.to_parquet(entry_dir / "samples.parquet")
+    store.annotations.to_parquet(entry_dir / "annotations.parquet")
+    save_arrays(entry_dir / "arrays", store.to_arrays())
+
+    with open(entry_dir / "store.json", "w") as store_file:
+        json.dump({"min_coverage": int(store.min_coverage)}, store_file)
+
+
+def read_cache(entry_dir, version=None):
+    """Read a dataset written by write_cache; the intensity matrix and lookup arrays are memory-mapped."""
+    metadata = pd.read_parquet(entry_dir / "metadata.parquet")
+    volcano = pd.read_parquet(entry_dir / "volcano.parquet")
+
+    with open(entry_dir / "store.json") as store_file:
+        store_info = json.load(store_file)
+    samples = pd.read_parquet(entry_dir / "samples.parquet")
+
+    store = ProteinStore(
+        np.load(entry_dir / "intensities.npy", mmap_mode="r"),
+        samples["SampleId"].to_numpy(dtype=object),
+        pd.read_parquet(entry_dir / "annotations.parquet"),
+        metadata,
+        mrss=samples["mrss"].to_numpy() if "mrss" in samples.columns else None,
+        min_coverage=store_info["min_coverage"],
+        arrays=load_arrays(entry_dir / "arrays"),
+        version=version,
+    )
+    return metadata, store, volcano
+
+
+@timed("load_dataset")
+def load_dataset(metadata_path, proteins_path, volcano_path, cache_dir=None, min_coverage=None):
+    """
+    Load metadata, the ProteinStore and the volcano table through the on-disk cache.
+
+    Returns (metadata, store, volcano); store.version is the cache key of the sources.
+    """
+    cache_dir = Path(cache_dir) if cache_dir is not None else default_cache_dir(proteins_path)
+    sources = {"metadata": metadata_path, "proteins": proteins_path, "volcano": volcano_path}
+    manifest = _read_manifest(cache_dir)
+    key, sources_info = source_fingerprint(sources, manifest)
+    if min_coverage is not None:
+        key = f"{key}-c{min_coverage}"
+
+    entry_dir = cache_dir / key
+    if manifest.get("key") == key and entry_dir.is_dir():
+        try:
+            data = read_cache(entry_dir, version=key)
+            if manifest.get("sources") != sources_info:
+                _write_manifest(cache_dir, key, sources_info)
+            return data
+        except (OSError, ValueError, KeyError):
+            pass  # Unreadable entry: rebuild it below
+
+    metadata, store = load_protein_store(metadata_path, proteins_path, min_coverage=min_coverage)
+    store.version = key
+    volcano = pd.read_csv(volcano_path)
+
+    staging_dir = None
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        staging_dir = Path(tempfile.mkdtemp(prefix=f"{key}.", dir=cache_dir))
+        write_cache(staging_dir, metadata, store, volcano)
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        os.replace(staging_dir, entry_dir)
+        _write_manifest(cache_dir, key, sources_info)
+        _remove_stale_entries(cache_dir, key)
+    except OSError:
+        # A read-only filesystem or a concurrent rebuild only costs the speed-up, not the data
+        if staging_dir is not None:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+
+    return metadata, store, volcano
+
+
+def _write_manifest(cache_dir, key, sources_info):
+    manifest = {"version": CACHE_VERSION, "key": key, "sources": sources_info}
+    staging = cache_dir / f"{MANIFEST_NAME}.{os.getpid()}.tmp"
+    with open(staging, "w") as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
+    os.replace(staging, cache_dir / MANIFEST_NAME)
+
+
+def _remove_stale_entries(cache_dir, key):
+    # Directories starting with the current key are this entry or a rebuild of it in progress
+    for entry in cache_dir.iterdir():
+        if entry.is_dir() and not entry.name.startswith(key):
+            shutil.rmtree(entry, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    import time
+
+    start = time.perf_counter()
+    _, store, _ = load_dataset(METADATA_PATH, PROTEINS_PATH, VOLCANO_PATH)
+    print(f"Dataset {store.version} ready in {time.perf_counter() - start:.3f}s")
@@ -1,30 +1,289 @@
-
 import pandas as pd
-import scanpy as sc
 import numpy as np
-import seaborn as sns
-import matplotlib.pyplot as plt
 
+from functools import lru_cache
 from pathlib import Path
+from typing import NamedTuple
+from identifiers import IdentifierIndex
+from protein_store import ProteinStore, SEQUENCE_ANNOTATIONS
+
+# Annotation fields that the ADAT declares as "String" but which hold numbers or dates
+ADAT_NUMERIC_COL_DATA = ["Dilution", "PlateScale_Reference"]
+ADAT_CATEGORICAL_COL_DATA = ["Organism", "Units", "Type"]
+ADAT_NUMERIC_ROW_DATA = ["PercentDilution", "HybControlNormScale"]
+ADAT_DATE_ROW_DATA = ["PlateRunDate"]
+ADAT_CATEGORICAL_ROW_DATA = ["PlateId", "SampleType", "SampleMatrix", "RowCheck"]
+
+# dtypes of the long-format protein table (one row per sample and SeqId, with the
+# SeqId's annotations repeated on every row). Its repeated strings are dictionary
+# encoded; identifiers stay text however they look (EntrezGeneID "1415"), as in
+# read_adat, and the measurements are float32, quoted or not.
+LONG_TABLE_SCHEMA = {
+    "SampleId": "category",
+    "SeqId": "category",
+    "Intensity": "float32",
+    "mrss": "float32",
+    "Dilution": "float32",
+    "PlateScale_Reference": "float32",
+    **{name: "category" for name in [
+        "SeqIdVersion", "SomaId", "TargetFullName", "Target", "UniProt",
+        "EntrezGeneID", "EntrezGeneSymbol", "Organism", "Units", "Type",
+    ]},
+}
+
+
+class Adat(NamedTuple):
+    """Contents of a SomaLogic ADAT file."""
+    header: dict
+    intensities: pd.DataFrame  # samples x SeqId, float32
+    col_data: pd.DataFrame  # one row per SeqId
+    row_data: pd.DataFrame  # one row per sample
+
+
+@lru_cache(maxsize=None)
+def load_identifier_index(file_path):
+    """Build the IdentifierIndex of a protein annotation CSV once per process."""
+    return IdentifierIndex.from_csv(file_path)
 
 def getEntrezGeneSymbol(input_data_key,input_data_value):
     BASE_PATH = Path(__file__).parent
     file_path = str(BASE_PATH.parent / "Core data/SSC_all_Healthy_allproteins.csv")
-    mapping= pd.read_csv(file_path)
-    return mapping[mapping[input_data_key]==input_data_value]['EntrezGeneSymbol'].iloc[0]
+    return load_identifier_index(file_path).symbol(input_data_key, input_data_value)
 
 def load_singlecell_data(single_cell_data_path):
-    
+    import scanpy as sc
+
     return sc.read(f'{single_cell_data_path}/final_combined_simplified.h5ad')
 
 
+def _parse_intensities(fields):
+    """Convert the RFU fields of one ADAT table row to float32, treating blanks as missing."""
+    try:
+        return np.asarray(fields, dtype=np.float32)
+    except ValueError:
+        return np.array([float(value) if value else np.nan for value in fields], dtype=np.float32)
+
+
+def _type_annotations(table, numeric, dates, categorical):
+    """Give the all-string annotation tables of an ADAT their natural dtypes."""
+    table = table.replace("", None)
+    for column in numeric:
+        if column in table.columns:
+            table[column] = pd.to_numeric(table[column], errors="coerce")
+    for column in dates:
+        if column in table.columns:
+            table[column] = pd.to_datetime(table[column], errors="coerce")
+    for column in categorical:
+        if column in table.columns:
+            table[column] = table[column].astype("category")
+    return table
+
+
+def read_adat(adat_path, keep_only_samples=True, human_proteins_only=True):
+    """
+    Read a SomaLogic ADAT file in a single streaming pass.
+
+    The ^HEADER, ^COL_DATA and ^ROW_DATA sections and the table body are parsed
+    line by line; filtered rows are skipped before their RFU values are converted.
+
+    Parameters:
+    - adat_path (str): Path to the .adat file.
+    - keep_only_samples (bool): Drop Buffer, Calibrator and QC rows (SampleType != "Sample"),
+      like readAdat(keepOnlySamples = TRUE).
+    - human_proteins_only (bool): Keep only SeqIds with Organism == "Human" and Type == "Protein".
+
+    Returns:
+    - Adat: header dict, float32 samples x SeqId intensity matrix, and typed
+      per-SeqId (col_data) and per-sample (row_data) annotation tables.
+    """
+    header = {}
+    col_names, row_names = [], []
+    col_values = {}
+    row_values = []
+    intensity_rows = []
+    section = None
+    keep_columns = None
+
+    with open(adat_path, encoding="utf-8") as adat_file:
+        for line in adat_file:
+            line = line.rstrip("\r\n")
+            # Blank lines, e.g. trailing ones at the end of the file, carry no data
+            if not line:
+                continue
+            if line.startswith("^"):
+                section = line[1:]
+                continue
+
+            fields = line.split("\t")
+
+            if section is None or section == "HEADER":
+                header[fields[0].lstrip("!")] = fields[1] if len(fields) > 1 else ""
+            elif section == "COL_DATA":
+                if fields[0] == "!Name":
+                    col_names = fields[1:]
+            elif section == "ROW_DATA":
+                if fields[0] == "!Name":
+                    row_names = fields[1:]
+            elif section == "TABLE_BEGIN":
+                n_row_fields = len(row_names)
+                label = fields[n_row_fields] if len(fields) > n_row_fields else ""
+
+                # Column annotation rows: blank row-data fields, then a label and one value per SeqId
+                if len(col_values) < len(col_names):
+                    col_values[label] = fields[n_row_fields + 1:]
+                    if len(col_values) == len(col_names):
+                        col_data = pd.DataFrame(col_values)
+                        keep_columns = np.ones(len(col_data), dtype=bool)
+                        if human_proteins_only:
+                            keep_columns &= (col_data["Organism"] == "Human").to_numpy()
+                            keep_columns &= (col_data["Type"] == "Protein").to_numpy()
+                    continue
+
+                # The row annotation names are repeated once before the sample rows
+                if fields[:n_row_fields] == row_names:
+                    continue
+
+                row = fields[:n_row_fields]
+                if keep_only_samples and row[row_names.index("SampleType")] != "Sample":
+                    continue
+                row_values.append(row)
+                intensity_rows.append(_parse_intensities(fields[n_row_fields + 1:])[keep_columns])
+
+    if keep_columns is None:
+        raise ValueError(f"No ^TABLE_BEGIN section found in {adat_path}.")
+
+    col_data = _type_annotations(
+        col_data[keep_columns].reset_index(drop=True),
+        ADAT_NUMERIC_COL_DATA, [], ADAT_CATEGORICAL_COL_DATA,
+    )
+    row_data = _type_annotations(
+        pd.DataFrame(row_values, columns=row_names),
+        ADAT_NUMERIC_ROW_DATA + [name for name in row_names if name.startswith("NormScale_")],
+        ADAT_DATE_ROW_DATA,
+        ADAT_CATEGORICAL_ROW_DATA,
+    )
+
+    if intensity_rows:
+        matrix = np.vstack(intensity_rows)
+    else:
+        matrix = np.empty((0, len(col_data)), dtype=np.float32)
+    intensities = pd.DataFrame(
+        matrix,
+        index=pd.Index(row_data["SampleId"], name="SampleId"),
+        columns=pd.Index(col_data["SeqId"], name="SeqId"),
+        copy=False,
+    )
+    return Adat(header, intensities, col_data, row_data)
+
+
+def _arrow_column(column, dtype):
+    """Convert a column read by the pyarrow engine to dtype, dictionary-encoding strings outside the schema too."""
+    import pyarrow as pa
+
+    array = pa.array(column)
+    if dtype == "category" or (dtype is None and (pa.types.is_string(array.type) or pa.types.is_large_string(array.type))):
+        return array.cast(pa.string()).dictionary_encode().to_pandas()
+    if dtype is not None:
+        array = array.cast(pa.from_numpy_dtype(np.dtype(dtype)))
+    return array.to_pandas()
+
+
+def read_long_table(proteins_path):
+    """
+    Read a long-format protein CSV with the dtypes of LONG_TABLE_SCHEMA.
+
+    The CSV is parsed by pandas' pyarrow engine. Columns outside the schema
+    keep their inferred dtype, except strings, which are dictionary-encoded too.
+    """
+    proteins = pd.read_csv(proteins_path, engine="pyarrow", dtype_backend="pyarrow")
+    return pd.DataFrame({name: _arrow_column(proteins[name], LONG_TABLE_SCHEMA.get(name)) for name in proteins.columns})
+
+
+def adat_to_long(adat, metadata):
+    """
+    Reshape an Adat into the long-format protein table that the plots expect
+    (one row per sample and SeqId), as the R melt/merge step used to produce.
+
+    Only samples listed in metadata["SubjectID"] are kept, and their Total_mRss
+    is attached as the "mrss" column.
+    """
+    in_cohort = adat.intensities.index.isin(metadata["SubjectID"])
+    intensities = adat.intensities[in_cohort]
+    sample_ids = intensities.index.to_numpy()
+    n_samples, n_seqids = intensities.shape
+
+    mrss = metadata.drop_duplicates("SubjectID").set_index("SubjectID")["Total_mRss"]
+
+    # SeqId-major order, i.e. all samples of one SeqId before the next
+    proteins = pd.DataFrame({
+        "SampleId": np.tile(sample_ids, n_seqids),
+        "SeqId": np.repeat(adat.col_data["SeqId"].to_numpy(), n_samples),
+        "Intensity": intensities.to_numpy().T.ravel(),
+        "mrss": np.tile(mrss.reindex(sample_ids).to_numpy(), n_seqids),
+    })
+    annotations = [name for name in SEQUENCE_ANNOTATIONS if name in adat.col_data.columns]
+    for name in annotations:
+        proteins[name] = np.repeat(adat.col_data[name].to_numpy(), n_samples)
+
+    return proteins.dropna(subset=["Intensity"]).reset_index(drop=True)
+
+
 def load_data(metadata_path, proteins_path):
     """
     Load metadata and protein data from the provided file paths.
+
+    proteins_path may be a long-format CSV or a raw .adat file, which is read
+    with read_adat and reshaped with adat_to_long.
     """
     try:
         metadata = pd.read_csv(metadata_path)
-        proteins = pd.read_csv(proteins_path)
+        if str(proteins_path).endswith(".adat"):
+            proteins = adat_to_long(read_adat(proteins_path), metadata)
+        else:
+            proteins = read_long_table(proteins_path)
     except Exception as e:
         raise ValueError(f"Error loading files: {e}")
     return metadata, proteins
+
+
+def load_protein_store(metadata_path, proteins_path, min_coverage=None):
+    """
+    Load metadata and protein data into a ProteinStore.
+
+    proteins_path may be a raw .adat file or a long-format CSV.
+    """
+    try:
+        metadata = pd.read_csv(metadata_path)
+        if str(proteins_path).endswith(".adat"):
+            store = ProteinStore.from_adat(read_adat(proteins_path), metadata, min_coverage)
+        else:
+            store = ProteinStore.from_long(read_long_table(proteins_path), metadata, min_coverage)
+    except Exception as e:
+        raise ValueError(f"Error loading files: {e}")
+    return metadata, store
+
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    from dataplane import column_memory, format_bytes
+
+    parser = argparse.ArgumentParser(description="Memory of each column of a long-format protein CSV read with read_long_table.")
+    parser.add_argument("proteins", help="Long-format protein CSV, e.g. proteins_plot.csv.")
+    parser.add_argument("--compare", action="store_true", help="Also read it with the default dtypes of pd.read_csv.")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    report = column_memory(read_long_table(args.proteins))
+    print(f"Typed: {format_bytes(report['bytes'].sum())} in {time.perf_counter() - start:.2f}s")
+    columns = ["dtype", "bytes", "share"]
+    if args.compare:
+        start = time.perf_counter()
+        untyped = column_memory(pd.read_csv(args.proteins))
+        print(f"Untyped: {format_bytes(untyped['bytes'].sum())} in {time.perf_counter() - start:.2f}s")
+        report["untyped_dtype"] = untyped["dtype"]
+        report["untyped_bytes"] = untyped["bytes"]
+        columns += ["untyped_dtype", "untyped_bytes"]
+    print(report[columns].to_string(formatters={"share": "{:.1%}".format}))
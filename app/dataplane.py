@@ -0,0 +1,122 @@
+"""
+One read-only copy of the app's data, shared by every Streamlit session.
+
+main.py loads the dataset and derives volcano tables with st.cache_resource,
+so all sessions use the same objects instead of the copy st.cache_data
+unpickles for every call. freeze() makes the arrays of those objects
+read-only, so no session can change what the others see, and a session keeps
+only small keys (SeqIds, identifiers, widget values) in st.session_state.
+nbytes() and session_bytes() measure what is shared and what each session
+holds, to size a deployment for its number of concurrent users.
+"""
+import sys
+import types
+
+import numpy as np
+import pandas as pd
+
+# Objects whose size is counted without looking at what they reference
+_OPAQUE = (type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType, types.MethodType)
+# Objects that cannot hold a numpy array of their own
+_SCALARS = (str, bytes, int, float, bool, type(None), pd.DataFrame, pd.Series, pd.Index)
+
+
+def _references(obj):
+    if isinstance(obj, dict):
+        return [*obj.keys(), *obj.values()]
+    if isinstance(obj, (list, tuple, set, frozenset)):
+        return list(obj)
+    if isinstance(obj, np.ndarray):
+        return obj.ravel().tolist() if obj.dtype == object else []
+    if isinstance(obj, (pd.DataFrame, pd.Series, pd.Index, str, bytes, _OPAQUE)):
+        return []
+    if hasattr(obj, "__dict__"):
+        return [vars(obj)]
+    return []
+
+
+def _size(obj):
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(index=True, deep=True).sum())
+    if isinstance(obj, (pd.Series, pd.Index)):
+        return int(obj.memory_usage(deep=True))
+    # Arrays count their buffer only if they own it; views and memory maps add nothing
+    return sys.getsizeof(obj)
+
+
+def freeze(obj):
+    """
+    Make every numpy array reachable from obj (through attributes, dicts,
+    lists and tuples) read-only, in place, and return obj.
+
+    DataFrames are left as they are (callers treat them as read-only), and
+    so must be any array a DataFrame still uses: pandas hands out its own
+    arrays and expects them to stay writeable.
+    """
+    seen, stack = set(), [obj]
+    while stack:
+        item = stack.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        if isinstance(item, np.ndarray):
+            item.flags.writeable = False
+        elif not isinstance(item, _SCALARS):
+            stack.extend(_references(item))
+    return obj
+
+
+def shared_objects(*objects):
+    """Return objects and their attributes, to pass as exclude when sessions may hold references to them."""
+    shared = list(objects)
+    for obj in objects:
+        if hasattr(obj, "__dict__") and not isinstance(obj, _OPAQUE):
+            shared.extend(vars(obj).values())
+    return shared
+
+
+def nbytes(obj, exclude=()):
+    """
+    Estimate the memory held by obj and everything it references, in bytes.
+
+    Objects in exclude, and anything reached only through them, are not
+    counted, so a reference to shared data costs nothing.
+    """
+    seen = {id(item) for item in exclude}
+    total, stack = 0, [obj]
+    while stack:
+        item = stack.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        total += _size(item)
+        stack.extend(_references(item))
+    return total
+
+
+def session_bytes(session_state, exclude=()):
+    """Return {key: bytes} of a session's state, largest first, not counting the shared objects in exclude."""
+    sizes = {str(key): nbytes(value, exclude) for key, value in session_state.items()}
+    return dict(sorted(sizes.items(), key=lambda item: item[1], reverse=True))
+
+
+def column_memory(frame):
+    """
+    Memory held by each column of a DataFrame, largest first.
+
+    Returns a DataFrame indexed by column name with its dtype, bytes (the
+    strings of object columns included) and share of the total.
+    """
+    sizes = frame.memory_usage(index=False, deep=True)
+    report = pd.DataFrame({"dtype": frame.dtypes.astype(str), "bytes": sizes}, index=frame.columns)
+    report["share"] = report["bytes"] / max(int(report["bytes"].sum()), 1)
+    return report.sort_values("bytes", ascending=False)
+
+
+def format_bytes(size):
+    """Format a byte count as B, KB, MB or GB."""
+    for unit in ["B", "KB", "MB"]:
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
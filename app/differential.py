@@ -0,0 +1,239 @@
+"""
+Differential expression between groups of samples, after limma.
+
+Fits the group-means linear model of the R markdowns
+(lmFit(design = model.matrix(~ group + 0)), contrasts.fit, eBayes) for every
+protein at once with matrix operations:
+    - per-protein group means and residual variances on log2 intensities
+    - empirical Bayes moderation of the variances (limma's fitFDist)
+    - moderated t statistics, p-values, Benjamini-Hochberg adjusted p-values
+      and B statistics (log-odds of differential expression)
+
+The result has the columns of the precomputed volcano CSV (logFC, AveExpr, t,
+P.Value, adj.P.Val, B, SeqId and the protein annotations), so it can be passed
+straight to plots.volcano.plot_volcano.
+
+scipy is imported by the functions that use it, so importing this module (as
+main.py does) costs nothing until a contrast is computed.
+"""
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from instrumentation import timed
+
+# Metadata columns that identify samples rather than group them
+ID_COLUMNS = ["ExtIdentifier", "SubjectID", "combined"]
+
+# eBayes defaults of limma: expected proportion of differentially expressed
+# proteins, and the limits of the prior standard deviation of their log-fold changes
+PROPORTION = 0.01
+STDEV_COEF_LIM = (0.1, 4.0)
+
+
+class Contrast(NamedTuple):
+    """Compare the samples with metadata[column] == case against those with metadata[column] == control."""
+    column: str
+    case: object
+    control: object
+
+    @property
+    def title(self):
+        return f"{self.column}: {self.case} vs {self.control}"
+
+
+def contrast_columns(metadata, min_group_size=2):
+    """
+    Return {column: levels} of the metadata columns usable in a Contrast.
+
+    A column qualifies if it is categorical (text, or integers with at most two
+    values) and at least two of its levels have min_group_size samples.
+    """
+    columns = {}
+    for column in metadata.columns:
+        if column in ID_COLUMNS:
+            continue
+        values = metadata[column].dropna()
+        if pd.api.types.is_float_dtype(values) or (pd.api.types.is_integer_dtype(values) and values.nunique() > 2):
+            continue
+        counts = values.value_counts()
+        levels = sorted(counts.index[counts >= min_group_size].tolist(), key=str)
+        if len(levels) >= 2:
+            columns[column] = levels
+    return columns
+
+
+def trigamma_inverse(x):
+    """Solve trigamma(y) = x for y by Newton iteration (limma's trigammaInverse)."""
+    from scipy import special
+
+    x = np.asarray(x, dtype=np.float64)
+    y = np.where(x > 1e7, 1 / np.sqrt(x), np.where(x < 1e-6, 1 / x, 0.5 + 1 / x))
+    for _ in range(50):
+        tri = special.polygamma(1, y)
+        dif = tri * (1 - tri / x) / special.polygamma(2, y)
+        y = y + dif
+        if np.max(-dif / y) < 1e-8:
+            break
+    return y
+
+
+def fit_f_dist(s2, df):
+    """
+    Moment estimates of the scaled F distribution of the variances (limma's fitFDist).
+
+    Returns (s2_prior, df_prior); df_prior is inf when the variances show no
+    more spread than expected from sampling alone.
+    """
+    from scipy import special
+
+    s2 = np.maximum(s2, 0)
+    median = np.median(s2)
+    s2 = np.maximum(s2, 1e-5 * (median if median > 0 else 1))
+
+    e = np.log(s2) - special.digamma(df / 2) + np.log(df / 2)
+    e_mean = e.mean()
+    e_var = e.var(ddof=1) - special.polygamma(1, df / 2).mean() if len(e) > 1 else 0.0
+    if e_var > 0:
+        df_prior = 2 * trigamma_inverse(e_var)
+        s2_prior = np.exp(e_mean + special.digamma(df_prior / 2) - np.log(df_prior / 2))
+    else:
+        df_prior = np.inf
+        s2_prior = np.exp(e_mean)
+    return float(s2_prior), float(df_prior)
+
+
+def _prior_coef_variance(t, stdev_unscaled, df_total, proportion, var_prior_lim):
+    # limma's tmixture.vector: prior variance of the non-zero log-fold changes,
+    # matched to the tail of the moderated t statistics
+    from scipy import stats
+
+    n = len(t)
+    n_target = int(np.ceil(proportion / 2 * n))
+    if n_target < 1:
+        return np.nan
+    p = max(n_target / n, proportion)
+
+    max_df = df_total.max()
+    lower = df_total < max_df
+    if lower.any():
+        t = t.copy()
+        t[lower] = stats.t.ppf(stats.t.cdf(t[lower], df_total[lower]), max_df)
+
+    t = np.abs(t)
+    t_target = np.quantile(t, (n - n_target) / (n - 1))
+    top = t >= t_target
+    t, v1 = t[top], stdev_unscaled[top] ** 2
+    rank = len(t) - stats.rankdata(t) + 1
+    p0 = stats.t.sf(t, max_df)
+    p_target = ((rank - 0.5) / n - (1 - p) * p0) / p
+
+    v0 = np.zeros(len(t))
+    pos = p_target > p0
+    if pos.any():
+        q_target = stats.t.isf(p_target[pos], max_df)
+        v0[pos] = v1[pos] * ((t[pos] / q_target) ** 2 - 1)
+    return np.clip(v0, *var_prior_lim).mean()
+
+
+def benjamini_hochberg(p_values):
+    """Benjamini-Hochberg adjusted p-values; NaN p-values stay NaN and are not counted."""
+    p_values = np.asarray(p_values, dtype=np.float64)
+    adjusted = np.full(len(p_values), np.nan)
+    ok = np.flatnonzero(~np.isnan(p_values))
+    order = ok[np.argsort(p_values[ok])]
+    ranked = p_values[order] * len(order) / np.arange(1, len(order) + 1)
+    adjusted[order] = np.minimum(np.minimum.accumulate(ranked[::-1])[::-1], 1)
+    return adjusted
+
+
+def moderated_t(coef, stdev_unscaled, s2, df_residual, proportion=PROPORTION, stdev_coef_lim=STDEV_COEF_LIM):
+    """
+    Empirical Bayes moderation of one contrast (limma's eBayes).
+
+    All arguments are per-protein vectors. Returns a DataFrame with the
+    columns t, P.Value, adj.P.Val and B.
+    """
+    from scipy import stats
+
+    ok = np.isfinite(s2) & (df_residual > 0)
+    s2_prior, df_prior = fit_f_dist(s2[ok], df_residual[ok])
+
+    df_total = np.minimum(df_residual + df_prior, df_residual[ok].sum())
+    with np.errstate(invalid="ignore"):
+        s2_post = np.where(ok, (df_prior * s2_prior + df_residual * np.nan_to_num(s2)) / (df_residual + df_prior), s2_prior)
+        if np.isinf(df_prior):
+            s2_post = np.full(len(s2), s2_prior)
+        t = coef / stdev_unscaled / np.sqrt(s2_post)
+    p_value = 2 * stats.t.sf(np.abs(t), df_total)
+
+    # B statistic: log-odds that the protein is differentially expressed
+    fitted = np.isfinite(t)
+    var_prior_lim = np.square(stdev_coef_lim) / s2_prior
+    var_prior = _prior_coef_variance(t[fitted], stdev_unscaled[fitted], df_total[fitted], proportion, var_prior_lim)
+    if np.isnan(var_prior):
+        var_prior = 1 / s2_prior
+    r = (stdev_unscaled ** 2 + var_prior) / stdev_unscaled ** 2
+    t2 = t ** 2
+    if df_prior > 1e6:
+        kernel = t2 * (1 - 1 / r) / 2
+    else:
+        kernel = (1 + df_total) / 2 * np.log((t2 + df_total) / (t2 / r + df_total))
+    b = np.log(proportion / (1 - proportion)) - np.log(r) / 2 + kernel
+
+    return pd.DataFrame({"t": t, "P.Value": p_value, "adj.P.Val": benjamini_hochberg(p_value), "B": b})
+
+
+@timed("differential_expression")
+def differential_expression(store, contrast):
+    """
+    Fit the group-means model over every level of contrast.column and test case - control.
+
+    Parameters:
+    store (ProteinStore): Intensities of all samples and proteins.
+    contrast (Contrast): Metadata column and the two levels to compare.
+
+    Returns:
+    pd.DataFrame: One row per SeqId in store order, with the columns of the volcano CSV.
+    """
+    if contrast.column not in store.metadata.columns:
+        raise ValueError(f"Column '{contrast.column}' not found in metadata.")
+
+    # Samples with a metadata row and a value in the contrast column
+    rows = store.metadata_rows
+    groups = pd.Series(pd.NA, index=range(len(rows)), dtype=object)
+    groups[rows >= 0] = store.metadata[contrast.column].to_numpy()[rows[rows >= 0]]
+    keep = groups.notna().to_numpy()
+    groups = pd.Categorical(groups[keep])
+    if contrast.case not in groups.categories or contrast.control not in groups.categories:
+        raise ValueError(f"No samples found for {contrast.title}.")
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        y = np.log2(np.asarray(store.values[keep], dtype=np.float64))
+    y[~np.isfinite(y)] = np.nan
+    observed = ~np.isnan(y)
+    y_zeroed = np.where(observed, y, 0)
+
+    # Group-means fit: one row of the design per group
+    design = np.zeros((len(groups.categories), len(groups)))
+    design[groups.codes, np.arange(len(groups))] = 1
+    counts = design @ observed
+    sums = design @ y_zeroed
+    with np.errstate(divide="ignore", invalid="ignore"):
+        means = sums / counts
+        rss = (design @ (y_zeroed ** 2) - sums * np.nan_to_num(means)).sum(axis=0)
+        df_residual = observed.sum(axis=0) - (counts > 0).sum(axis=0)
+        s2 = np.where(df_residual > 0, np.maximum(rss, 0) / df_residual, np.nan)
+
+        case = groups.categories.get_loc(contrast.case)
+        control = groups.categories.get_loc(contrast.control)
+        coef = means[case] - means[control]
+        stdev_unscaled = np.sqrt(1 / counts[case] + 1 / counts[control])
+
+    results = moderated_t(coef, stdev_unscaled, s2, df_residual.astype(np.float64))
+    results.insert(0, "logFC", coef)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        results.insert(1, "AveExpr", sums.sum(axis=0) / counts.sum(axis=0))
+    results["SeqId"] = store.seq_ids
+    return pd.concat([results, store.annotations.drop(columns="SeqId")], axis=1)
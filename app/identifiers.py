@@ -0,0 +1,178 @@
+import numpy as np
+import pandas as pd
+from mapped import StringIndex, StringTable
+
+# Identifier columns a protein can be searched by
+ID_TYPES = ["EntrezGeneID", "EntrezGeneSymbol", "TargetFullName", "Target"]
+
+
+def normalize_identifier(value):
+    """
+    Return the lookup key of an identifier value.
+
+    EntrezGeneID is read as int, float or str depending on the file, so 1415,
+    1415.0 and "1415" all share the key "1415".
+    """
+    if isinstance(value, (float, np.floating)) and float(value).is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+class IdentifierIndex:
+    """
+    Map every value of the four identifier columns to its SeqIds and canonical
+    EntrezGeneSymbol, built once from a per-SeqId annotation table.
+
+    Several SeqIds can share a value (e.g. several aptamers for one gene), so
+    each key maps to a list of SeqIds in annotation order. The index is held
+    as arrays: one entry per (ID type, key), grouped by ID type, with its
+    option value and the positions of its SeqIds, and a sorted order of the
+    entry keys for binary search. to_arrays/from_arrays save it and map it
+    back from disk, so worker processes can share one copy.
+    """
+
+    def __init__(self, annotations):
+        """
+        Parameters:
+        - annotations (pd.DataFrame): one row per SeqId with a "SeqId" column and
+          any of the ID_TYPES columns.
+        """
+        id_types = [id_type for id_type in ID_TYPES if id_type in annotations.columns]
+        keys, values, type_ranges = [], [], {}
+        offsets, positions = [0], []
+        for id_type in id_types:
+            start = len(keys)
+            entries = {}
+            column = annotations[id_type]
+            present = column.notna().to_numpy()
+            for j, value in zip(np.flatnonzero(present).tolist(), column[present].tolist()):
+                entries.setdefault(normalize_identifier(value), (value, []))[1].append(j)
+            for key, (value, rows) in entries.items():
+                keys.append(_entry_key(id_type, key))
+                values.append(value)
+                positions.extend(rows)
+                offsets.append(len(positions))
+            type_ranges[id_type] = (start, len(keys))
+
+        symbols = [None] * len(annotations)
+        if "EntrezGeneSymbol" in annotations.columns:
+            symbols = [None if pd.isna(symbol) else symbol for symbol in annotations["EntrezGeneSymbol"].tolist()]
+
+        self._setup(type_ranges, keys, values, np.array(offsets, dtype=np.int64), np.array(positions, dtype=np.int32),
+                    annotations["SeqId"].tolist(), symbols)
+
+    def _setup(self, type_ranges, keys, values, offsets, positions, seq_ids, symbols, key_order=None):
+        self.id_types = list(type_ranges)
+        self._type_ranges = type_ranges
+        self._keys = keys
+        self._key_index = StringIndex(keys, key_order)
+        self._values = values
+        self._offsets = offsets
+        self._positions = positions
+        self._seq_ids = seq_ids
+        self._symbols = symbols
+
+    @classmethod
+    def from_csv(cls, file_path):
+        """Build the index from a CSV with SeqId and identifier columns, e.g. a limma results table."""
+        annotations = pd.read_csv(file_path, usecols=lambda name: name == "SeqId" or name in ID_TYPES)
+        return cls(annotations.drop_duplicates("SeqId"))
+
+    def to_arrays(self):
+        """Return the index as named numpy arrays, for mapped.save_arrays. Option values are saved as strings."""
+        type_ranges = np.array([self._type_ranges.get(id_type, (-1, -1)) for id_type in ID_TYPES], dtype=np.int64)
+        return {
+            "index.type_ranges": type_ranges,
+            "index.key_order": self._key_index.order,
+            "index.offsets": self._offsets,
+            "index.positions": self._positions,
+            **_string_table(self._keys).arrays("index.keys"),
+            **_string_table([str(value) for value in self._values]).arrays("index.values"),
+            **_string_table(self._seq_ids).arrays("index.seq_ids"),
+            **_string_table(["" if symbol is None else symbol for symbol in self._symbols]).arrays("index.symbols"),
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """Rebuild an index from to_arrays output, e.g. memory-mapped by mapped.load_arrays. Option values come back as strings."""
+        index = cls.__new__(cls)
+        type_ranges = {
+            id_type: (int(start), int(end))
+            for id_type, (start, end) in zip(ID_TYPES, arrays["index.type_ranges"]) if start >= 0
+        }
+        index._setup(
+            type_ranges,
+            StringTable.from_arrays(arrays, "index.keys"),
+            StringTable.from_arrays(arrays, "index.values"),
+            arrays["index.offsets"],
+            arrays["index.positions"],
+            StringTable.from_arrays(arrays, "index.seq_ids"),
+            StringTable.from_arrays(arrays, "index.symbols"),
+            key_order=arrays["index.key_order"],
+        )
+        return index
+
+    def __len__(self):
+        return len(self._keys)
+
+    def _check_id_type(self, id_type):
+        if id_type not in self._type_ranges:
+            raise KeyError(f"Column '{id_type}' not found in proteins data.")
+
+    def entry(self, id_type, value):
+        """Return the entry number of an identifier value, or None if it is not indexed."""
+        self._check_id_type(id_type)
+        if value is None or (not isinstance(value, str) and pd.isna(value)):
+            return None
+        return self._key_index.get(_entry_key(id_type, normalize_identifier(value)))
+
+    def entry_positions(self, entry):
+        """Return the positions, in annotation order, of the SeqIds of an entry."""
+        return self._positions[self._offsets[entry]:self._offsets[entry + 1]]
+
+    def entry_pairs(self):
+        """Return (entries, positions): every (entry, SeqId position) pair, as two arrays."""
+        return np.repeat(np.arange(len(self), dtype=np.int32), np.diff(self._offsets)), np.asarray(self._positions)
+
+    def seqids(self, id_type, value):
+        """Return the SeqIds whose id_type column equals value (empty if none)."""
+        entry = self.entry(id_type, value)
+        if entry is None:
+            return []
+        return [self._seq_ids[j] for j in self.entry_positions(entry).tolist()]
+
+    def symbol(self, id_type, value):
+        """Return the EntrezGeneSymbol of the first SeqId matching value."""
+        entry = self.entry(id_type, value)
+        if entry is None:
+            raise ValueError(f"No data found for {id_type} = {value}.")
+        # Symbols read back from disk hold "" where annotations had none
+        return self._symbols[int(self.entry_positions(entry)[0])] or None
+
+    def values(self, id_type):
+        """Return the distinct values of id_type, in order of first appearance."""
+        self._check_id_type(id_type)
+        start, end = self._type_ranges[id_type]
+        return list(self._values[start:end])
+
+    def items(self, id_type):
+        """Iterate over (key, SeqIds) pairs of id_type, keyed by normalize_identifier."""
+        self._check_id_type(id_type)
+        start, end = self._type_ranges[id_type]
+        prefix = len(_entry_key(id_type, ""))
+        for entry in range(start, end):
+            yield self._keys[entry][prefix:], [self._seq_ids[j] for j in self.entry_positions(entry).tolist()]
+
+    def __contains__(self, item):
+        id_type, value = item
+        return id_type in self._type_ranges and self.entry(id_type, value) is not None
+
+
+def _entry_key(id_type, key):
+    # Entry keys sort by ID type, then by key
+    return f"{id_type}\x1f{key}"
+
+
+def _string_table(strings):
+    return strings if isinstance(strings, StringTable) else StringTable.from_strings(strings)
+
@@ -0,0 +1,271 @@
+"""
+Timing spans and counters around the app's hot paths.
+
+Off unless SCLEROBASE_INSTRUMENT=1 or SCLEROBASE_INSTRUMENT_LOG=<path> is set
+in the environment; while off, span() returns a shared no-op context manager,
+timed functions only check one flag, and count() returns at once.
+
+While on, every span is:
+    - written to the JSONL log at SCLEROBASE_INSTRUMENT_LOG, if set, one
+      {"type": "span", ...} record per span, with a {"type": "rerun", ...}
+      record per Streamlit rerun and a {"type": "summary", ...} record of the
+      aggregates at most once a minute
+    - added to the current rerun's trace (see rerun_trace), which main.py
+      shows in a sidebar expander when the page is opened with ?debug=1
+    - added to process-wide aggregates of the last RECENT_SPANS durations
+      per span name, for p50/p95 figures (see summary)
+
+Spans of renders on the shared plot pool are added to the trace of the rerun
+that submitted them. Aggregate the logs of several processes, e.g. the
+workers of serve.py, with:
+    python app/instrumentation.py instrumentation.jsonl
+"""
+import argparse
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict, deque
+from contextlib import contextmanager, nullcontext
+
+# Durations kept per span name for the percentiles
+RECENT_SPANS = 1000
+# Seconds between summary records in the log
+SUMMARY_INTERVAL = 60
+
+_enabled = False
+_log_file = None
+_lock = threading.Lock()
+_durations = defaultdict(lambda: deque(maxlen=RECENT_SPANS))
+_span_counts = defaultdict(int)
+_counters = defaultdict(int)
+_last_summary = 0.0
+_NULL_SPAN = nullcontext()
+# Trace of the rerun running in this context: list of (name, milliseconds) and a counter dict
+_trace = contextvars.ContextVar("trace", default=None)
+
+
+def enable(log_path=None):
+    """Turn instrumentation on, appending JSONL records to log_path if given."""
+    global _enabled, _log_file
+    with _lock:
+        if _log_file is not None:
+            _log_file.close()
+        _log_file = open(log_path, "a", buffering=1, encoding="utf-8") if log_path else None
+        _enabled = True
+
+
+def disable():
+    """Turn instrumentation off and close the log."""
+    global _enabled, _log_file
+    with _lock:
+        _enabled = False
+        if _log_file is not None:
+            _log_file.close()
+        _log_file = None
+
+
+def is_enabled():
+    return _enabled
+
+
+def reset():
+    """Forget the aggregates and counters."""
+    with _lock:
+        _durations.clear()
+        _span_counts.clear()
+        _counters.clear()
+
+
+def _write(record):
+    # Called with _lock held
+    if _log_file is not None:
+        _log_file.write(json.dumps(record, default=str) + "\n")
+
+
+def _record(name, milliseconds, fields):
+    trace = _trace.get()
+    if trace is not None:
+        trace["spans"].append((name, milliseconds))
+    with _lock:
+        _durations[name].append(milliseconds)
+        _span_counts[name] += 1
+        if _log_file is not None:
+            _write({
+                "type": "span",
+                "name": name,
+                "ms": round(milliseconds, 3),
+                "time": time.time(),
+                "pid": os.getpid(),
+                "thread": threading.current_thread().name,
+                "rerun": trace["id"] if trace is not None else None,
+                **fields,
+            })
+
+
+@contextmanager
+def _span(name, fields):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _record(name, (time.perf_counter() - start) * 1000, fields)
+
+
+def span(name, **fields):
+    """
+    Time the enclosed block as a span called name; fields are added to its log record.
+
+        with span("get_data"):
+            metadata, proteins, volcano = get_data()
+    """
+    if not _enabled:
+        return _NULL_SPAN
+    return _span(name, fields)
+
+
+def timed(name=None):
+    """Decorator timing every call of a function as a span (by default named after the function)."""
+    def decorator(function):
+        span_name = name or function.__name__
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return function(*args, **kwargs)
+            with _span(span_name, {}):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def count(name, n=1):
+    """Add n to the counter called name, e.g. "render_cache.hit"."""
+    if not _enabled:
+        return
+    trace = _trace.get()
+    if trace is not None:
+        trace["counters"][name] += n
+    with _lock:
+        _counters[name] += n
+
+
+@contextmanager
+def rerun_trace(**fields):
+    """
+    Collect the spans and counters of one Streamlit rerun, and yield them.
+
+    Yields a dict with "spans" (list of (name, milliseconds)), "counters" and
+    "start" (its time.perf_counter()), or None while instrumentation is off.
+    fields are added to the rerun's log record.
+    """
+    if not _enabled:
+        yield None
+        return
+    trace = {"id": uuid.uuid4().hex[:12], "start": time.perf_counter(), "spans": [], "counters": defaultdict(int)}
+    token = _trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _trace.reset(token)
+        milliseconds = (time.perf_counter() - trace["start"]) * 1000
+        global _last_summary
+        with _lock:
+            _durations["rerun"].append(milliseconds)
+            _span_counts["rerun"] += 1
+            if _log_file is not None:
+                _write({
+                    "type": "rerun",
+                    "rerun": trace["id"],
+                    "ms": round(milliseconds, 3),
+                    "time": time.time(),
+                    "pid": os.getpid(),
+                    "spans": len(trace["spans"]),
+                    "counters": dict(trace["counters"]),
+                    **fields,
+                })
+                if time.monotonic() - _last_summary > SUMMARY_INTERVAL:
+                    _last_summary = time.monotonic()
+                    _write({"type": "summary", "time": time.time(), "pid": os.getpid(), **_summary()})
+
+
+def _percentile(sorted_values, q):
+    # Nearest-rank percentile of a non-empty sorted list
+    return sorted_values[min(len(sorted_values) - 1, int(q / 100 * len(sorted_values)))]
+
+
+def _aggregate(durations, total_count=None):
+    values = sorted(durations)
+    return {
+        "count": len(values) if total_count is None else total_count,
+        "p50_ms": round(_percentile(values, 50), 3),
+        "p95_ms": round(_percentile(values, 95), 3),
+        "max_ms": round(values[-1], 3),
+    }
+
+
+def _summary():
+    # Called with _lock held
+    return {
+        "spans": {name: _aggregate(durations, _span_counts[name]) for name, durations in _durations.items() if durations},
+        "counters": dict(_counters),
+    }
+
+
+def summary():
+    """
+    Process-wide aggregates: {"spans": {name: {count, p50_ms, p95_ms, max_ms}}, "counters": {name: total}}.
+
+    Percentiles are over the last RECENT_SPANS spans of each name; count is of all of them.
+    """
+    with _lock:
+        return _summary()
+
+
+def trace_breakdown(trace):
+    """Rows of one rerun's trace per span name (calls, total and max ms), slowest total first."""
+    rows = defaultdict(lambda: {"calls": 0, "total_ms": 0.0, "max_ms": 0.0})
+    for name, milliseconds in trace["spans"]:
+        row = rows[name]
+        row["calls"] += 1
+        row["total_ms"] += milliseconds
+        row["max_ms"] = max(row["max_ms"], milliseconds)
+    return sorted(({"span": name, **row} for name, row in rows.items()), key=lambda row: row["total_ms"], reverse=True)
+
+
+def summarize_log(lines):
+    """Aggregate the span records of JSONL log lines into {name: {count, p50_ms, p95_ms, max_ms}}."""
+    durations = defaultdict(list)
+    for line in lines:
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue  # A line cut short by a crash
+        if record.get("type") in ("span", "rerun"):
+            durations[record.get("name", "rerun")].append(record["ms"])
+    return {name: _aggregate(values) for name, values in durations.items()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Summarize instrumentation logs: p50/p95 per span.")
+    parser.add_argument("logs", nargs="+", help="JSONL logs written with SCLEROBASE_INSTRUMENT_LOG.")
+    args = parser.parse_args(argv)
+
+    lines = []
+    for path in args.logs:
+        with open(path, encoding="utf-8") as log:
+            lines.extend(log)
+    print(f"{'span':<32} {'count':>8} {'p50 ms':>10} {'p95 ms':>10} {'max ms':>10}")
+    for name, row in sorted(summarize_log(lines).items(), key=lambda item: item[1]["p95_ms"], reverse=True):
+        print(f"{name:<32} {row['count']:>8} {row['p50_ms']:>10.1f} {row['p95_ms']:>10.1f} {row['max_ms']:>10.1f}")
+
+
+if os.environ.get("SCLEROBASE_INSTRUMENT") or os.environ.get("SCLEROBASE_INSTRUMENT_LOG"):
+    enable(os.environ.get("SCLEROBASE_INSTRUMENT_LOG"))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,27 @@
 import streamlit as st
 import pandas as pd
-import matplotlib.pyplot as plt
+import time
 from pathlib import Path
-# This section should be uncommented when plotting UMAP and Violin plots directly from python. This imports the data file
-from dataloader import load_data, load_singlecell_data
-from plots.Correlation import filter_data, plot_correlation
-from plots.boxplot import plot_boxplot
-from plots.volcano import plot_volcano
+from dataplane import format_bytes, session_bytes, shared_objects
+from differential import Contrast, contrast_columns, differential_expression
+from instrumentation import count, rerun_trace, span, summary, trace_breakdown
+from prewarm import start_prewarm
+from screening import correlation_screen, numeric_columns
+from singlecell import SINGLECELL_FILENAME, SINGLECELL_STORE_DIRNAME
+from plots.Correlation import filter_data
+from plots.comparison import comparison_data, plot_comparison_boxplot, plot_comparison_correlation
+from plots.render import render_cache, submit_protein_plots
+from plots.volcano import VolcanoData, plot_volcano
 
 # Get current file path
 BASE_PATH = Path(__file__).parent
 
-# Construct paths
-METADATA_PATH = str(BASE_PATH.parent / "Core data/somalogic_metadata.csv")
-PROTEINS_PATH = str(BASE_PATH.parent / "Core data/proteins_plot.csv")
-VOLCANO_PATH = str(BASE_PATH.parent / "Core data/SSC_all_Healthy_allproteins.csv")
-
-# This code should be uncommented to plot UMAP and Violin plots directly from python. This loads the path to the data file (downloaded from the google drive link in Core data) which should be saved in Core data
-# SINGLECELLADATA_PATH = str(BASE_PATH.parent / "Core data")
-# SSC_HEALTHY_PROTS_PATH = str(BASE_PATH.parent / "Core data/SSC_all_Healthy_allproteins.csv")
+# UMAP and Violin plots are shown when the single-cell data file (downloaded from the google drive link in Core data) is saved in Core data,
+# or when the arrays built from it by `python app/singlecell.py` are
+SINGLECELL_AVAILABLE = (
+    (BASE_PATH.parent / "Core data" / SINGLECELL_FILENAME).exists()
+    or (BASE_PATH.parent / "Core data" / SINGLECELL_STORE_DIRNAME / "store.json").exists()
+)
 
 # Set page configuration
 st.set_page_config(
@@ -95,17 +98,126 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
-@st.cache_data
-def get_data():
-    """Load and cache metadata and protein data."""
-    metadata, proteins = load_data(METADATA_PATH, PROTEINS_PATH)
-    volcano = pd.read_csv(VOLCANO_PATH)  # Load the volcano dataset separately
-    return metadata, proteins, volcano
+# Data shared by all sessions is cached with st.cache_resource: one read-only copy per
+# process (see dataplane.py), where st.cache_data would unpickle a copy for every call.
+# Sessions keep only keys to it (dataset ids, SeqIds, identifiers, contrasts) in st.session_state.
+def get_registry():
+    """
+    The datasets of the manifest (see registry.py), loaded into a memory-bounded LRU
+    and warmed in the background from the first call in this process (see prewarm.py).
+    """
+    return start_prewarm().registry
+
+def get_data(dataset):
+    """Metadata, protein data and first contrast table of a dataset (read through the on-disk cache in datacache.py)."""
+    return get_registry().cohort(dataset)
+
+@st.cache_resource(max_entries=32)
+def get_differential(dataset, version, column, case, control):
+    """Differential expression of one contrast, computed once per dataset version and contrast."""
+    count("cache.get_differential.miss")
+    _, proteins, _ = get_data(dataset)
+    return differential_expression(proteins, Contrast(column, case, control))
+
+@st.cache_resource(max_entries=32)
+def get_volcano(dataset, version, contrast):
+    """Volcano plot arrays of a published contrast table (by id) or of a Contrast, derived once."""
+    count("cache.get_volcano.miss")
+    if isinstance(contrast, str):
+        return VolcanoData(get_registry().contrast(dataset, contrast))
+    return VolcanoData(get_differential(dataset, version, *contrast))
+
+@st.cache_resource(max_entries=32)
+def get_correlation_screen(dataset, version, column, log2):
+    """Correlation of every protein with a metadata column, computed once per dataset version and column."""
+    count("cache.get_correlation_screen.miss")
+    _, proteins, _ = get_data(dataset)
+    return correlation_screen(proteins, column, log2=log2)
+
+@st.cache_data(max_entries=4)
+def get_condition_summary_csv(dataset, version):
+    """CSV of the per-condition summary statistics of all proteins, built once per dataset version."""
+    _, proteins, _ = get_data(dataset)
+    annotations = proteins.annotations[[name for name in ["SeqId", "Target", "EntrezGeneSymbol", "TargetFullName"]
+                                        if name in proteins.annotations.columns]]
+    return proteins.condition_summary.to_frame(annotations).to_csv(index=False).encode()
+
+def dataset_picker(registry):
+    """Dataset selectbox, shown when the manifest lists more than one cohort; returns the selected cohort id."""
+    if len(registry.cohorts) == 1:
+        return registry.default
+
+    def reset_plots():
+        # SeqIds and contrasts of the previous dataset may not exist in the new one
+        st.session_state["active_button"] = None
+        st.session_state["show_all_selected"] = False
+
+    return st.selectbox(
+        "Dataset:",
+        list(registry.cohorts),
+        format_func=lambda cohort_id: registry.cohorts[cohort_id].title,
+        key="dataset",
+        on_change=reset_plots,
+    )
+
+def volcano_panel(registry, dataset, metadata, proteins):
+    """Volcano plot of a published contrast table of the dataset, or of any two groups of a metadata column."""
+    tables = {f"Published: {table.title}": table for table in registry.cohorts[dataset].contrasts}
+    contrast_options = contrast_columns(metadata)
+    contrast_col1, contrast_col2, contrast_col3 = st.columns([2, 1, 1])
+    with contrast_col1:
+        contrast_column = st.selectbox(
+            "Volcano contrast:",
+            list(tables) + list(contrast_options),
+            key="contrast_column",
+        )
+    if contrast_column in contrast_options:
+        levels = contrast_options[contrast_column]
+        with contrast_col2:
+            case = st.selectbox("Case:", levels, index=len(levels) - 1, key="contrast_case")
+        with contrast_col3:
+            control = st.selectbox("Control:", [level for level in levels if level != case], key="contrast_control")
+        contrast = Contrast(contrast_column, case, control)
+        with span("get_volcano"):
+            volcano_data = get_volcano(dataset, proteins.version, contrast)
+        plot_volcano(volcano_data, title=f"{contrast.title} Proteins", figure_key=(proteins.version, contrast))
+    else:
+        # prewarm.py builds the figure of the first table under the same title and key
+        table = tables.get(contrast_column, registry.cohorts[dataset].contrasts[0])
+        with span("get_volcano"):
+            volcano_data = get_volcano(dataset, proteins.version, table.id)
+        plot_volcano(volcano_data, title=f"{table.title} Proteins", figure_key=(proteins.version, table.id))  # Generate the plot
+
+def correlation_screen_table(dataset, metadata, proteins):
+    """Searchable table of all proteins ranked by their correlation with a numeric metadata column."""
+    with st.expander("Correlation screen: all proteins against mRSS"):
+        columns = numeric_columns(metadata)
+        screen_col1, screen_col2, screen_col3 = st.columns([2, 1, 2])
+        with screen_col1:
+            column = st.selectbox(
+                "Correlate with:", columns,
+                index=columns.index("Total_mRss") if "Total_mRss" in columns else 0,
+                key="screen_column",
+            )
+        with screen_col2:
+            log2 = st.checkbox("Log₂ intensities", key="screen_log2")
+        with screen_col3:
+            search = st.text_input("Search proteins:", key="screen_search")
+
+        results = get_correlation_screen(dataset, proteins.version, column, log2)
+        if search:
+            text = results[[name for name in results.columns if results[name].dtype == object]].astype(str)
+            matches = text.apply(lambda values: values.str.contains(search, case=False, regex=False)).any(axis=1)
+            results = results[matches]
+        st.dataframe(results, hide_index=True, width="stretch")
 
 def home():
 
-    # Load data
-    metadata, proteins, volcano = get_data()
+    # The page is laid out before the selected dataset is read, with placeholders for what needs it,
+    # so that a visitor sees it at once even while the dataset is still loading (or being prewarmed)
+    registry = get_registry()
+    dataset = dataset_picker(registry)
+    loading = not registry.loaded(dataset)
 
     # Create two columns with custom width proportions
     col1, col2 = st.columns([3, 4])  # col1 will take up 2/5 of the space, col2 will take up 3/5
@@ -174,14 +286,17 @@ def home():
 
     # Right Column: Volcano Plot
     with col2:
-        
-        plot_volcano(volcano)  # Generate the plot
+        volcano_slot = st.empty()
+        if loading:
+            volcano_slot.info("Loading the volcano plot...")
 
 
     st.markdown("""
         <h2 style='margin-top: -20px;'></h2>
     """, unsafe_allow_html=True)
 
+    screen_slot = st.empty()
+
     st.markdown("""
         <h2 style='color: green;'>Protein Search</h2>
     """, unsafe_allow_html=True)
@@ -189,7 +304,7 @@ def home():
     st.markdown(
         """
         <p style='font-size: 18px; line-height: 1.5; font-style: italic'>
-            Search for a protein using one of four reference types below, 
+            Search for a protein by any of its four reference types below, 
             and click on <b>Generate Plots</b> to see results. 
             If you are interested in the protein, select <b>Add Protein</b> 
             on the right-hand side. Then, at any time, you can 
@@ -201,16 +316,6 @@ def home():
     )
 
 
-    if "protein_options" not in st.session_state:
-    # Load and cache data
-        metadata, proteins, _ = get_data()
-        st.session_state["protein_options_map"] = {
-            "EntrezGeneID": proteins["EntrezGeneID"].dropna().unique().tolist(),
-            "EntrezGeneSymbol": proteins["EntrezGeneSymbol"].dropna().unique().tolist(),
-            "TargetFullName": proteins["TargetFullName"].dropna().unique().tolist(),
-            "Target": proteins["Target"].dropna().unique().tolist(),
-        }
-    
     def generate_and_display_plots(button_name, id_type, protein_id, button_key):
 
         # Button for generating plots
@@ -221,15 +326,15 @@ def home():
             else:
                 try:
                     # Load data and cache in session state
-                    metadata, proteins, volcano = get_data()
-                    filtered_data, metadata_info = filter_data(proteins, metadata, protein_id, id_type)
-                    protein_name = filtered_data["TargetFullName"].iloc[0]
+                    metadata, proteins, volcano = get_data(dataset)
+                    filtered_data, _ = filter_data(proteins, metadata, protein_id, id_type)
 
-                    # Store data in session state
+                    # Store keys to the shared data in session state, not the data itself
                     st.session_state["plot_data"] = {
-                        "filtered_data": filtered_data,
-                        "metadata_info": metadata_info,
-                        "protein_name": protein_name,
+                        "seq_id": filtered_data["SeqId"].iloc[0],
+                        "protein_name": filtered_data["TargetFullName"].iloc[0],
+                        "id_type": id_type,
+                        "protein_id": protein_id,
                     }
 
                 except Exception as e:
@@ -241,20 +346,55 @@ def home():
             try:
                 data = st.session_state["plot_data"]
                 protein_name = data["protein_name"]
-                filtered_data = data["filtered_data"]
-                metadata_info = data["metadata_info"]
+                seq_id = data["seq_id"]
                 
                 # Add tabs and display plots
-                corr_tab, box_tab= st.tabs(['Correlation Plot', 'Box Plot'])
+                tab_names = ['Correlation Plot', 'Box Plot']
+                if SINGLECELL_AVAILABLE:
+                    tab_names += ['UMAP', 'Violin Plot']
+                tabs = st.tabs(tab_names)
+                corr_tab, box_tab = tabs[:2]
+
+                # Rendered images are shared by all sessions, keyed by (plot type, SeqId, dataset version, style).
+                # Misses are submitted together so they render in parallel on the shared worker pool.
+                _, proteins, _ = get_data(dataset)
+                images = submit_protein_plots(proteins, seq_id, protein_name)
+                # Single-cell plots read one gene, resolved in the selected dataset, from the shared, backed h5ad handle
+                if SINGLECELL_AVAILABLE:
+                    from plots.umap import plot_umap
+                    from plots.violin import plot_violin
+
+                    gene = proteins.index.symbol(data["id_type"], data["protein_id"])
+                    images["umap"] = render_cache.submit(("umap", gene), lambda: plot_umap(gene))
+                    images["violin"] = render_cache.submit(("violin", gene), lambda: plot_violin(gene))
+
                 with corr_tab:
                     # st.subheader(f"Correlation Plot for {protein_name}")
-                    corr_plot = plot_correlation(filtered_data, metadata_info, protein_name)
-                    st.pyplot(corr_plot)
+                    st.image(images["correlation"].result(), width="stretch")
 
                 with box_tab:
                     # st.subheader(f"Box Plot for {protein_name}")
-                    box_plot = plot_boxplot(filtered_data, metadata_info, protein_name)
-                    st.pyplot(box_plot)
+                    st.image(images["boxplot"].result(), width="stretch")
+                    st.download_button(
+                        "Download per-condition statistics of all proteins (CSV)",
+                        lambda: get_condition_summary_csv(dataset, proteins.version),
+                        file_name="condition_summary.csv",
+                        mime="text/csv",
+                        key=f"{button_key}_summary_download",
+                    )
+
+                if SINGLECELL_AVAILABLE:
+                    umap_tab, violin_tab = tabs[2:]
+                    with umap_tab:
+                        st.image(images["umap"].result(), width="stretch")
+                    with violin_tab:
+                        st.image(images["violin"].result(), width="stretch")
+
+                cache_stats = render_cache.stats()
+                st.sidebar.caption(
+                    f"Plot cache: {cache_stats['hits']} hits, {cache_stats['misses']} misses, "
+                    f"{cache_stats['entries']} images ({cache_stats['bytes'] / 1e6:.1f} MB)"
+                )
 
             except Exception as e:
                 st.error(f"An error occurred while displaying the plots: {str(e)}")
@@ -264,21 +404,33 @@ def home():
     #Dropdown box
     col1, col2 = st.columns([2, 2])  # Two equal-width columns (1:1)
     with col1:
-        id_type = st.selectbox(
-            "Select Protein Reference Type:",
-            ["EntrezGeneID", "EntrezGeneSymbol", "TargetFullName", "Target"]
+        # Ranked matches over all four reference types, computed on the server; only the top few reach the browser
+        search_text = st.text_input(
+            "Search for a protein:",
+            key="protein_search",
+            placeholder="Gene symbol, Entrez Gene ID, target or full name, e.g. THBS1",
+            help="Searches all four reference types; close spellings are suggested too.",
         )
-        
-        # Update the options based on the selected reference type
-        protein_options = st.session_state["protein_options_map"][id_type]
-
-        # Create an autocomplete selectbox for protein ID suggestions
-        protein_id = st.selectbox(
-            "Enter or select Protein ID:",
-            options=[""] + protein_options,  # Add an empty default option for manual input
-            index=0,
-            help=f"Select or type a valid {id_type} from the dataset."
+        match_slot = st.empty()
+        if loading:
+            match_slot.selectbox("Select Protein ID:", [], placeholder="Loading the protein index...", disabled=True,
+                                 key="protein_match_loading")
+
+    with span("get_data"):
+        metadata, proteins, volcano = get_data(dataset)
+    with volcano_slot.container():
+        volcano_panel(registry, dataset, metadata, proteins)
+
+    with col1:
+        with span("search"):
+            matches = proteins.search.search(search_text) if search_text else []
+        match = match_slot.selectbox(
+            "Select Protein ID:",
+            matches,
+            format_func=lambda match: match.label,
+            help="Best matches first, with the reference type each one matched.",
         )
+        id_type, protein_id = (match.id_type, match.value) if match else (None, None)
 
         generate_and_display_plots("Generate Plots", id_type, protein_id, "generate_plots_button")
 
@@ -335,7 +487,90 @@ def home():
         st.markdown("<div style='padding-top: 27px;'></div>", unsafe_allow_html=True)
         generate_and_display_plots("Generate Comparison", selected_id_type, selected_protein, "compare_proteins_button")
 
- 
+    # Filled last: the first screen of a column takes a moment to compute
+    with screen_slot.container():
+        correlation_screen_table(dataset, metadata, proteins)
+
+    compare_all_selected(dataset)
+    session_memory_report(dataset)
+
+def compare_all_selected(dataset):
+    """Small-multiple correlation and box plots of every protein in the comparison list at once."""
+    selected_proteins = st.session_state.get("selected_proteins", [])
+    if not selected_proteins:
+        return
+
+    st.markdown("""
+        <h2 style='color: green;'>Compare Selected Proteins</h2>
+    """, unsafe_allow_html=True)
+    button_col, zscore_col = st.columns([1, 3])
+    with zscore_col:
+        zscore = st.checkbox("Z-score each protein", key="comparison_zscore",
+                             help="Scale each protein to mean 0 and SD 1, to compare their patterns rather than levels.")
+    with button_col:
+        if st.button("Plot All Selected", key="compare_all_button"):
+            st.session_state["show_all_selected"] = True
+    if not st.session_state.get("show_all_selected"):
+        return
+
+    try:
+        _, proteins, _ = get_data(dataset)
+        # One slice of the intensity matrix for all selected proteins
+        seq_ids, labels, values = comparison_data(proteins, selected_proteins, zscore=zscore)
+        if not seq_ids:
+            st.error("None of the selected proteins were found.")
+            return
+
+        key = (tuple(seq_ids), tuple(labels), proteins.version, zscore)
+        correlation_image = render_cache.submit(
+            ("comparison_correlation",) + key,
+            lambda: plot_comparison_correlation(proteins, labels, values, zscore=zscore),
+        )
+        box_image = render_cache.submit(
+            ("comparison_boxplot",) + key,
+            lambda: plot_comparison_boxplot(proteins, seq_ids, labels, values, zscore=zscore),
+        )
+        corr_tab, box_tab = st.tabs(['Correlation Plots', 'Box Plots'])
+        with corr_tab:
+            st.image(correlation_image.result(), width="stretch")
+        with box_tab:
+            st.image(box_image.result(), width="stretch")
+    except Exception as e:
+        st.error(f"An error occurred while displaying the comparison: {str(e)}")
+
+
+def session_memory_report(dataset):
+    """Sidebar report of the memory held by this session, next to the data all sessions share."""
+    metadata, proteins, volcano = get_data(dataset)
+    sizes = session_bytes(st.session_state, exclude=shared_objects(metadata, proteins, volcano))
+    datasets = get_registry().stats()
+    with st.sidebar.expander(f"Session memory: {format_bytes(sum(sizes.values()))}"):
+        st.caption(
+            f"Shared by all sessions: {format_bytes(datasets['bytes'])} in {len(datasets['loaded'])} loaded "
+            f"datasets and tables (at most {format_bytes(datasets['max_bytes'])})"
+        )
+        st.dataframe(pd.DataFrame({"key": list(sizes), "bytes": list(sizes.values())}), hide_index=True)
+
+
+def timing_panel(trace):
+    """Sidebar breakdown of the spans of this rerun so far, next to their p50/p95 in this process."""
+    aggregates = summary()["spans"]
+    rows = pd.DataFrame(trace_breakdown(trace), columns=["span", "calls", "total_ms", "max_ms"])
+    rows["p50_ms"] = [aggregates.get(name, {}).get("p50_ms") for name in rows["span"]]
+    rows["p95_ms"] = [aggregates.get(name, {}).get("p95_ms") for name in rows["span"]]
+    elapsed = (time.perf_counter() - trace["start"]) * 1000
+    with st.sidebar.expander(f"Timing of this rerun: {elapsed:.0f} ms", expanded=True):
+        st.caption("Spans nest (e.g. png_encode runs inside a plot render), so their totals overlap.")
+        st.dataframe(rows.round(1), hide_index=True)
+        if trace["counters"]:
+            st.caption(", ".join(f"{name}: {value}" for name, value in sorted(trace["counters"].items())))
+        stages = start_prewarm().status()
+        if stages:
+            st.caption("Prewarm: " + ", ".join(
+                f"{name} {stage['state']}" + (f" in {stage['seconds']:.1f} s" if stage["seconds"] is not None else "")
+                for name, stage in stages.items()
+            ))
+
 
 def research():
     """Research page with publications."""
@@ -431,16 +666,19 @@ def main():
     page = query_params.get("page", "home")  # Default to "home" if no page is specified
 
     # Render the selected page
-    if page == "home":
-        home()
-    elif page == "research":
-        research()
-    elif page == "about":
-        about()
-    elif page == "data":
-        data()
-    elif page == "contact":
-        contact()
+    with rerun_trace(page=page) as trace:
+        if page == "home":
+            home()
+        elif page == "research":
+            research()
+        elif page == "about":
+            about()
+        elif page == "data":
+            data()
+        elif page == "contact":
+            contact()
+        if trace is not None and "debug" in query_params:
+            timing_panel(trace)
 
 if __name__ == "__main__":
     main()
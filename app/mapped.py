@@ -0,0 +1,148 @@
+"""
+Array-backed containers that can live in memory-mapped files.
+
+Python lists and dicts of strings are private to each process. StringTable
+keeps strings in one UTF-8 buffer with offsets, and StringIndex finds them by
+binary search over a sorted order, so lookup structures become a few numpy
+arrays. save_arrays writes such arrays as .npy files, and load_arrays maps
+them read-only: every process serving the same files then shares a single
+copy through the OS page cache.
+"""
+import json
+from collections.abc import Mapping, Sequence
+from pathlib import Path
+
+import numpy as np
+
+ARRAYS_MANIFEST = "arrays.json"
+
+
+class StringTable(Sequence):
+    """
+    Immutable sequence of strings held in one UTF-8 buffer.
+
+    String i is data[offsets[i]:offsets[i + 1] - 1]; every string is followed
+    by a NUL byte, so a substring search of the whole buffer never matches
+    across two strings.
+    """
+
+    def __init__(self, data, offsets):
+        self.data = data
+        self.offsets = offsets
+
+    @classmethod
+    def from_strings(cls, strings):
+        """Build a table from an iterable of str."""
+        encoded = [string.encode("utf-8") + b"\0" for string in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(item) for item in encoded], out=offsets[1:])
+        return cls(np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            start, stop, step = i.indices(len(self))
+            if step != 1:
+                return [self[j] for j in range(start, stop, step)]
+            if start >= stop:
+                return []
+            return self.data[self.offsets[start]:self.offsets[stop] - 1].tobytes().decode("utf-8").split("\0")
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("StringTable index out of range")
+        return self.data[self.offsets[i]:self.offsets[i + 1] - 1].tobytes().decode("utf-8")
+
+    def tolist(self):
+        """Decode every string at once."""
+        return self[:]
+
+    def locate(self, byte_positions):
+        """Return the index of the string containing each byte position of data."""
+        return np.searchsorted(self.offsets, byte_positions, side="right") - 1
+
+    def arrays(self, name):
+        """Return the arrays of the table under name, for save_arrays."""
+        return {f"{name}.data": self.data, f"{name}.offsets": self.offsets}
+
+    @classmethod
+    def from_arrays(cls, arrays, name):
+        """Rebuild a table from the arrays returned by arrays(name)."""
+        return cls(arrays[f"{name}.data"], arrays[f"{name}.offsets"])
+
+
+def sorted_order(strings):
+    """Return the positions of strings in sorted order, as an int32 array."""
+    return np.array(sorted(range(len(strings)), key=strings.__getitem__), dtype=np.int32)
+
+
+def bisect_strings(strings, order, key, hi=None):
+    """
+    Return the first position p of order with strings[order[p]] >= key, like
+    bisect.bisect_left on the sorted strings, decoding only O(log n) of them.
+    """
+    lo, hi = 0, len(order) if hi is None else hi
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if strings[order[mid]] < key:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+class StringIndex(Mapping):
+    """Read-only map from each of a sequence of distinct strings to its position, by binary search."""
+
+    def __init__(self, strings, order=None):
+        """
+        Parameters:
+        - strings (sequence of str): Distinct strings, e.g. a StringTable.
+        - order (np.ndarray, optional): sorted_order(strings), e.g. read back from disk.
+        """
+        self.strings = strings
+        self.order = sorted_order(strings) if order is None else order
+
+    def get(self, key, default=None):
+        if not isinstance(key, str):
+            return default
+        p = bisect_strings(self.strings, self.order, key)
+        if p < len(self.order) and self.strings[self.order[p]] == key:
+            return int(self.order[p])
+        return default
+
+    def __getitem__(self, key):
+        position = self.get(key)
+        if position is None:
+            raise KeyError(key)
+        return position
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __iter__(self):
+        return iter(self.strings)
+
+    def __len__(self):
+        return len(self.strings)
+
+
+def save_arrays(directory, arrays):
+    """Write each named array to directory as an .npy file, with a manifest of the names."""
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    for name, array in arrays.items():
+        np.save(directory / f"{name}.npy", np.ascontiguousarray(array))
+    with open(directory / ARRAYS_MANIFEST, "w") as manifest_file:
+        json.dump(sorted(arrays), manifest_file)
+
+
+def load_arrays(directory, mmap_mode="r"):
+    """Map every array written by save_arrays; with mmap_mode "r" they are read-only and shared between processes."""
+    directory = Path(directory)
+    with open(directory / ARRAYS_MANIFEST) as manifest_file:
+        names = json.load(manifest_file)
+    # Plain ndarray views of the maps: slicing a np.memmap is several times slower
+    return {name: np.load(directory / f"{name}.npy", mmap_mode=mmap_mode).view(np.ndarray) for name in names}
@@ -1,15 +1,21 @@
 import pandas as pd
 import numpy as np
-import seaborn as sns
-import matplotlib.pyplot as plt
-from matplotlib.ticker import LogLocator, LogFormatterSciNotation, NullFormatter
+from identifiers import normalize_identifier
+from instrumentation import timed
+from protein_store import ProteinStore, rank_seqids
 
 
 #To filter the data based on entries
-def filter_data(proteins, metadata, protein_id, id_type):
+@timed("filter_data")
+def filter_data(proteins, metadata, protein_id, id_type, min_coverage=None):
     """
     Filter the proteins data for a specific protein ID based on the ID type
     and retrieve corresponding metadata information.
+
+    proteins may be the long-format DataFrame or a ProteinStore; both return
+    the same (final_data, metadata_info) pair. When several SeqIds measure the
+    protein, those covering min_coverage patients (default: every subject in
+    metadata) are preferred. A ProteinStore uses the SeqIds it chose at load time.
     """
     valid_columns = {
         "TargetFullName": "TargetFullName",
@@ -23,17 +29,24 @@ def filter_data(proteins, metadata, protein_id, id_type):
 
     column_name = valid_columns[id_type]
 
+    # A protein store slices the protein's column instead of scanning the long table
+    if isinstance(proteins, ProteinStore):
+        return proteins.filter_data(column_name, protein_id)
+
     if column_name not in proteins.columns:
         raise KeyError(f"Column '{column_name}' not found in proteins data.")
 
-    # Filter proteins data for the given protein ID
+    # Filter proteins data for the given protein ID; typed tables
+    # (dataloader.read_long_table) hold identifiers as text, e.g. EntrezGeneID "1415"
+    if isinstance(proteins[column_name].dtype, pd.CategoricalDtype):
+        protein_id = normalize_identifier(protein_id)
     filtered_data = proteins[proteins[column_name] == protein_id]
     if filtered_data.empty:
         raise ValueError(f"No data found for {id_type} = {protein_id}.")
 
     # Group by SeqID and calculate mean intensity for each
     seqid_groups = (
-        filtered_data.groupby("SeqId")
+        filtered_data.groupby("SeqId", observed=True)
         .agg(
             mean_intensity=("Intensity", "mean"),
             patient_count=("SampleId", "nunique"),
@@ -41,26 +54,11 @@ def filter_data(proteins, metadata, protein_id, id_type):
         .reset_index()
     )
 
-    # Drop SeqIDs that don't cover all 13 patients
-    seqid_groups = seqid_groups[seqid_groups["patient_count"] == 13]
-
-    # If no SeqIDs cover all 13 patients, proceed with the ones that cover the most
-    if seqid_groups.empty:
-        max_patients = filtered_data["SampleId"].nunique()
-        seqid_groups = (
-            filtered_data.groupby("SeqId")
-            .agg(
-                mean_intensity=("Intensity", "mean"),
-                patient_count=("SampleId", "nunique"),
-            )
-            .reset_index()
-        )
-        seqid_groups = seqid_groups[seqid_groups["patient_count"] == max_patients]
-
-    # Select the SeqID with the highest mean intensity
-    selected_seqid = seqid_groups.sort_values(
-        by=["mean_intensity", "SeqId"], ascending=[False, True]
-    ).iloc[0]["SeqId"]
+    # Prefer SeqIDs that cover every patient, else the ones that cover the most,
+    # then the highest mean intensity
+    if min_coverage is None:
+        min_coverage = metadata["SubjectID"].nunique()
+    selected_seqid = rank_seqids(seqid_groups, min_coverage).iloc[0]["SeqId"]
 
     # Filter the original data for the selected SeqID
     final_data = filtered_data[filtered_data["SeqId"] == selected_seqid]
@@ -74,6 +72,7 @@ def filter_data(proteins, metadata, protein_id, id_type):
 
     return final_data, metadata_info
 
+@timed("plot_correlation")
 def plot_correlation(filtered_data, metadata_info, protein_name):
     """
     Create a scatter plot of MRSS (linear scale) vs Intensity (logarithmic scale)
@@ -85,8 +84,13 @@ def plot_correlation(filtered_data, metadata_info, protein_name):
     - protein_name (str): Name of the protein for the plot title.
 
     Returns:
-    - plt.Figure: The Matplotlib figure object containing the plot.
+    - matplotlib.figure.Figure: The figure object containing the plot, not registered with pyplot.
     """
+    # Plotting libraries load on the first plot, not with the app
+    import seaborn as sns
+    from matplotlib.figure import Figure
+    from matplotlib.ticker import FuncFormatter, LogLocator, NullFormatter
+
     # Merge filtered_data with metadata_info on SampleId
     merged_data = pd.merge(
         filtered_data,
@@ -116,8 +120,8 @@ def plot_correlation(filtered_data, metadata_info, protein_name):
     }
 
     # Initialize the plot
-    plt.figure(figsize=(10, 7))
-    ax = plt.gca()
+    fig = Figure(figsize=(10, 7))
+    ax = fig.subplots()
 
     # Create scatter plot
     sns.scatterplot(
@@ -141,12 +145,12 @@ def plot_correlation(filtered_data, metadata_info, protein_name):
     # Configure log ticks and formatter for y-axis (fixing log10 display issues)
     ax.yaxis.set_major_locator(LogLocator(base=10.0, subs=None, numticks=10))
     ax.yaxis.set_minor_locator(LogLocator(base=10.0, subs=np.arange(2, 10) * 0.1, numticks=10))
-    ax.yaxis.set_major_formatter(plt.FuncFormatter(lambda x, _: f"{int(x):g}" if x >= 1 else f"{x:.1g}"))
+    ax.yaxis.set_major_formatter(FuncFormatter(lambda x, _: f"{int(x):g}" if x >= 1 else f"{x:.1g}"))
     ax.yaxis.set_minor_formatter(NullFormatter())  # Hide minor tick labels
 
     # Add color-coded annotations for each point
     for i in range(len(merged_data)):
-        plt.text(
+        ax.text(
             mrss.iloc[i],
             intensity.iloc[i],
             condition.iloc[i],  # Text is the condition
@@ -163,18 +167,18 @@ def plot_correlation(filtered_data, metadata_info, protein_name):
         )
 
     # Set title and labels with appropriate font sizes
-    plt.title(f"Correlation Plot for {protein_name}", fontsize=16,)
-    plt.xlabel("Total mRSS", fontsize=14)
-    plt.ylabel("Intensity", fontsize=14)
+    ax.set_title(f"Correlation Plot for {protein_name}", fontsize=16,)
+    ax.set_xlabel("Total mRSS", fontsize=14)
+    ax.set_ylabel("Intensity", fontsize=14)
 
     # Customize grid for better readability
-    plt.grid(which='both', linestyle='--', linewidth=0.5, alpha=0.7)
+    ax.grid(which='both', linestyle='--', linewidth=0.5, alpha=0.7)
 
     # Adjust legend
-    plt.legend(title="Condition", fontsize=12, title_fontsize=13, loc="best")
+    ax.legend(title="Condition", fontsize=12, title_fontsize=13, loc="best")
 
     # Optimize layout
-    plt.tight_layout()
+    fig.tight_layout()
 
     # Return the Figure object instead of showing it
-    return plt.gcf()
\ No newline at end of file
+    return fig
\ No newline at end of file
@@ -1,61 +1,48 @@
 import pandas as pd
 import numpy as np
-import seaborn as sns
-import matplotlib.pyplot as plt
+from instrumentation import timed
+from summary import ConditionSummary
+
+# Define custom colours for conditions
+CUSTOM_PALETTE = {
+    "Healthy": "green",
+    "VEDOSS": "violet",
+    "SSC_low": "cyan",
+    "SSC_high": "red"
+}
 
-def plot_boxplot(filtered_data, metadata_info, protein_name):
-    # Merge filtered_data with metadata_info on SampleId
-    merged_data = pd.merge(
-        filtered_data,
-        metadata_info,
-        left_on="SampleId",
-        right_on="SubjectID",
-        how="inner"
-    )
-
-    # Check if the merge was successful and print the first few rows
-    if merged_data.empty:
-        print("Error: Merged data is empty. Please check the merge condition.")
-
-    # Create sub datasets for each condition
-    conditions = ["Healthy", "VEDOSS", "SSC_low", "SSC_high"]
-    data = [merged_data[merged_data['condition'] == condition]["Intensity"] for condition in conditions]
-
-    # Check if any condition is missing data
-    for condition, condition_data in zip(conditions, data):
-        if condition_data.empty:
-            print(f"Warning: No data for {condition}. This condition will be skipped.")
-    
-    # Remove conditions with no data to avoid issues in the boxplot
-    data = [condition_data for condition_data in data if not condition_data.empty]
-    conditions = [condition for condition, condition_data in zip(conditions, data) if not condition_data.empty]
-
-    if not data:  # If all conditions are empty
-        print("Error: All conditions have no data. Cannot plot.")
-        return
 
-    # Define custom colours for conditions
-    custom_palette = {
-        "Healthy": "green",
-        "VEDOSS": "violet",
-        "SSC_low": "cyan",
-        "SSC_high": "red"
-    }
+@timed("draw_boxplot")
+def draw_boxplot(conditions, box_stats, protein_name):
+    """
+    Draw a box plot from precomputed statistics.
+
+    Parameters:
+    - conditions (list): Condition of each box.
+    - box_stats (list): One dict per box in the format of matplotlib's Axes.bxp
+      (med, q1, q3, whislo, whishi, fliers), e.g. from ConditionSummary.box_stats.
+    - protein_name (str): Name of the protein for the plot title.
+
+    Returns:
+    - matplotlib.figure.Figure: The figure object containing the plot, not registered with pyplot.
+    """
+    from matplotlib.figure import Figure  # Loaded on the first plot, not with the app
 
     # Create the boxplot with specific whisker properties
-    fig, ax = plt.subplots(figsize=(10, 7))
-    bp = ax.boxplot(data, patch_artist=True, flierprops=dict(marker='o', color='red', markersize=5))
+    fig = Figure(figsize=(10, 7))
+    ax = fig.subplots()
+    bp = ax.bxp(box_stats, patch_artist=True, flierprops=dict(marker='o', color='red', markersize=5))
 
     # Set colours for boxes based on conditions
     for patch, condition in zip(bp['boxes'], conditions):
-        patch.set_facecolor(custom_palette[condition])
+        patch.set_facecolor(CUSTOM_PALETTE.get(condition, "grey"))
 
-    # Set the title and labels before calling show
-    plt.title(f"Box Plot for {protein_name}", fontsize=16)
-    plt.xticks(range(1, len(conditions) + 1), conditions)
-    plt.ylabel("Intensity", fontsize=12)
-    plt.grid(visible=True, linestyle="--", alpha=0.6)
-    plt.tight_layout()
+    # Set the title and labels
+    ax.set_title(f"Box Plot for {protein_name}", fontsize=16)
+    ax.set_xticks(range(1, len(conditions) + 1), conditions)
+    ax.set_ylabel("Intensity", fontsize=12)
+    ax.grid(visible=True, linestyle="--", alpha=0.6)
+    fig.tight_layout()
 
     # Set black colour for the medians
     for median in bp['medians']:
@@ -65,5 +52,26 @@ def plot_boxplot(filtered_data, metadata_info, protein_name):
     for whisker in bp['whiskers']:
         whisker.set(color='black', linewidth=2)
 
-# Return the figure
     return fig
+
+
+def plot_boxplot(filtered_data, metadata_info, protein_name):
+    """
+    Box plot of one protein's intensities per condition, from the filter_data pair.
+
+    The app draws from the statistics precomputed in ProteinStore.condition_summary
+    instead; both go through draw_boxplot.
+    """
+    # Match each sample with its condition
+    conditions = pd.Series(metadata_info["condition"].to_numpy(), index=metadata_info["SubjectID"].to_numpy())
+    conditions = conditions[~conditions.index.duplicated()]
+    sample_conditions = conditions.reindex(filtered_data["SampleId"].to_numpy()).to_numpy()
+
+    if pd.isna(sample_conditions).all():
+        print("Error: All conditions have no data. Cannot plot.")
+        return
+
+    intensities = filtered_data["Intensity"].to_numpy(dtype=np.float64).reshape(-1, 1)
+    summary = ConditionSummary(intensities, sample_conditions, ["protein"])
+    box_conditions, box_stats = summary.box_stats("protein")
+    return draw_boxplot(box_conditions, box_stats, protein_name)
@@ -0,0 +1,121 @@
+import math
+
+import numpy as np
+from plots.boxplot import CUSTOM_PALETTE
+from summary import ConditionSummary, order_conditions
+
+# Small multiples per row, and the size of each panel in inches
+PANEL_COLUMNS = 5
+PANEL_SIZE = (3.2, 2.6)
+
+
+def comparison_data(store, proteins, zscore=False):
+    """
+    Resolve the selected proteins and slice all their intensities at once.
+
+    Parameters:
+    - store (ProteinStore): Store of all samples and proteins.
+    - proteins (list): Selected proteins as {"protein_id", "selected_id_type"} dicts,
+      as kept in st.session_state["selected_proteins"].
+    - zscore (bool): Scale each protein to mean 0 and SD 1 over the samples.
+
+    Returns:
+    - tuple: (seq_ids, labels, values) with values a samples x proteins matrix;
+      proteins that are not found, or repeat an earlier SeqId, are left out.
+    """
+    seq_ids, labels = [], []
+    for protein in proteins:
+        seq_id = store.best_seqid(protein["selected_id_type"], protein["protein_id"])
+        if seq_id is not None and seq_id not in seq_ids:
+            seq_ids.append(seq_id)
+            labels.append(str(protein["protein_id"]))
+
+    values = np.asarray(store.protein_matrix(seq_ids), dtype=np.float64)
+    if zscore and len(seq_ids):
+        with np.errstate(divide="ignore", invalid="ignore"):
+            values = (values - np.nanmean(values, axis=0)) / np.nanstd(values, axis=0, ddof=1)
+    return seq_ids, labels, values
+
+
+def _panel_grid(n_panels):
+    from matplotlib.figure import Figure  # Loaded on the first plot, not with the app
+
+    n_columns = min(PANEL_COLUMNS, max(n_panels, 1))
+    n_rows = max(math.ceil(n_panels / n_columns), 1)
+    fig = Figure(figsize=(PANEL_SIZE[0] * n_columns, PANEL_SIZE[1] * n_rows))
+    axes = np.atleast_1d(fig.subplots(n_rows, n_columns, squeeze=False).ravel())
+    for ax in axes[n_panels:]:
+        ax.set_visible(False)
+    return fig, axes[:n_panels]
+
+
+def plot_comparison_correlation(store, labels, values, zscore=False):
+    """
+    Small-multiple scatter plots of mRSS against the intensity of each compared protein.
+
+    Returns:
+    - matplotlib.figure.Figure: The figure object containing the plots, not registered with pyplot.
+    """
+    conditions = store.sample_column("condition")
+    mrss = store.mrss if store.mrss is not None else store.sample_column("Total_mRss")
+    mrss = np.asarray(mrss, dtype=np.float64)
+
+    fig, axes = _panel_grid(len(labels))
+    for j, (ax, label) in enumerate(zip(axes, labels)):
+        for condition in order_conditions([value for value in conditions if value is not None]):
+            rows = (conditions == condition) & ~np.isnan(values[:, j])
+            ax.scatter(mrss[rows], values[rows, j], s=30, color=CUSTOM_PALETTE.get(condition, "grey"),
+                       edgecolor="black", linewidths=0.5, label=condition)
+        if not zscore:
+            ax.set_yscale("log")
+        ax.set_title(label, fontsize=11)
+        ax.grid(which="both", linestyle="--", linewidth=0.5, alpha=0.7)
+        ax.tick_params(labelsize=8)
+
+    for ax in axes[::PANEL_COLUMNS]:
+        ax.set_ylabel("Intensity (z-score)" if zscore else "Intensity", fontsize=9)
+    for ax in axes[-PANEL_COLUMNS:]:
+        ax.set_xlabel("Total mRSS", fontsize=9)
+    if len(axes):
+        handles, legend_labels = axes[0].get_legend_handles_labels()
+        fig.legend(handles, legend_labels, title="Condition", loc="upper right", fontsize=9)
+    fig.suptitle("Correlation Plots of Selected Proteins", fontsize=14)
+    fig.tight_layout(rect=(0, 0, 0.92, 1))
+    return fig
+
+
+def plot_comparison_boxplot(store, seq_ids, labels, values, zscore=False):
+    """
+    Small-multiple box plots per condition of each compared protein.
+
+    Raw intensities use the statistics precomputed in store.condition_summary;
+    z-scores are summarized in one vectorized pass over the compared proteins.
+
+    Returns:
+    - matplotlib.figure.Figure: The figure object containing the plots, not registered with pyplot.
+    """
+    if zscore or store.condition_summary is None:
+        summary = ConditionSummary(values, store.sample_column("condition"), seq_ids)
+    else:
+        summary = store.condition_summary
+
+    fig, axes = _panel_grid(len(labels))
+    for ax, seq_id, label in zip(axes, seq_ids, labels):
+        conditions, box_stats = summary.box_stats(seq_id)
+        bp = ax.bxp(box_stats, patch_artist=True, flierprops=dict(marker='o', color='red', markersize=3))
+        for patch, condition in zip(bp['boxes'], conditions):
+            patch.set_facecolor(CUSTOM_PALETTE.get(condition, "grey"))
+        for median in bp['medians']:
+            median.set_color('black')
+        for whisker in bp['whiskers']:
+            whisker.set(color='black', linewidth=1.5)
+        ax.set_title(label, fontsize=11)
+        ax.set_xticks(range(1, len(conditions) + 1), conditions, rotation=45, fontsize=8)
+        ax.tick_params(axis="y", labelsize=8)
+        ax.grid(visible=True, linestyle="--", alpha=0.6)
+
+    for ax in axes[::PANEL_COLUMNS]:
+        ax.set_ylabel("Intensity (z-score)" if zscore else "Intensity", fontsize=9)
+    fig.suptitle("Box Plots of Selected Proteins", fontsize=14)
+    fig.tight_layout()
+    return fig
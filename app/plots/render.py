@@ -0,0 +1,182 @@
+"""
+Encoding of matplotlib figures and a process-wide cache of the encoded images.
+
+Rendering a correlation or box plot costs far more than looking it up, and
+the same plots (e.g. THBS1) are requested again and again by every session.
+RenderCache keeps the PNG bytes of rendered plots, keyed by
+(plot type, SeqId, dataset version, style), in a memory-bounded LRU.
+
+Plots are drawn on explicit matplotlib Figure objects, never through the
+global pyplot state, so the sessions' threads cannot draw into each other's
+figures. Misses are rendered on a small shared thread pool, which bounds the
+number of figures alive at once, and every figure is released as soon as it
+is encoded.
+"""
+import contextvars
+import io
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from instrumentation import count, span
+
+# The savefig settings st.pyplot uses, so cached images look the same as before
+PNG_DPI = 200
+DEFAULT_MAX_BYTES = int(os.environ.get("SCLEROBASE_RENDER_CACHE_MB", 64)) * 1024 * 1024
+RENDER_WORKERS = int(os.environ.get("SCLEROBASE_RENDER_WORKERS", min(4, os.cpu_count() or 1)))
+
+
+def figure_to_png(fig, dpi=PNG_DPI):
+    """Encode a matplotlib figure as PNG bytes on the Agg backend, then release it."""
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+    buffer = io.BytesIO()
+    try:
+        if getattr(fig.canvas, "manager", None) is None:
+            FigureCanvasAgg(fig)  # Draw on Agg whatever the process-wide backend is
+        with span("png_encode"):
+            fig.savefig(buffer, format="png", dpi=dpi, bbox_inches="tight")
+    finally:
+        release_figure(fig)
+    return buffer.getvalue()
+
+
+def release_figure(fig):
+    """Free a figure's artists, and close it if it was created through pyplot (e.g. by scanpy)."""
+    if getattr(fig.canvas, "manager", None) is not None:
+        import matplotlib.pyplot as plt
+
+        plt.close(fig)
+    fig.clear()
+
+
+class RenderCache:
+    """Thread-safe LRU of encoded images, bounded by the total size of the bytes held."""
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, name="render_cache"):
+        self.max_bytes = max_bytes
+        self.name = name
+        self._images = OrderedDict()
+        self._size = 0
+        self._pending = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """Return the cached bytes of key, or None."""
+        with self._lock:
+            image = self._images.get(key)
+            if image is None:
+                self.misses += 1
+            else:
+                self._images.move_to_end(key)
+                self.hits += 1
+        count(f"{self.name}.{'miss' if image is None else 'hit'}")
+        return image
+
+    def put(self, key, image):
+        """Store image under key, evicting the least recently used images beyond max_bytes."""
+        if len(image) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._images:
+                self._size -= len(self._images.pop(key))
+            self._images[key] = image
+            self._size += len(image)
+            while self._size > self.max_bytes:
+                _, evicted = self._images.popitem(last=False)
+                self._size -= len(evicted)
+                self.evictions += 1
+
+    def submit(self, key, render):
+        """
+        Return a Future of the image of key.
+
+        Parameters:
+        key (tuple): (plot type, SeqId, dataset version, style...) identifying the image.
+        render (callable): Returns the matplotlib Figure to encode on a miss.
+
+        Returns:
+        concurrent.futures.Future: Resolves to the PNG bytes. A miss is rendered on
+        the shared worker pool, and concurrent requests for it share one render.
+        """
+        image = self.get(key)
+        if image is not None:
+            future = Future()
+            future.set_result(image)
+            return future
+        with self._lock:
+            future = self._pending.get(key)
+            if future is None and key in self._images:
+                # Rendered by another thread since the lookup above
+                future = Future()
+                future.set_result(self._images[key])
+            elif future is None:
+                # In the submitter's context, so the render's spans join its rerun trace
+                future = _executor.submit(contextvars.copy_context().run, self._render, key, render)
+                self._pending[key] = future
+            return future
+
+    def get_or_render(self, key, render):
+        """Return the PNG bytes of key, rendering them on a miss."""
+        return self.submit(key, render).result()
+
+    def _render(self, key, render):
+        try:
+            image = figure_to_png(render())
+            self.put(key, image)
+            return image
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+
+    def stats(self):
+        """Hit, miss and eviction counts, and the number and total size of the cached images."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._images),
+                "bytes": self._size,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._images.clear()
+            self._size = 0
+
+
+# Shared by every session of the process
+_executor = ThreadPoolExecutor(max_workers=RENDER_WORKERS, thread_name_prefix="render")
+render_cache = RenderCache()
+
+
+def submit_protein_plots(proteins, seq_id, protein_name):
+    """
+    Submit the correlation and box plot of one protein to render_cache.
+
+    Parameters:
+    proteins (ProteinStore): The dataset the protein is read from.
+    seq_id (str): SeqId of the protein.
+    protein_name (str): Title of the plots.
+
+    Returns:
+    dict: Futures of the PNG bytes, by plot type ("correlation", "boxplot").
+    """
+    from plots.Correlation import plot_correlation
+    from plots.boxplot import draw_boxplot
+
+    return {
+        "correlation": render_cache.submit(
+            ("correlation", seq_id, proteins.version, protein_name),
+            lambda: plot_correlation(*proteins.protein_frame(seq_id), protein_name),
+        ),
+        "boxplot": render_cache.submit(
+            ("boxplot", seq_id, proteins.version, protein_name),
+            lambda: draw_boxplot(*proteins.condition_summary.box_stats(seq_id), protein_name),
+        ),
+    }
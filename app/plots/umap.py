@@ -1,36 +1,94 @@
 # To run this code from python, download dataset file from google drive (link is in single_cell_data_link.txt in Core data) and move downloaded file to Core data folder
 
-import scanpy as sc
+import numpy as np
 import pandas as pd
-from matplotlib.pyplot import rc_context
-from matplotlib.colors import LinearSegmentedColormap
-from app.dataloader import load_singlecell_data,getEntrezGeneSymbol
+from matplotlib import colormaps
+from matplotlib.figure import Figure
+from matplotlib import rc_context
+from matplotlib.colors import LinearSegmentedColormap, to_rgba_array
+from matplotlib.patheffects import withStroke
+from singlecell import get_singlecell_accessor, get_singlecell_store
 
 from pathlib import Path
 
-def plot_umap(input_data_key,input_data_value):
-    EntrezGeneSymbol = getEntrezGeneSymbol(input_data_key,input_data_value)
+# Define colour map as requested by the client (from grey to blue)
+GREY_TO_BLUE = LinearSegmentedColormap.from_list("grey_to_blue", ["#d3d3d3", "blue"])
+
+def leiden_palette(store):
+    """RGBA colour of every cluster: the colours saved with the data, or matplotlib's tab20."""
+    if store.leiden_colors:
+        return to_rgba_array(store.leiden_colors)
+    tab20 = colormaps["tab20"]
+    return to_rgba_array([tab20(i % 20) for i in range(len(store.leiden_categories))])
+
+def render_umap(store, gene):
+    """
+    Draw the leiden and gene UMAP panels straight from a SingleCellStore,
+    with the same layout as sc.pl.umap but without scanpy.
+    """
+    fig = Figure(figsize=(12, 6))
+    ax_leiden, ax_gene = fig.subplots(1, 2)
+
+    umap = np.asarray(store.umap)
+    codes = np.asarray(store.leiden_codes)
+    point_size = 120000 / store.n_cells  # scanpy's default point size
+
+    # Leiden clusters with their labels placed on the data
+    ax_leiden.scatter(umap[:, 0], umap[:, 1], c=leiden_palette(store)[codes], s=point_size, linewidths=0, rasterized=True)
+    for code, name in enumerate(store.leiden_categories):
+        in_cluster = codes == code
+        if in_cluster.any():
+            x, y = np.median(umap[in_cluster], axis=0)
+            ax_leiden.text(x, y, name, fontsize=4.5, fontweight="bold", ha="center", va="center",
+                           path_effects=[withStroke(linewidth=1, foreground="w")])
+    ax_leiden.set_title("leiden")
+
+    # Gene expression, with the highest values drawn on top
+    expression = store.gene_vector(gene)
+    order = np.argsort(expression, kind="stable")
+    points = ax_gene.scatter(umap[order, 0], umap[order, 1], c=expression[order], cmap=GREY_TO_BLUE,
+                             s=point_size, linewidths=0, rasterized=True)
+    fig.colorbar(points, ax=ax_gene, fraction=0.05, pad=0.01)
+    ax_gene.set_title(gene)
+
+    for ax in (ax_leiden, ax_gene):
+        ax.set_xticks([])
+        ax.set_yticks([])
+        ax.set_xlabel("UMAP1")
+        ax.set_ylabel("UMAP2")
+    fig.tight_layout()
+    return fig
+
+def plot_umap(EntrezGeneSymbol):
+    """Leiden and gene UMAP panels of the single-cell data for one EntrezGeneSymbol."""
     BASE_PATH = Path(__file__).parent
-    single_cell_data_path = str(BASE_PATH.parent / "Core data")
-    single_cell_data=load_singlecell_data(single_cell_data_path)
+    single_cell_data_path = str(BASE_PATH.parent.parent / "Core data")
 
-    color_vars=['leiden',EntrezGeneSymbol]
+    # Use the precomputed arrays when build_singlecell_store has been run
+    store = get_singlecell_store(single_cell_data_path)
+    if store is not None:
+        return render_umap(store, EntrezGeneSymbol)
+
+    import scanpy as sc
 
-    # Define colour map as requested by the client (from grey to blue)
-    cmap = LinearSegmentedColormap.from_list("grey_to_blue", ["#d3d3d3", "blue"])
+    # Only the UMAP, leiden labels and this gene are read from the backed h5ad file
+    single_cell_data = get_singlecell_accessor(single_cell_data_path).plot_adata(EntrezGeneSymbol)
+
+    color_vars=['leiden',EntrezGeneSymbol]
 
     with rc_context({"figure.figsize": (6, 6)}):
-        sc.pl.umap(single_cell_data, color=color_vars, # plot UMAP
-        cmap=cmap,
+        fig = sc.pl.umap(single_cell_data, color=color_vars, # plot UMAP
+        cmap=GREY_TO_BLUE,
         # /* Reference 1 - taken from https://scanpy.readthedocs.io/en/stable/tutorials/plotting/core.html */
         legend_loc="on data", # Place labels on the data
         frameon=True,
         legend_fontsize=4.5,
-        legend_fontoutline=1,)
+        legend_fontoutline=1,
+        return_fig=True,)
     # /* end of reference 1 */
 
-    return sc.pl
+    return fig
 
 
-plot_umap('EntrezGeneSymbol','THBS1') # EXAMPLE OF USAGE WITH THBS1
-# plot_umap('EntrezGeneID','7057')
+if __name__ == "__main__":
+    plot_umap('THBS1') # EXAMPLE OF USAGE WITH THBS1
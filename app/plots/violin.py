@@ -1,20 +1,68 @@
 # To run this code from python, download dataset file from google drive (link is in single_cell_data_link.txt in Core data) and move downloaded file to Core data folder
-import scanpy as sc
+import numpy as np
 from pathlib import Path
-import matplotlib.pyplot as plt
-from matplotlib.pyplot import rc_context
-from app.dataloader import load_singlecell_data, getEntrezGeneSymbol
+from matplotlib.cbook import violin_stats
+from matplotlib.figure import Figure
+from matplotlib.mlab import GaussianKDE
+from matplotlib import rc_context
+from singlecell import get_singlecell_accessor, get_singlecell_store
+from plots.umap import leiden_palette
 
-def plot_violin(input_data_key,input_data_value):
-    EntrezGeneSymbol = getEntrezGeneSymbol(input_data_key,input_data_value)
+def _density(values, coords):
+    """Gaussian KDE that tolerates clusters where every cell has the same value."""
+    if np.ptp(values) == 0:
+        return np.where(np.isclose(coords, values[0]), 1.0, 0.0)
+    return GaussianKDE(values, "scott").evaluate(coords)
+
+def render_violin(store, gene):
+    """Draw one violin per leiden cluster straight from a SingleCellStore, without scanpy."""
+    expression = store.gene_vector(gene)
+    codes = np.asarray(store.leiden_codes)
+
+    # Split the cells by cluster with one sort instead of one mask per cluster
+    order = np.argsort(codes, kind="stable")
+    bounds = np.cumsum(np.bincount(codes, minlength=len(store.leiden_categories)))[:-1]
+    groups = np.split(expression[order], bounds)
+    present = [code for code, values in enumerate(groups) if len(values)]
+
+    fig = Figure(figsize=(5, 10))
+    ax = fig.subplots()
+    stats = violin_stats([groups[code] for code in present], _density)
+    parts = ax.violin(stats, positions=range(1, len(present) + 1), showextrema=False)
+    palette = leiden_palette(store)
+    for body, code in zip(parts["bodies"], present):
+        body.set_facecolor(palette[code])
+        body.set_edgecolor("black")
+        body.set_alpha(1)
+
+    ax.set_xticks(range(1, len(present) + 1), [store.leiden_categories[code] for code in present], rotation=90, fontsize=5)
+    ax.set_xlabel("leiden")
+    ax.set_ylabel(gene)
+    fig.tight_layout()
+    return fig
+
+def plot_violin(EntrezGeneSymbol):
+    """Violin plot of one EntrezGeneSymbol's expression per leiden cluster of the single-cell data."""
     BASE_PATH = Path(__file__).parent
-    single_cell_data_path = str(BASE_PATH.parent / "Core data")
-    single_cell_data=load_singlecell_data(single_cell_data_path)
+    single_cell_data_path = str(BASE_PATH.parent.parent / "Core data")
+
+    # Use the precomputed arrays when build_singlecell_store has been run
+    store = get_singlecell_store(single_cell_data_path)
+    if store is not None:
+        return render_violin(store, EntrezGeneSymbol)
+
+    import scanpy as sc
+
+    # Only the leiden labels and this gene are read from the backed h5ad file
+    single_cell_data = get_singlecell_accessor(single_cell_data_path).plot_adata(EntrezGeneSymbol)
 
     with rc_context({"figure.figsize": (5, 10)}):
-        sc.pl.violin(single_cell_data, [EntrezGeneSymbol], groupby="leiden",rotation=90) # generate violin plot and rotate legend to facilitate cell type reading
-    plt.xticks(fontsize=5)
-    plt.show()
-    return plt
+        ax = sc.pl.violin(single_cell_data, [EntrezGeneSymbol], groupby="leiden",rotation=90, show=False) # generate violin plot and rotate legend to facilitate cell type reading
+    ax.tick_params(axis="x", labelsize=5)
+    return ax.figure
 
-violin_plot('EntrezGeneSymbol','THBS1') # EXAMPLE OF USAGE WITH THBS1
+if __name__ == "__main__":
+    import matplotlib.pyplot as plt
+
+    plot_violin('THBS1') # EXAMPLE OF USAGE WITH THBS1
+    plt.show()
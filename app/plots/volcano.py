@@ -1,79 +1,96 @@
-import plotly.express as px
-import pandas as pd
+import threading
+
+import plotly.graph_objects as go
 import numpy as np
 import streamlit as st
 
-def plot_volcano(data):
-    # Ensure required columns exist
-    required_columns = ["logFC", "P.Value", "Target"]
-    if not all(col in data.columns for col in required_columns):
-        raise ValueError(f"Data is missing required columns: {required_columns}")
+from instrumentation import span
 
-    # Calculate -log10(p-value)
-    if (data['P.Value'] <= 0).any():
-        raise ValueError("P.Value contains non-positive values, which cannot be logged.")
-    data['-log10_pvalue'] = -np.log10(data['P.Value'])
+# Significance categories, in legend order, and their colours
+CATEGORIES = ["Significant Increase", "Significant Decrease", "Not Significant", "Fold Change Only"]
+COLOURS = ["red", "green", "grey", "orange"]
+INCREASE, DECREASE, NOT_SIGNIFICANT, FOLD_CHANGE_ONLY = range(4)
+P_VALUE_THRESHOLD = 0.05
 
-    # Add custom CSS for tighter padding
-    st.markdown(
-        """
-        <style>
-        div.stSlider {
-            margin-top: -10px; /* Reduce space above sliders */
-            margin-bottom: -20px; /* Reduce space below sliders */
-        }
-        </style>
-        """,
-        unsafe_allow_html=True
-    )
+# Piecewise-constant colour scale mapping the category codes 0-3 to COLOURS, so the
+# marker colours are sent as a small integer array instead of 7,000 colour names
+CATEGORY_COLOURSCALE = [
+    [bound, colour] for code, colour in enumerate(COLOURS) for bound in (code / len(COLOURS), (code + 1) / len(COLOURS))
+]
 
-    # Create a compact layout for sliders with padding
-    padding1, col1, padding2, col2, padding3, col3, padding4 = st.columns([1, 4, 1, 4, 1, 4, 1])  # Adjust proportions as needed
 
-    with col1:
-        fold_change_threshold = st.slider(
-            "Fold Change (Log₂)", min_value=0.1, max_value=2.0, value=0.6, step=0.1, key="fold_change"
-        )
-    with col2:
-        point_opacity = st.slider(
-            "Transparency", min_value=0.1, max_value=1.0, value=0.8, step=0.1, key="opacity"
-        )
-    with col3:
-        point_size = st.slider(
-            "Point Size", min_value=5, max_value=20, value=10, step=1, key="size"
-        )
+class VolcanoData:
+    """
+    Read-only per-protein arrays of a volcano table, derived once when the table is loaded.
 
-    # Categorise points based on thresholds
-    data['Colour'] = 'Not Significant'  # Default category
-    data.loc[(data['logFC'] > fold_change_threshold) & (data['P.Value'] < 0.05), 'Colour'] = 'Significant Increase'
-    data.loc[(data['logFC'] < -fold_change_threshold) & (data['P.Value'] < 0.05), 'Colour'] = 'Significant Decrease'
-    data.loc[((data['logFC'] > fold_change_threshold) | (data['logFC'] < -fold_change_threshold)) & (data['P.Value'] >= 0.05), 'Colour'] = 'Fold Change Only'
-
-    # Create an interactive plot using Plotly
-    fig = px.scatter(
-        data_frame=data,
-        x='logFC',
-        y='-log10_pvalue',
-        color='Colour',
-        color_discrete_map={'Significant Increase': 'red', 'Significant Decrease': 'green', 'Not Significant': 'grey', 'Fold Change Only': 'orange'},
-        hover_name='Target',  # Protein name will be shown when hovering
-        labels={"logFC": "Log₂ Fold Change", "-log10_pvalue": "-Log₁₀ P", "Colour": "Significance"},
-        title="SSc High vs Healthy Proteins",
-        opacity=point_opacity,  # Use the slider value for opacity
-    )
+    The DataFrame passed in is never modified. Classifying the proteins for a
+    fold-change threshold only needs a binary search of the sorted |logFC|.
+    """
 
-    # Adjust the marker size based on the slider
-    fig.update_traces(marker=dict(size=point_size))
+    def __init__(self, data):
+        # Ensure required columns exist
+        required_columns = ["logFC", "P.Value", "Target"]
+        if not all(col in data.columns for col in required_columns):
+            raise ValueError(f"Data is missing required columns: {required_columns}")
+        if (data['P.Value'] <= 0).any():
+            raise ValueError("P.Value contains non-positive values, which cannot be logged.")
 
-    # Add threshold lines (vertical and horizontal)
-    fig.add_vline(x=-fold_change_threshold, line_dash="dash", line_color="black")
-    fig.add_vline(x=fold_change_threshold, line_dash="dash", line_color="black")
-    fig.add_hline(y=-np.log10(0.05), line_dash="dash", line_color="black")
+        self.logfc = data["logFC"].to_numpy(dtype=np.float64)
+        self.neg_log10_p = -np.log10(data["P.Value"].to_numpy(dtype=np.float64))
+        self.targets = data["Target"].astype(str).to_numpy()
+        self.significant = data["P.Value"].to_numpy() < P_VALUE_THRESHOLD
+
+        # Category of every protein when its |logFC| passes the threshold
+        self._passing_category = np.where(
+            self.significant, np.where(self.logfc > 0, INCREASE, DECREASE), FOLD_CHANGE_ONLY
+        ).astype(np.int8)
+
+        abs_logfc = np.abs(self.logfc)
+        self._order = np.argsort(abs_logfc, kind="stable")
+        self._sorted_abs_logfc = abs_logfc[self._order]
+        self.max_abs_logfc = float(np.nanmax(abs_logfc)) if len(abs_logfc) else 0.0
+
+        for array in (self.logfc, self.neg_log10_p, self.targets, self.significant, self._passing_category):
+            array.flags.writeable = False
+
+    def __len__(self):
+        return len(self.logfc)
+
+    def classify(self, fold_change_threshold):
+        """Return the category code (INCREASE, DECREASE, ...) of every protein for a |logFC| threshold."""
+        codes = np.full(len(self), NOT_SIGNIFICANT, dtype=np.int8)
+        passing = self._order[np.searchsorted(self._sorted_abs_logfc, fold_change_threshold, side="right"):]
+        codes[passing] = self._passing_category[passing]
+        return codes
+
+
+def build_volcano_figure(volcano, title):
+    """
+    Build the volcano figure with the protein data in a single WebGL trace.
+
+    Colours, opacity, point size and threshold lines are set afterwards by
+    update_volcano_figure, which never touches the x/y data.
+    """
+    fig = go.Figure()
+    fig.add_trace(go.Scattergl(
+        x=volcano.logfc,
+        y=volcano.neg_log10_p,
+        mode="markers",
+        text=volcano.targets,
+        hovertemplate="<b>%{text}</b><br>Log₂ Fold Change=%{x}<br>-Log₁₀ P=%{y}<extra></extra>",
+        marker=dict(colorscale=CATEGORY_COLOURSCALE, cmin=-0.5, cmax=len(COLOURS) - 0.5),
+        name="proteins",
+        showlegend=False,
+    ))
+    # Marker-less traces give the legend one entry per significance category
+    for category, colour in zip(CATEGORIES, COLOURS):
+        fig.add_trace(go.Scattergl(
+            x=[None], y=[None], mode="markers", marker=dict(color=colour), name=category, legendgroup=category,
+        ))
 
     # Add the number of samples annotation
-    num_samples = len(data)
     fig.add_annotation(
-        text=f"Number of samples: {num_samples}",
+        text=f"Number of samples: {len(volcano)}",
         xref="paper",
         yref="paper",
         x=0.95,  # Bottom-right corner
@@ -88,16 +105,17 @@ def plot_volcano(data):
         xaxis_title="Log₂ Fold Change",
         yaxis_title="-Log₁₀ P",
         title=dict(
-            text="SSc High vs Healthy Proteins",
+            text=title,
             font=dict(size=16, family='Arial', style='italic')
         ),
         title_x=0.05,  # Center the title
         title_y=0.87,
+        legend=dict(title="Significance", itemclick=False, itemdoubleclick=False),
         plot_bgcolor="white",
         hovermode="closest",
         height=600,  # Make the graph taller
         margin=dict(l=50, r=50, t=100, b=50),  # Adjust top margin for additional title
-        xaxis=dict(range=[-max(abs(data['logFC'])) - 0.2, max(abs(data['logFC'])) + 0.2])  # Symmetrical X-axis range
+        xaxis=dict(range=[-volcano.max_abs_logfc - 0.2, volcano.max_abs_logfc + 0.2])  # Symmetrical X-axis range
     )
 
     # Add an annotation for the extra title above the main title
@@ -110,6 +128,87 @@ def plot_volcano(data):
         showarrow=False,  # No arrow for a title
         font=dict(size=24, family="Arial", color="orange")  # Customize font
     )
+    return fig
+
+
+def update_volcano_figure(fig, volcano, fold_change_threshold, point_opacity, point_size):
+    """Restyle a figure from build_volcano_figure in place for new slider values."""
+    codes = volcano.classify(fold_change_threshold)
+    fig.update_traces(
+        marker=dict(color=codes, size=point_size, opacity=point_opacity),
+        selector=dict(name="proteins"),
+    )
+    fig.update_traces(marker=dict(size=point_size, opacity=point_opacity), selector=lambda trace: trace.name != "proteins")
+
+    # Add threshold lines (vertical and horizontal)
+    fig.layout.shapes = ()
+    fig.add_vline(x=-fold_change_threshold, line_dash="dash", line_color="black")
+    fig.add_vline(x=fold_change_threshold, line_dash="dash", line_color="black")
+    fig.add_hline(y=-np.log10(P_VALUE_THRESHOLD), line_dash="dash", line_color="black")
+    return fig
+
+
+@st.cache_resource(max_entries=16, show_spinner=False)
+def _shared_figure(figure_key, title, _volcano):
+    # The figure of one volcano table and the lock guarding it, kept once per process
+    with span("volcano.build"):
+        return build_volcano_figure(_volcano, title), threading.Lock()
+
+
+def prepare_volcano_figure(volcano, title, figure_key=None):
+    """
+    Return (figure, lock) of a volcano table, built on the first call for figure_key
+    (default: the title) in this process. Restyle the figure only under the lock.
+    """
+    return _shared_figure(title if figure_key is None else figure_key, title, volcano)
+
+
+def plot_volcano(data, title="SSc High vs Healthy Proteins", figure_key=None):
+    """
+    Draw the volcano plot with its sliders.
+
+    data is a volcano DataFrame or a VolcanoData prepared from one. The figure
+    is built once per process for figure_key (default: the title), shared
+    by all sessions, and only restyled when a slider moves.
+    """
+    volcano = data if isinstance(data, VolcanoData) else VolcanoData(data)
+
+    # Add custom CSS for tighter padding
+    st.markdown(
+        """
+        <style>
+        div.stSlider {
+            margin-top: -10px; /* Reduce space above sliders */
+            margin-bottom: -20px; /* Reduce space below sliders */
+        }
+        </style>
+        """,
+        unsafe_allow_html=True
+    )
+
+    # Create a compact layout for sliders with padding
+    padding1, col1, padding2, col2, padding3, col3, padding4 = st.columns([1, 4, 1, 4, 1, 4, 1])  # Adjust proportions as needed
+
+    with col1:
+        fold_change_threshold = st.slider(
+            "Fold Change (Log₂)", min_value=0.1, max_value=2.0, value=0.6, step=0.1, key="fold_change"
+        )
+    with col2:
+        point_opacity = st.slider(
+            "Transparency", min_value=0.1, max_value=1.0, value=0.8, step=0.1, key="opacity"
+        )
+    with col3:
+        point_size = st.slider(
+            "Point Size", min_value=5, max_value=20, value=10, step=1, key="size"
+        )
+
+    # One figure per volcano table, shared by all sessions and restyled in place under its lock;
+    # st.plotly_chart serializes it before the lock is released
+    fig, lock = prepare_volcano_figure(volcano, title, figure_key)
+    with lock:
+        with span("volcano.restyle"):
+            update_volcano_figure(fig, volcano, fold_change_threshold, point_opacity, point_size)
 
-    # Display the interactive Plotly chart within your Streamlit app
-    st.plotly_chart(fig)
+        # Display the interactive Plotly chart within your Streamlit app
+        with span("volcano.chart"):
+            st.plotly_chart(fig)
@@ -0,0 +1,177 @@
+"""
+Warm the caches of an app process in the background, so no visitor lands on a cold one.
+
+A daemon thread runs these stages in order, the default cohort first:
+    - dataset:<id>: a cohort of the registry (sample metadata, protein store with
+      its identifier and search indexes, first contrast table), through the
+      on-disk cache (see datacache.py)
+    - volcano:<id>: the shared volcano figure of its first contrast table
+    - libraries: the plotting and statistics modules the first plot, contrast
+      or correlation screen imports (they are not imported with the app)
+    - plots: correlation and box plots of the proteins in
+      $SCLEROBASE_PREWARM_PROTEINS (comma-separated names, none by default),
+      e.g. SCLEROBASE_PREWARM_PROTEINS=THBS1,COMP
+
+Sessions use the same registry and caches, so a session asking for data that
+is still being warmed waits for that load instead of starting another. A
+failed stage is reported on stderr and in status(), and the next stages run.
+
+main.py starts the warm-up on the first rerun of a process. To start it with
+the server, before any session connects, run Streamlit through this module
+(serve.py starts its workers this way); arguments are those of `streamlit run`:
+    python app/prewarm.py --server.port=8501 --server.headless=true
+
+Set SCLEROBASE_PREWARM=0 to leave the caches to fill on first use.
+"""
+import importlib
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+
+from instrumentation import span
+from registry import DatasetRegistry
+
+MAIN_PATH = Path(__file__).parent / "main.py"
+PREWARM_ENABLED = os.environ.get("SCLEROBASE_PREWARM", "1") != "0"
+PREWARM_PROTEINS = [name.strip() for name in os.environ.get("SCLEROBASE_PREWARM_PROTEINS", "").split(",") if name.strip()]
+# Imported by the first plot, contrast or correlation screen
+LIBRARY_MODULES = [
+    "scipy.special", "scipy.stats", "matplotlib.figure", "matplotlib.backends.backend_agg", "matplotlib.ticker", "seaborn",
+]
+
+
+class Prewarm:
+    """Warm-up of a registry's datasets, volcano figures and popular plots, run in stages on a background thread."""
+
+    def __init__(self, registry, proteins=()):
+        self.registry = registry
+        self.proteins = list(proteins)
+        self.finished = threading.Event()
+        self._status = {}  # stage -> (state, seconds, error)
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def stages(self):
+        """(name, function) of every stage, in the order they run."""
+        default = self.registry.default
+        others = [cohort_id for cohort_id in self.registry.cohorts if cohort_id != default]
+        stages = [(f"dataset:{default}", lambda: self.registry.cohort(default)),
+                  (f"volcano:{default}", lambda: self.warm_volcano(default)),
+                  ("libraries", self.warm_libraries)]
+        if self.proteins:
+            stages.append(("plots", self.warm_plots))
+        for cohort_id in others:
+            stages.append((f"dataset:{cohort_id}", lambda cohort_id=cohort_id: self.registry.cohort(cohort_id)))
+            stages.append((f"volcano:{cohort_id}", lambda cohort_id=cohort_id: self.warm_volcano(cohort_id)))
+        return stages
+
+    def start(self):
+        """Start the warm-up thread, once; returns self."""
+        with self._lock:
+            if self._thread is None:
+                for name, _ in self.stages():
+                    self._status.setdefault(name, ("pending", None, None))
+                self._thread = threading.Thread(target=self.run, name="prewarm", daemon=True)
+                self._thread.start()
+        return self
+
+    def run(self):
+        """Run every stage in this thread."""
+        try:
+            for name, warm in self.stages():
+                self._set(name, "running")
+                start = time.perf_counter()
+                try:
+                    with span(f"prewarm.{name.split(':')[0]}", stage=name):
+                        warm()
+                except Exception as error:
+                    self._set(name, "failed", time.perf_counter() - start, str(error))
+                    print(f"Warning: prewarm stage {name} failed: {error}", file=sys.stderr)
+                else:
+                    self._set(name, "done", time.perf_counter() - start)
+            # Loaded first, the default cohort would be the first the registry evicts
+            if self.registry.loaded(self.registry.default):
+                self.registry.cohort(self.registry.default)
+        finally:
+            self.finished.set()
+
+    def wait(self, timeout=None):
+        """Wait for every stage to finish; returns False on timeout."""
+        return self.finished.wait(timeout)
+
+    def status(self):
+        """State ("pending", "running", "done" or "failed"), seconds taken and error of every stage."""
+        with self._lock:
+            return {name: {"state": state, "seconds": seconds, "error": error}
+                    for name, (state, seconds, error) in self._status.items()}
+
+    def _set(self, name, state, seconds=None, error=None):
+        with self._lock:
+            self._status[name] = (state, seconds, error)
+
+    def warm_volcano(self, cohort_id):
+        """Build the shared volcano figure of the first contrast table of a cohort."""
+        from plots.volcano import VolcanoData, prepare_volcano_figure
+
+        _, proteins, volcano = self.registry.cohort(cohort_id)
+        table = self.registry.cohorts[cohort_id].contrasts[0]
+        # The title and key the home page gives a published table's volcano, so sessions find this figure
+        prepare_volcano_figure(VolcanoData(volcano), f"{table.title} Proteins", figure_key=(proteins.version, table.id))
+
+    def warm_libraries(self):
+        """Import the plotting and statistics libraries the app defers."""
+        for name in LIBRARY_MODULES:
+            importlib.import_module(name)
+
+    def warm_plots(self):
+        """Render the correlation and box plots of self.proteins in the default cohort, as the protein search does."""
+        from plots.Correlation import filter_data
+        from plots.render import submit_protein_plots
+
+        metadata, proteins, _ = self.registry.cohort(self.registry.default)
+        missing = []
+        futures = []
+        for name in self.proteins:
+            matches = proteins.search.search(name)
+            if not matches:
+                missing.append(name)
+                continue
+            filtered_data, _ = filter_data(proteins, metadata, matches[0].value, matches[0].id_type)
+            images = submit_protein_plots(
+                proteins, filtered_data["SeqId"].iloc[0], filtered_data["TargetFullName"].iloc[0]
+            )
+            futures.extend(images.values())
+        for future in futures:
+            future.result()
+        if missing:
+            raise ValueError(f"no protein matches {', '.join(missing)}")
+
+
+_prewarm = None
+_prewarm_lock = threading.Lock()
+
+
+def start_prewarm():
+    """
+    Return the Prewarm of this process, created from the manifest's registry on
+    the first call and started unless SCLEROBASE_PREWARM=0.
+    """
+    global _prewarm
+    with _prewarm_lock:
+        if _prewarm is None:
+            _prewarm = Prewarm(DatasetRegistry.from_manifest(), PREWARM_PROTEINS)
+            if PREWARM_ENABLED:
+                _prewarm.start()
+        return _prewarm
+
+
+if __name__ == "__main__":
+    from streamlit.web import cli
+
+    # Through the module, so main.py's `from prewarm import start_prewarm` finds this Prewarm, not a second one
+    import prewarm
+
+    prewarm.start_prewarm()
+    cli.main(["run", str(MAIN_PATH), *sys.argv[1:]], prog_name="streamlit")
@@ -0,0 +1,283 @@
+import numpy as np
+import pandas as pd
+from identifiers import IdentifierIndex
+from mapped import StringIndex, StringTable, sorted_order
+from search import SearchIndex
+from summary import ConditionSummary
+
+# Per-SeqId annotations carried into each row of the long-format protein table
+SEQUENCE_ANNOTATIONS = [
+    "SeqIdVersion", "SomaId", "TargetFullName", "Target", "UniProt",
+    "EntrezGeneID", "EntrezGeneSymbol", "Organism", "Units", "Type",
+    "Dilution", "PlateScale_Reference",
+]
+
+
+def rank_seqids(candidates, min_coverage, by=()):
+    """
+    Keep the best SeqId of each group of candidates measuring the same protein.
+
+    SeqIds measured in at least min_coverage samples are preferred (otherwise
+    the best-covered ones), then the highest mean intensity, then the lowest
+    SeqId.
+
+    Parameters:
+    - candidates (pd.DataFrame): "SeqId", "patient_count" and "mean_intensity"
+      columns plus the grouping columns in by.
+    - min_coverage (int): Number of samples a SeqId must cover to count as complete.
+    - by (sequence of str): Columns identifying a protein; empty for a single group.
+    """
+    by = list(by)
+    effective_coverage = np.minimum(candidates["patient_count"].to_numpy(), min_coverage)
+    ranked = candidates.assign(_coverage=effective_coverage).sort_values(
+        by=by + ["_coverage", "mean_intensity", "SeqId"],
+        ascending=[True] * len(by) + [False, False, True],
+    )
+    if by:
+        ranked = ranked.drop_duplicates(by)
+    else:
+        ranked = ranked.iloc[:1]
+    return ranked.drop(columns="_coverage")
+
+
+def resolve_best_positions(values, seq_ids, index, min_coverage):
+    """
+    Choose the SeqId shown for every identifier value in one grouped pass.
+
+    Returns the position of the chosen SeqId of each entry of the
+    IdentifierIndex, as an int32 array (-1 for an entry without SeqIds).
+    """
+    patient_count, mean_intensity = _coverage(values)
+    entries, positions = index.entry_pairs()
+    candidates = pd.DataFrame({
+        "entry": entries,
+        "position": positions,
+        "SeqId": np.asarray(seq_ids, dtype=object)[positions],
+        "patient_count": patient_count[positions],
+        "mean_intensity": mean_intensity[positions],
+    })
+    best = rank_seqids(candidates, min_coverage, by=["entry"])
+    best_positions = np.full(len(index), -1, dtype=np.int32)
+    best_positions[best["entry"].to_numpy()] = best["position"].to_numpy()
+    return best_positions
+
+
+def _coverage(values):
+    # Samples measured, and mean intensity, of every SeqId column
+    patient_count = np.count_nonzero(~np.isnan(values), axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean_intensity = np.nansum(values, axis=0, dtype=np.float64) / patient_count
+    return patient_count, mean_intensity
+
+
+class ProteinStore:
+    """
+    Protein intensities held as a float32 samples x SeqId matrix.
+
+    Each SeqId's column is contiguous in memory, so a protein's per-sample
+    vector is an O(samples) slice. SampleId and SeqId position maps replace
+    the boolean scans over the long-format table, and the metadata rows of
+    every sample are matched once at construction. The lookup structures
+    (identifier and search indexes, chosen SeqIds, per-condition summary) are
+    numpy arrays that to_arrays saves, so other processes can map them from
+    disk instead of building their own copy.
+    """
+
+    def __init__(self, values, sample_ids, annotations, metadata, mrss=None, min_coverage=None,
+                 arrays=None, version=None):
+        """
+        Parameters:
+        - values (np.ndarray): samples x SeqId intensities; NaN marks a missing measurement.
+        - sample_ids (array-like): SampleId of each row of values.
+        - annotations (pd.DataFrame): one row per column of values, with a "SeqId" column.
+        - metadata (pd.DataFrame): sample metadata with a "SubjectID" column.
+        - mrss (array-like, optional): Total mRSS of each row of values.
+        - min_coverage (int, optional): Samples a SeqId must cover to be preferred
+          when several measure one protein; defaults to every sample.
+        - arrays (dict, optional): Lookup structures saved by to_arrays, e.g.
+          memory-mapped from the on-disk cache; built when omitted.
+        - version (str, optional): Identifier of the source data this store was built from.
+        """
+        self.values = np.asfortranarray(values, dtype=np.float32)
+        self.sample_ids = np.asarray(sample_ids, dtype=object)
+        self.annotations = annotations.reset_index(drop=True)
+        self.seq_ids = self.annotations["SeqId"].to_numpy(dtype=object, copy=True)
+        self.metadata = metadata
+        self.mrss = None if mrss is None else np.asarray(mrss)
+        self.version = version
+
+        if self.values.shape != (len(self.sample_ids), len(self.seq_ids)):
+            raise ValueError(
+                f"Intensity matrix shape {self.values.shape} does not match "
+                f"{len(self.sample_ids)} samples x {len(self.seq_ids)} SeqIds."
+            )
+
+        self.sample_pos = {sample_id: i for i, sample_id in enumerate(self.sample_ids)}
+        self._annotation_columns = [name for name in self.annotations.columns if name != "SeqId"]
+        self.min_coverage = len(self.sample_ids) if min_coverage is None else min_coverage
+
+        # Position of each sample's row in metadata, or -1 if it has none
+        metadata_pos = pd.Series(np.arange(len(metadata)), index=metadata["SubjectID"].to_numpy())
+        metadata_pos = metadata_pos[~metadata_pos.index.duplicated()]
+        self.metadata_rows = metadata_pos.reindex(self.sample_ids).fillna(-1).to_numpy(dtype=np.int64)
+
+        if arrays is not None:
+            self.index = IdentifierIndex.from_arrays(arrays)
+            self.seqid_pos = StringIndex(StringTable.from_arrays(arrays, "index.seq_ids"), arrays["seqid_order"])
+            self.search = SearchIndex.from_arrays(arrays)
+            self.best_positions = arrays["best_positions"]
+            self.condition_summary = ConditionSummary.from_arrays(arrays, self.seq_ids, self.seqid_pos)
+            return
+
+        self.seqid_pos = {seq_id: j for j, seq_id in enumerate(self.seq_ids)}
+        self.index = IdentifierIndex(self.annotations)
+        self.search = SearchIndex(self.index)
+
+        # Chosen SeqId of every identifier value, so selection is an index lookup
+        self.best_positions = resolve_best_positions(self.values, self.seq_ids, self.index, self.min_coverage)
+
+        # Box-plot statistics of every SeqId per condition, so box plots are a lookup
+        self.condition_summary = ConditionSummary.from_store(self)
+
+    def to_arrays(self):
+        """Return the lookup structures as named numpy arrays, for mapped.save_arrays and the arrays argument."""
+        arrays = {
+            **self.index.to_arrays(),
+            **self.search.to_arrays(),
+            "seqid_order": sorted_order(self.seq_ids),
+            "best_positions": self.best_positions,
+        }
+        if self.condition_summary is not None:
+            arrays.update(self.condition_summary.to_arrays())
+        return arrays
+
+    @classmethod
+    def from_adat(cls, adat, metadata, min_coverage=None):
+        """Build a store from an Adat, keeping only the samples listed in metadata["SubjectID"]."""
+        intensities = adat.intensities[adat.intensities.index.isin(metadata["SubjectID"])]
+        sample_ids = intensities.index.to_numpy()
+        mrss = None
+        if "Total_mRss" in metadata.columns:
+            mrss = (
+                metadata.drop_duplicates("SubjectID")
+                .set_index("SubjectID")["Total_mRss"]
+                .reindex(sample_ids)
+                .to_numpy()
+            )
+        return cls(intensities.to_numpy(), sample_ids, adat.col_data, metadata, mrss, min_coverage)
+
+    @classmethod
+    def from_long(cls, proteins, metadata, min_coverage=None):
+        """Build a store by pivoting a long-format protein table (one row per sample and SeqId)."""
+        sample_codes, sample_ids = pd.factorize(proteins["SampleId"])
+        seqid_codes, seq_ids = pd.factorize(proteins["SeqId"])
+        # Categorical columns (see dataloader.read_long_table) factorize to a CategoricalIndex
+        sample_ids = np.asarray(sample_ids, dtype=object)
+        seq_ids = np.asarray(seq_ids, dtype=object)
+
+        values = np.full((len(sample_ids), len(seq_ids)), np.nan, dtype=np.float32, order="F")
+        values[sample_codes, seqid_codes] = proteins["Intensity"].to_numpy(dtype=np.float32)
+
+        annotation_columns = ["SeqId"] + [name for name in SEQUENCE_ANNOTATIONS if name in proteins.columns]
+        annotations = (
+            proteins[annotation_columns]
+            .drop_duplicates("SeqId")
+            .set_index("SeqId")
+            .reindex(pd.Index(seq_ids, name="SeqId"))
+            .reset_index()
+        )
+        # One row per SeqId: the dictionary encoding of the long table saves nothing here
+        annotations = annotations.astype({
+            name: annotations[name].cat.categories.dtype
+            for name in annotations.columns if isinstance(annotations[name].dtype, pd.CategoricalDtype)
+        })
+
+        mrss = None
+        if "mrss" in proteins.columns:
+            mrss = proteins.drop_duplicates("SampleId").set_index("SampleId")["mrss"].reindex(sample_ids).to_numpy()
+        return cls(values, sample_ids, annotations, metadata, mrss, min_coverage)
+
+    @property
+    def shape(self):
+        return self.values.shape
+
+    def seqids_for(self, column_name, protein_id):
+        """Return the SeqIds whose annotation column_name equals protein_id."""
+        return self.index.seqids(column_name, protein_id)
+
+    def best_seqid(self, column_name, protein_id):
+        """Return the SeqId chosen at load time for a protein, or None if it is unknown."""
+        entry = self.index.entry(column_name, protein_id)
+        if entry is None:
+            return None
+        return self.seq_ids[self.best_positions[entry]]
+
+    @property
+    def best_seqids(self):
+        """
+        Table of the SeqId chosen for every identifier value, indexed by
+        (id_type, identifier), with its patient_count (samples measured) and
+        mean_intensity. Built on demand from best_positions.
+        """
+        patient_count, mean_intensity = _coverage(self.values)
+        id_types, identifiers = [], []
+        for id_type in self.index.id_types:
+            for identifier, _ in self.index.items(id_type):
+                id_types.append(id_type)
+                identifiers.append(identifier)
+        positions = np.asarray(self.best_positions, dtype=np.int64)
+        best = pd.DataFrame({
+            "id_type": id_types,
+            "identifier": identifiers,
+            "SeqId": self.seq_ids[positions],
+            "patient_count": patient_count[positions],
+            "mean_intensity": mean_intensity[positions],
+        })
+        return best.set_index(["id_type", "identifier"]).sort_index()
+
+    def protein_frame(self, seq_id):
+        """
+        Return the per-sample rows of one SeqId, shaped like the long-format
+        protein table, and the metadata rows of those samples.
+        """
+        j = self.seqid_pos[seq_id]
+        column = self.values[:, j]
+        rows = np.flatnonzero(~np.isnan(column))
+
+        columns = {
+            "SampleId": self.sample_ids[rows],
+            "SeqId": seq_id,
+            "Intensity": column[rows],
+        }
+        if self.mrss is not None:
+            columns["mrss"] = self.mrss[rows]
+        annotations = self.annotations.iloc[j]
+        for name in self._annotation_columns:
+            columns[name] = annotations[name]
+        final_data = pd.DataFrame(columns)
+
+        metadata_rows = self.metadata_rows[rows]
+        metadata_info = self.metadata.iloc[np.sort(metadata_rows[metadata_rows >= 0])]
+        return final_data, metadata_info
+
+    def protein_matrix(self, seq_ids):
+        """Return the samples x SeqId intensities of several SeqIds, taken in one slice."""
+        return self.values[:, [self.seqid_pos[seq_id] for seq_id in seq_ids]]
+
+    def sample_column(self, column):
+        """Return a metadata column's value for every sample, None where a sample has no metadata row."""
+        values = np.full(len(self.sample_ids), None, dtype=object)
+        has_row = self.metadata_rows >= 0
+        values[has_row] = self.metadata[column].to_numpy()[self.metadata_rows[has_row]]
+        return values
+
+    def filter_data(self, column_name, protein_id):
+        """Store counterpart of plots.Correlation.filter_data, with the same return contract."""
+        seq_id = self.best_seqid(column_name, protein_id)
+        if seq_id is None:
+            raise ValueError(f"No data found for {column_name} = {protein_id}.")
+
+        final_data, metadata_info = self.protein_frame(seq_id)
+        if metadata_info.empty:
+            raise ValueError(f"No metadata found for Sample IDs: {final_data['SampleId'].unique()}.")
+        return final_data, metadata_info
@@ -0,0 +1,251 @@
+"""
+Registry of the datasets the app serves, read from a manifest.
+
+The manifest (Core data/datasets.json, or $SCLEROBASE_DATASETS) lists
+cohorts, each a protein data file (ADAT or long-format CSV) with its sample
+metadata, and the contrast tables the R markdowns made for it (limma
+topTables such as SSC_all_Healthy_allproteins.csv):
+
+    {
+      "cohorts": [
+        {
+          "id": "ss-2342309",
+          "title": "SSc plasma (SS-2342309)",
+          "metadata": "somalogic_metadata.csv",
+          "proteins": "SS-2342309_v4.1_other.hybNorm.medNormInt.plateScale.adat",
+          "contrasts": [
+            {"id": "ssc-healthy", "title": "SSc vs Healthy", "table": "SSC_all_Healthy_allproteins.csv"},
+            {"id": "ssc-high-healthy", "title": "SSc High vs Healthy", "table": "SSC_high_Healthy_allproteins.csv"}
+          ]
+        }
+      ]
+    }
+
+Paths are relative to the manifest. The first cohort is shown by default, and
+the first contrast table of a cohort is cached with it (see datacache.py).
+Without a manifest, the registry holds the original dataset of Core data.
+
+Nothing is loaded up front: a cohort or contrast table is loaded on first use
+and kept in an LRU bounded by the memory the loaded data holds
+($SCLEROBASE_DATASET_CACHE_MB, 2 GB by default), so one process can serve a
+dozen datasets with only the recently used ones in memory.
+
+Build the on-disk caches of every cohort ahead of time with:
+    python app/registry.py
+"""
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import NamedTuple, Tuple
+
+import pandas as pd
+
+from datacache import CORE_DATA_PATH, METADATA_PATH, PROTEINS_PATH, VOLCANO_PATH, load_dataset
+from dataplane import freeze, nbytes
+from instrumentation import count, span
+
+MANIFEST_PATH = os.environ.get("SCLEROBASE_DATASETS", str(CORE_DATA_PATH / "datasets.json"))
+DEFAULT_MAX_BYTES = int(os.environ.get("SCLEROBASE_DATASET_CACHE_MB", 2048)) * 1024 * 1024
+
+
+class ContrastTable(NamedTuple):
+    """A precomputed differential expression table (limma topTable CSV) of a cohort."""
+    id: str
+    title: str
+    path: str
+
+
+class Cohort(NamedTuple):
+    """Sample metadata and protein data of one cohort, with its contrast tables."""
+    id: str
+    title: str
+    metadata_path: str
+    proteins_path: str
+    contrasts: Tuple[ContrastTable, ...]
+
+
+def default_cohorts():
+    """The original dataset of Core data, as a registry of one cohort."""
+    return [Cohort(
+        "ss-2342309", "SSc plasma (SS-2342309)", METADATA_PATH, PROTEINS_PATH,
+        (ContrastTable("ssc-healthy", "SSc vs Healthy", VOLCANO_PATH),),
+    )]
+
+
+def read_manifest(path):
+    """
+    Read the cohorts listed in a manifest.
+
+    Parameters:
+    - path (str or Path): JSON manifest, in the format of the module docstring.
+
+    Returns:
+    - list of Cohort: In the manifest's order, with absolute paths.
+
+    Raises ValueError if an entry misses a field, an id is repeated or a file does not exist.
+    """
+    path = Path(path)
+    with open(path) as manifest_file:
+        manifest = json.load(manifest_file)
+
+    def resolve(name, owner):
+        file_path = path.parent / name
+        if not file_path.exists():
+            raise ValueError(f"{path}: {name} of {owner} not found")
+        return str(file_path)
+
+    cohorts = []
+    try:
+        for entry in manifest["cohorts"]:
+            contrasts = tuple(
+                ContrastTable(table["id"], table["title"], resolve(table["table"], f"contrast {table['id']}"))
+                for table in entry["contrasts"]
+            )
+            if not contrasts:
+                raise ValueError(f"{path}: cohort {entry['id']} has no contrast table")
+            if len({table.id for table in contrasts}) < len(contrasts):
+                raise ValueError(f"{path}: repeated contrast id in cohort {entry['id']}")
+            cohorts.append(Cohort(
+                entry["id"], entry.get("title", entry["id"]),
+                resolve(entry["metadata"], f"cohort {entry['id']}"),
+                resolve(entry["proteins"], f"cohort {entry['id']}"),
+                contrasts,
+            ))
+    except KeyError as error:
+        raise ValueError(f"{path}: missing field {error}") from None
+
+    if not cohorts:
+        raise ValueError(f"{path}: no cohorts")
+    if len({cohort.id for cohort in cohorts}) < len(cohorts):
+        raise ValueError(f"{path}: repeated cohort id")
+    return cohorts
+
+
+def load_cohort(cohort, cache_dir=None):
+    """
+    Load (metadata, store, first contrast table) of a cohort through the on-disk
+    cache, in a directory of its own under cache_dir if given.
+    """
+    if cache_dir is not None:
+        cache_dir = Path(cache_dir) / cohort.id
+    return load_dataset(cohort.metadata_path, cohort.proteins_path, cohort.contrasts[0].path, cache_dir=cache_dir)
+
+
+def dataset_bytes(data):
+    """Memory held by a loaded cohort or table, counting a memory-mapped intensity matrix as held."""
+    size = nbytes(data)
+    if isinstance(data, tuple):
+        values = data[1].values
+        # A memory-mapped matrix does not own its buffer, so nbytes leaves it out
+        if not values.flags.owndata:
+            size += values.nbytes
+    return size
+
+
+class DatasetRegistry:
+    """Thread-safe registry of cohorts and contrast tables, loaded on first use into a memory-bounded LRU."""
+
+    def __init__(self, cohorts, max_bytes=DEFAULT_MAX_BYTES, cache_dir=None):
+        self.cohorts = {cohort.id: cohort for cohort in cohorts}
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self._entries = OrderedDict()  # key -> (data, bytes)
+        self._size = 0
+        self._lock = threading.Lock()
+        self._loading = {}  # key -> Lock held while the key loads, so concurrent sessions load it once
+        self.hits = 0
+        self.loads = 0
+        self.evictions = 0
+
+    @classmethod
+    def from_manifest(cls, path=MANIFEST_PATH, max_bytes=DEFAULT_MAX_BYTES):
+        """Registry of the manifest at path, or of the original dataset if there is none."""
+        return cls(read_manifest(path) if Path(path).exists() else default_cohorts(), max_bytes)
+
+    @property
+    def default(self):
+        """Id of the cohort shown by default."""
+        return next(iter(self.cohorts))
+
+    def cohort(self, cohort_id):
+        """
+        Return (metadata, store, volcano) of a cohort, loading it on first use.
+
+        volcano is its first contrast table; the data is shared and read-only.
+        Raises KeyError for an unknown cohort.
+        """
+        cohort = self.cohorts[cohort_id]
+        return self._get(("cohort", cohort_id), lambda: freeze(load_cohort(cohort, self.cache_dir)))
+
+    def loaded(self, cohort_id):
+        """Whether a cohort is in memory, so that cohort(cohort_id) returns without loading it."""
+        with self._lock:
+            return ("cohort", cohort_id) in self._entries
+
+    def contrast(self, cohort_id, contrast_id):
+        """Return a contrast table of a cohort as a DataFrame, loading it on first use."""
+        cohort = self.cohorts[cohort_id]
+        table = next((table for table in cohort.contrasts if table.id == contrast_id), None)
+        if table is None:
+            raise KeyError(contrast_id)
+        if table == cohort.contrasts[0]:
+            return self.cohort(cohort_id)[2]
+        return self._get(("contrast", cohort_id, contrast_id), lambda: pd.read_csv(table.path))
+
+    def _get(self, key, load):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                count("dataset_registry.hit")
+                return entry[0]
+            loading = self._loading.setdefault(key, threading.Lock())
+
+        with loading:
+            with self._lock:
+                # Loaded by another thread while this one waited
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+            count("dataset_registry.miss")
+            with span("dataset_registry.load", key="/".join(key)):
+                data = load()
+            size = dataset_bytes(data)
+            with self._lock:
+                self._entries[key] = (data, size)
+                self._size += size
+                self.loads += 1
+                self._loading.pop(key, None)
+                # The entry just loaded stays, even on its own above max_bytes
+                while self._size > self.max_bytes and len(self._entries) > 1:
+                    _, (_, evicted_size) = self._entries.popitem(last=False)
+                    self._size -= evicted_size
+                    self.evictions += 1
+        return data
+
+    def stats(self):
+        """Loaded entries (least recently used first), their total size, and hit, load and eviction counts."""
+        with self._lock:
+            return {
+                "loaded": ["/".join(key[1:]) for key in self._entries],
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "loads": self.loads,
+                "evictions": self.evictions,
+            }
+
+
+if __name__ == "__main__":
+    import time
+
+    registry = DatasetRegistry.from_manifest()
+    for cohort in registry.cohorts.values():
+        start = time.perf_counter()
+        _, store, _ = load_cohort(cohort)
+        print(f"{cohort.id}: dataset {store.version} ready in {time.perf_counter() - start:.3f}s")
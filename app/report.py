@@ -0,0 +1,244 @@
+"""
+Command-line bulk export of correlation and box plots.
+
+Renders plot_correlation and the box plot of every matching protein, in a
+process pool, and writes them with an index.html/index.csv into a directory
+or a .zip file. Proteins are chosen by a list, by thresholds on the volcano
+table (published, or a contrast computed by differential.py), or all at once.
+The dataset is loaded once (through the on-disk cache) before the workers
+fork, so they share it copy-on-write instead of each loading a copy.
+
+Examples:
+    python app/report.py --proteins THBS1 TIMP1 --id-type EntrezGeneSymbol --out reports/selected
+    python app/report.py --min-logfc 0.6 --max-p 0.05 --out reports/significant.zip
+    python app/report.py --contrast Lung_Fibrosis Yes No --max-p 0.01 --out reports/lung
+    python app/report.py --all --workers 16 --out reports/all.zip
+"""
+import argparse
+import html
+import multiprocessing
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import matplotlib
+matplotlib.use("Agg")
+import pandas as pd
+
+from datacache import load_dataset
+from differential import Contrast, contrast_columns, differential_expression
+from identifiers import ID_TYPES
+from plots.Correlation import plot_correlation
+from plots.boxplot import draw_boxplot
+from plots.render import figure_to_png
+
+CORE_DATA_PATH = Path(__file__).parent.parent / "Core data"
+METADATA_PATH = CORE_DATA_PATH / "somalogic_metadata.csv"
+PROTEINS_PATH = CORE_DATA_PATH / "SS-2342309_v4.1_other.hybNorm.medNormInt.plateScale.adat"
+VOLCANO_PATH = CORE_DATA_PATH / "SSC_all_Healthy_allproteins.csv"
+
+INDEX_COLUMNS = ["SeqId", "Target", "EntrezGeneSymbol", "TargetFullName", "logFC", "P.Value", "adj.P.Val"]
+
+# Set in the parent before the pool starts; forked workers inherit it
+_dataset = None
+
+
+def select_seqids(store, volcano, proteins=None, id_type="EntrezGeneSymbol", min_logfc=None, max_p=None):
+    """
+    Return the SeqIds to export, in volcano order (most significant first).
+
+    proteins is a list of identifiers of id_type, resolved to their best SeqIds;
+    min_logfc and max_p filter the volcano table on |logFC| and P.Value.
+    With neither, every SeqId in the volcano table is returned.
+    """
+    if proteins:
+        seq_ids = []
+        for protein in proteins:
+            seq_id = store.best_seqid(id_type, protein)
+            if seq_id is None:
+                print(f"Warning: no data found for {id_type} = {protein}, skipped.", file=sys.stderr)
+            elif seq_id not in seq_ids:
+                seq_ids.append(seq_id)
+        return seq_ids
+
+    selected = volcano
+    if min_logfc is not None:
+        selected = selected[selected["logFC"].abs() > min_logfc]
+    if max_p is not None:
+        selected = selected[selected["P.Value"] < max_p]
+    selected = selected.sort_values("P.Value", kind="stable")
+    return [seq_id for seq_id in selected["SeqId"] if seq_id in store.seqid_pos]
+
+
+def _file_stem(seq_id, symbol):
+    return re.sub(r"[^A-Za-z0-9._-]+", "_", f"{seq_id}_{symbol}").strip("_")
+
+
+def render_protein(job):
+    """Render and write the plots of one SeqId; runs in a worker process."""
+    seq_id, out_dir, dpi = job
+    metadata, store, _ = _dataset
+    final_data, metadata_info = store.protein_frame(seq_id)
+    annotations = final_data.iloc[0] if len(final_data) else {}
+    protein_name = annotations.get("TargetFullName", seq_id)
+    stem = _file_stem(seq_id, annotations.get("EntrezGeneSymbol", ""))
+
+    files = {}
+    if not metadata_info.empty:
+        files["correlation"] = f"{stem}_correlation.png"
+        Path(out_dir, files["correlation"]).write_bytes(
+            figure_to_png(plot_correlation(final_data, metadata_info, protein_name), dpi=dpi)
+        )
+    if store.condition_summary is not None:
+        conditions, box_stats = store.condition_summary.box_stats(seq_id)
+        if box_stats:
+            files["boxplot"] = f"{stem}_boxplot.png"
+            Path(out_dir, files["boxplot"]).write_bytes(
+                figure_to_png(draw_boxplot(conditions, box_stats, protein_name), dpi=dpi)
+            )
+    return seq_id, files
+
+
+def _load_dataset_once(paths):
+    # Pool initializer: a no-op for forked workers, which inherit the parent's dataset
+    global _dataset
+    if _dataset is None:
+        _dataset = load_dataset(*paths)
+
+
+def write_index(out_dir, table, title):
+    """Write index.csv and an index.html linking every rendered plot."""
+    table.to_csv(Path(out_dir, "index.csv"), index=False)
+
+    rows = []
+    for _, row in table.iterrows():
+        cells = "".join(f"<td>{html.escape(str(row[name]))}</td>" for name in table.columns if name not in ("correlation", "boxplot"))
+        images = "".join(
+            f'<td><a href="{html.escape(row[kind])}"><img src="{html.escape(row[kind])}" width="240"></a></td>'
+            if isinstance(row[kind], str) else "<td></td>"
+            for kind in ("correlation", "boxplot")
+        )
+        rows.append(f"<tr>{cells}{images}</tr>")
+    headers = "".join(f"<th>{html.escape(name)}</th>" for name in table.columns)
+    Path(out_dir, "index.html").write_text(
+        f"<!DOCTYPE html><html><head><meta charset='utf-8'><title>{html.escape(title)}</title></head><body>"
+        f"<h1>{html.escape(title)}</h1><p>{len(table)} proteins</p>"
+        f"<table border='1' cellspacing='0' cellpadding='4'><tr>{headers}</tr>{''.join(rows)}</table></body></html>",
+        encoding="utf-8",
+    )
+
+
+def generate_report(seq_ids, volcano, out, title, workers=None, dpi=100, paths=None):
+    """
+    Render the plots of seq_ids in a process pool and write them with an index.
+
+    out is a directory, or a path ending in .zip for a zip archive. Returns the index table.
+    """
+    out = Path(out)
+    as_zip = out.suffix == ".zip"
+    out_dir = Path(tempfile.mkdtemp(prefix="report.")) if as_zip else out
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    # fork shares the loaded dataset with the workers copy-on-write; elsewhere they load it themselves
+    method = "fork" if "fork" in multiprocessing.get_all_start_methods() else None
+    context = multiprocessing.get_context(method)
+    jobs = [(seq_id, str(out_dir), dpi) for seq_id in seq_ids]
+    files = {}
+    try:
+        with context.Pool(workers, initializer=_load_dataset_once, initargs=(paths,)) as pool:
+            for done, (seq_id, rendered) in enumerate(pool.imap_unordered(render_protein, jobs, chunksize=8), 1):
+                files[seq_id] = rendered
+                if done % 100 == 0 or done == len(jobs):
+                    print(f"{done}/{len(jobs)} proteins rendered", file=sys.stderr)
+
+        _, store, _ = _dataset
+        table = pd.DataFrame({"SeqId": seq_ids})
+        annotations = store.annotations.set_index("SeqId")
+        statistics = volcano.drop_duplicates("SeqId").set_index("SeqId")
+        for name in INDEX_COLUMNS[1:]:
+            source = annotations if name in annotations.columns else statistics
+            if name in source.columns:
+                table[name] = source[name].reindex(seq_ids).to_numpy()
+        table["correlation"] = [files[seq_id].get("correlation") for seq_id in seq_ids]
+        table["boxplot"] = [files[seq_id].get("boxplot") for seq_id in seq_ids]
+        write_index(out_dir, table, title)
+
+        if as_zip:
+            out.parent.mkdir(parents=True, exist_ok=True)
+            shutil.make_archive(str(out.with_suffix("")), "zip", out_dir)
+    finally:
+        if as_zip:
+            shutil.rmtree(out_dir, ignore_errors=True)
+    return table
+
+
+def _contrast_level(levels, value):
+    # Command-line levels are text; metadata levels may be numbers
+    for level in levels:
+        if str(level) == value:
+            return level
+    raise SystemExit(f"Level '{value}' not found; choose from {[str(level) for level in levels]}.")
+
+
+def main(argv=None):
+    global _dataset
+
+    parser = argparse.ArgumentParser(description="Render correlation and box plots of many proteins.")
+    selection = parser.add_argument_group("protein selection (default: the volcano filters below)")
+    selection.add_argument("--proteins", nargs="+", help="Identifiers of the proteins to plot.")
+    selection.add_argument("--proteins-file", help="File with one identifier per line.")
+    selection.add_argument("--id-type", choices=ID_TYPES, default="EntrezGeneSymbol",
+                           help="Reference type of --proteins (default: EntrezGeneSymbol).")
+    selection.add_argument("--min-logfc", type=float, help="Keep proteins with |logFC| above this.")
+    selection.add_argument("--max-p", type=float, help="Keep proteins with P.Value below this.")
+    selection.add_argument("--contrast", nargs=3, metavar=("COLUMN", "CASE", "CONTROL"),
+                           help="Filter on a contrast of a metadata column instead of the published volcano.")
+    selection.add_argument("--all", action="store_true", help="Plot every protein.")
+    parser.add_argument("--out", required=True, help="Output directory, or a .zip file.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Worker processes (default: all CPUs).")
+    parser.add_argument("--dpi", type=int, default=100, help="Resolution of the PNG files (default: 100).")
+    parser.add_argument("--metadata", default=str(METADATA_PATH))
+    parser.add_argument("--proteins-data", default=str(PROTEINS_PATH), help="ADAT or long-format protein CSV.")
+    parser.add_argument("--volcano", default=str(VOLCANO_PATH))
+    args = parser.parse_args(argv)
+
+    proteins = list(args.proteins or [])
+    if args.proteins_file:
+        proteins += [line.strip() for line in Path(args.proteins_file).read_text().splitlines() if line.strip()]
+    if not (proteins or args.all or args.min_logfc is not None or args.max_p is not None):
+        parser.error("choose proteins with --proteins/--proteins-file, --min-logfc/--max-p, or --all")
+
+    start = time.perf_counter()
+    paths = (args.metadata, args.proteins_data, args.volcano)
+    _dataset = load_dataset(*paths)
+    metadata, store, volcano = _dataset
+
+    title = "All proteins" if args.all else "Selected proteins"
+    if args.contrast:
+        column, case, control = args.contrast
+        levels = contrast_columns(metadata).get(column)
+        if levels is None:
+            raise SystemExit(f"Column '{column}' cannot be used as a contrast.")
+        contrast = Contrast(column, _contrast_level(levels, case), _contrast_level(levels, control))
+        volcano = differential_expression(store, contrast)
+        title = contrast.title
+    filters = [f"|logFC| > {args.min_logfc}" if args.min_logfc is not None else None,
+               f"P.Value < {args.max_p}" if args.max_p is not None else None]
+    if not proteins and any(filters):
+        title += f" ({', '.join(text for text in filters if text)})"
+
+    seq_ids = select_seqids(store, volcano, proteins=proteins, id_type=args.id_type,
+                            min_logfc=args.min_logfc, max_p=args.max_p)
+    if not seq_ids:
+        raise SystemExit("No proteins match the selection.")
+
+    generate_report(seq_ids, volcano, args.out, title, workers=args.workers, dpi=args.dpi, paths=paths)
+    print(f"{len(seq_ids)} proteins written to {args.out} in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
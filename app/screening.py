@@ -0,0 +1,122 @@
+"""
+Correlation of every protein with a numeric metadata column, such as Total_mRss.
+
+The vectorized counterpart of the per-SeqId lm/cor loop in
+MRSS_correlation_plots.Rmd: Pearson and Spearman correlations, R², the
+regression slope of the column on intensity and Benjamini-Hochberg adjusted
+p-values for all SeqIds are computed in one pass over the intensity matrix.
+"""
+import numpy as np
+import pandas as pd
+
+from differential import ID_COLUMNS, benjamini_hochberg
+
+# Annotations shown next to the statistics in the ranked table
+SCREEN_ANNOTATIONS = ["Target", "EntrezGeneSymbol", "TargetFullName", "EntrezGeneID"]
+
+
+def numeric_columns(metadata, min_values=3):
+    """Return the numeric metadata columns with at least min_values distinct values."""
+    return [
+        column for column in metadata.columns
+        if column not in ID_COLUMNS
+        and pd.api.types.is_numeric_dtype(metadata[column])
+        and metadata[column].nunique() >= min_values
+    ]
+
+
+def _pearson(x, y, observed):
+    # Column-wise Pearson r, slope and intercept of y on x over the observed rows of each column
+    n = observed.sum(axis=0)
+    x = np.where(observed, x, 0)
+    y = np.where(observed, y, 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        x_mean = x.sum(axis=0) / n
+        y_mean = y.sum(axis=0) / n
+        x_centered = np.where(observed, x - x_mean, 0)
+        y_centered = np.where(observed, y - y_mean, 0)
+        sxy = (x_centered * y_centered).sum(axis=0)
+        sxx = (x_centered ** 2).sum(axis=0)
+        syy = (y_centered ** 2).sum(axis=0)
+        r = np.clip(sxy / np.sqrt(sxx * syy), -1, 1)
+        slope = sxy / sxx
+    return n, r, slope, y_mean - slope * x_mean
+
+
+def _correlation_p(r, n):
+    # Two-sided p-value of r from the t distribution with n - 2 degrees of freedom;
+    # NaN without degrees of freedom, where two points always give r = ±1
+    from scipy import stats
+
+    df = n - 2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t = r * np.sqrt(df / ((1 - r) * (1 + r)))
+    p_value = 2 * stats.t.sf(np.abs(t), np.where(df > 0, df, np.nan))
+    return np.where((np.abs(r) == 1) & (df > 0), 0.0, p_value)
+
+
+def _ranks(x, observed):
+    # Average ranks over the observed rows of each column, NaN elsewhere
+    from scipy import stats
+
+    ranks = np.full(x.shape, np.nan)
+    complete = observed.all(axis=0)
+    ranks[:, complete] = stats.rankdata(x[:, complete], axis=0)
+    for j in np.flatnonzero(~complete):
+        ranks[observed[:, j], j] = stats.rankdata(x[observed[:, j], j])
+    return ranks
+
+
+def correlation_screen(store, column="Total_mRss", log2=False):
+    """
+    Correlate every SeqId of a ProteinStore with a numeric metadata column.
+
+    Parameters:
+    store (ProteinStore): Intensities of all samples and proteins.
+    column (str): Numeric metadata column, Total_mRss by default.
+    log2 (bool): Correlate log2 intensities instead of the raw values (as in the R markdown).
+
+    Returns:
+    pd.DataFrame: One row per SeqId, ranked by Pearson p-value, with n, pearson_r,
+    R_squared, slope and intercept of lm(column ~ Intensity), pearson_p,
+    pearson_adj_p, spearman_rho, spearman_p and spearman_adj_p.
+    """
+    if column not in store.metadata.columns:
+        raise ValueError(f"Column '{column}' not found in metadata.")
+
+    # Samples with a metadata row and a value in the column
+    rows = store.metadata_rows
+    response = np.full(len(rows), np.nan)
+    response[rows >= 0] = pd.to_numeric(store.metadata[column], errors="coerce").to_numpy()[rows[rows >= 0]]
+    keep = ~np.isnan(response)
+    if keep.sum() < 3:
+        raise ValueError(f"Fewer than 3 samples have a value for '{column}'.")
+
+    x = np.asarray(store.values[keep], dtype=np.float64)
+    if log2:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            x = np.log2(x)
+        x[~np.isfinite(x)] = np.nan
+    y = np.broadcast_to(response[keep, None], x.shape)
+    observed = ~np.isnan(x)
+
+    n, r, slope, intercept = _pearson(x, y, observed)
+    _, rho, _, _ = _pearson(_ranks(x, observed), _ranks(y, observed), observed)
+    pearson_p = _correlation_p(r, n)
+    spearman_p = _correlation_p(rho, n)
+
+    results = pd.DataFrame({"SeqId": store.seq_ids})
+    for name in SCREEN_ANNOTATIONS:
+        if name in store.annotations.columns:
+            results[name] = store.annotations[name].to_numpy()
+    results["n"] = n
+    results["pearson_r"] = r
+    results["R_squared"] = r ** 2
+    results["slope"] = slope
+    results["intercept"] = intercept
+    results["pearson_p"] = pearson_p
+    results["pearson_adj_p"] = benjamini_hochberg(pearson_p)
+    results["spearman_rho"] = rho
+    results["spearman_p"] = spearman_p
+    results["spearman_adj_p"] = benjamini_hochberg(spearman_p)
+    return results.sort_values("pearson_p", kind="stable", ignore_index=True)
@@ -0,0 +1,208 @@
+"""
+Ranked protein search over all four identifier columns at once.
+
+SearchIndex is built once from an IdentifierIndex and answers a free-text
+query with the top matches, each tagged with the ID type it matched, so the
+page only sends the best few options to the browser instead of every value
+of one ID type. Matches are ranked by kind: exact, prefix, prefix of a word,
+substring, and finally typo-tolerant trigram similarity (as in PostgreSQL's
+pg_trgm) when there are too few of the others.
+"""
+import re
+from typing import NamedTuple
+
+import numpy as np
+from identifiers import ID_TYPES, normalize_identifier
+from mapped import StringTable, bisect_strings, sorted_order
+
+# Kinds of match, best first
+MATCH_KINDS = ["exact", "prefix", "word prefix", "substring", "similar"]
+EXACT, PREFIX, WORD_PREFIX, SUBSTRING, SIMILAR = range(len(MATCH_KINDS))
+
+# Lowest trigram similarity of a typo-tolerant match
+MIN_SIMILARITY = 0.3
+DEFAULT_LIMIT = 20
+
+_WORD = re.compile(r"\w+")
+_MAX_CHAR = "\U0010ffff"
+
+
+class SearchMatch(NamedTuple):
+    """One search result: an identifier value and the ID type it belongs to."""
+
+    value: object
+    id_type: str
+    kind: str
+    score: float
+
+    @property
+    def label(self):
+        return f"{self.value} ({self.id_type})"
+
+
+def trigrams(text):
+    """Return the set of 3-grams of each word of text, padded as in pg_trgm ("  w", " wo", ..., "rd ")."""
+    grams = set()
+    for word in _WORD.findall(text.lower()):
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def _prefix_range(strings, order, prefix):
+    return bisect_strings(strings, order, prefix), bisect_strings(strings, order, prefix + _MAX_CHAR)
+
+
+class SearchIndex:
+    """
+    Case-insensitive prefix, substring and trigram search of every value of
+    every ID type in an IdentifierIndex.
+
+    The values, their lower-case texts, words and trigrams are held in
+    StringTables and numpy arrays, so to_arrays/from_arrays can save the
+    index and map it back from disk.
+    """
+
+    def __init__(self, index):
+        """
+        Parameters:
+        - index (IdentifierIndex): Identifier values to search, per ID type.
+        """
+        values, type_rank, texts = [], [], []
+        for id_type in index.id_types:
+            for value in index.values(id_type):
+                values.append(value)
+                type_rank.append(ID_TYPES.index(id_type))
+                texts.append(normalize_identifier(value).lower())
+
+        # Sorted words for word-prefix matches
+        words = sorted((word, i) for i, text in enumerate(texts) for word in set(_WORD.findall(text)))
+
+        # Trigram postings as one array: entries with trigram g are postings[offsets[g]:offsets[g + 1]]
+        entry_grams = [trigrams(text) for text in texts]
+        grams = sorted(set().union(*entry_grams))
+        gram_ids = {gram: g for g, gram in enumerate(grams)}
+        gram_column = np.array([gram_ids[gram] for entry in entry_grams for gram in entry], dtype=np.int32)
+        entry_column = np.repeat(np.arange(len(texts), dtype=np.int32), [len(entry) for entry in entry_grams])
+
+        self._setup(
+            values=values,
+            type_rank=np.array(type_rank, dtype=np.int8),
+            texts=StringTable.from_strings(texts),
+            lengths=np.array([len(text) for text in texts], dtype=np.int32),
+            sorted_entries=sorted_order(texts),
+            words=StringTable.from_strings(word for word, _ in words),
+            word_entries=np.array([i for _, i in words], dtype=np.int32),
+            grams=StringTable.from_strings(grams),
+            postings=entry_column[np.argsort(gram_column, kind="stable")],
+            offsets=np.concatenate([[0], np.cumsum(np.bincount(gram_column, minlength=len(grams)))]),
+            gram_counts=np.array([len(entry) for entry in entry_grams], dtype=np.int32),
+        )
+
+    def _setup(self, values, type_rank, texts, lengths, sorted_entries, words, word_entries, grams, postings,
+               offsets, gram_counts):
+        self._values = values
+        self._type_rank = type_rank
+        self._texts = texts
+        self._lengths = lengths
+        self._sorted_entries = sorted_entries
+        self._text_rank = np.empty(len(sorted_entries), dtype=np.int32)
+        self._text_rank[sorted_entries] = np.arange(len(sorted_entries))
+        self._words = words
+        self._word_entries = word_entries
+        self._grams = grams
+        self._postings = postings
+        self._offsets = offsets
+        self._gram_counts = gram_counts
+
+    _ARRAYS = ["type_rank", "lengths", "sorted_entries", "word_entries", "postings", "offsets", "gram_counts"]
+    _TABLES = ["texts", "words", "grams"]
+
+    def to_arrays(self):
+        """Return the index as named numpy arrays, for mapped.save_arrays. Values are saved as strings."""
+        arrays = {f"search.{name}": getattr(self, f"_{name}") for name in self._ARRAYS}
+        for name in self._TABLES:
+            arrays.update(getattr(self, f"_{name}").arrays(f"search.{name}"))
+        values = self._values if isinstance(self._values, StringTable) else (
+            StringTable.from_strings(str(value) for value in self._values))
+        arrays.update(values.arrays("search.values"))
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """Rebuild an index from to_arrays output, e.g. memory-mapped by mapped.load_arrays."""
+        index = cls.__new__(cls)
+        index._setup(
+            values=StringTable.from_arrays(arrays, "search.values"),
+            **{name: arrays[f"search.{name}"] for name in cls._ARRAYS},
+            **{name: StringTable.from_arrays(arrays, f"search.{name}") for name in cls._TABLES},
+        )
+        return index
+
+    def __len__(self):
+        return len(self._texts)
+
+    def _similar(self, query):
+        query_grams = trigrams(query)
+        grams = []
+        for gram in query_grams:
+            g = bisect_strings(self._grams, range(len(self._grams)), gram)
+            if g < len(self._grams) and self._grams[g] == gram:
+                grams.append(g)
+        if not grams:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        hits = np.concatenate([self._postings[self._offsets[g]:self._offsets[g + 1]] for g in grams])
+        shared = np.bincount(hits, minlength=len(self))
+        candidates = np.flatnonzero(shared)
+        similarity = shared[candidates] / (len(query_grams) + self._gram_counts[candidates] - shared[candidates])
+        keep = similarity >= MIN_SIMILARITY
+        return candidates[keep], similarity[keep]
+
+    def _containing(self, query):
+        # Entries whose text contains query, found by scanning the NUL-separated text buffer
+        data, needle = self._texts.data.tobytes(), query.encode("utf-8")
+        positions = []
+        position = data.find(needle)
+        while position >= 0:
+            positions.append(position)
+            position = data.find(needle, position + 1)
+        return np.unique(self._texts.locate(positions)).tolist()
+
+    def search(self, query, limit=DEFAULT_LIMIT):
+        """
+        Return the best matches of query as a list of SearchMatch, best first.
+
+        Within a kind of match, shorter values (closer to the query) come first,
+        then ID types in ID_TYPES order, then values alphabetically. Trigram
+        matches are only looked up when the other kinds give fewer than limit results.
+        """
+        query = query.strip().lower()
+        if not query or limit <= 0:
+            return []
+
+        kinds = {}
+        start, end = _prefix_range(self._texts, self._sorted_entries, query)
+        for i in self._sorted_entries[start:end].tolist():
+            kinds[i] = EXACT if self._lengths[i] == len(query) else PREFIX
+        start, end = _prefix_range(self._words, range(len(self._words)), query)
+        for i in self._word_entries[start:end].tolist():
+            kinds.setdefault(i, WORD_PREFIX)
+        if len(query) > 1:
+            for i in self._containing(query):
+                kinds.setdefault(i, SUBSTRING)
+
+        entries = np.fromiter(kinds, dtype=np.int64, count=len(kinds))
+        kind = np.fromiter(kinds.values(), dtype=np.int64, count=len(kinds))
+        score = len(query) / np.maximum(self._lengths[entries], 1)
+        if len(kinds) < limit and len(query) >= 3:
+            similar, similarity = self._similar(query)
+            new = ~np.isin(similar, entries)
+            entries = np.concatenate([entries, similar[new]])
+            kind = np.concatenate([kind, np.full(new.sum(), SIMILAR)])
+            score = np.concatenate([score, similarity[new]])
+
+        order = np.lexsort((self._text_rank[entries], self._type_rank[entries], -score, kind))[:limit]
+        return [
+            SearchMatch(self._values[i], ID_TYPES[self._type_rank[i]], MATCH_KINDS[kind[k]], float(score[k]))
+            for k, i in zip(order.tolist(), entries[order].tolist())
+        ]
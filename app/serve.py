@@ -0,0 +1,111 @@
+"""
+Serve the app from several Streamlit processes that share its datasets.
+
+The on-disk cache (datacache.py) of every dataset of the manifest
+(registry.py) is built once, then N workers running
+`streamlit run app/main.py` are started on consecutive ports, each warming
+its in-memory caches from the moment it starts (see prewarm.py). Every
+worker memory-maps the same cached arrays read-only (intensity matrix,
+identifier and search indexes, chosen SeqIds, per-condition summary), so the
+OS holds one copy of them however many workers run, while plot rendering
+spreads over the CPU cores.
+
+Put a reverse proxy with sticky sessions in front, since each Streamlit
+session lives on one websocket of one worker; e.g. for nginx:
+
+    upstream sclerobase { ip_hash; server 127.0.0.1:8501; server 127.0.0.1:8502; }
+
+Examples:
+    python app/serve.py --workers 4
+    python app/serve.py --workers 2 --port 9000 -- --server.address=0.0.0.0
+"""
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from registry import DatasetRegistry, load_cohort
+
+PREWARM_PATH = Path(__file__).parent / "prewarm.py"
+
+
+def worker_command(port, streamlit_args=()):
+    """Command line of one Streamlit worker listening on port, which runs main.py and warms its caches at start."""
+    return [
+        sys.executable, str(PREWARM_PATH),
+        f"--server.port={port}", "--server.headless=true", *streamlit_args,
+    ]
+
+
+def worker_environment(workers):
+    """Environment of the workers: the render thread pools split the CPU cores unless set explicitly."""
+    environment = dict(os.environ)
+    environment.setdefault("SCLEROBASE_RENDER_WORKERS", str(max(1, (os.cpu_count() or 1) // workers)))
+    return environment
+
+
+def serve(workers, port, streamlit_args=()):
+    """
+    Start the workers and wait for them. When one exits, or on SIGINT/SIGTERM,
+    the others are stopped too, so a process manager can restart the group.
+    Returns the exit code of the first worker to stop.
+    """
+    for cohort in DatasetRegistry.from_manifest().cohorts.values():
+        start = time.perf_counter()
+        _, store, _ = load_cohort(cohort)
+        print(f"Dataset {cohort.id} ({store.version}) ready in {time.perf_counter() - start:.1f}s", flush=True)
+
+    environment = worker_environment(workers)
+    processes = [
+        subprocess.Popen(worker_command(port + i, streamlit_args), env=environment)
+        for i in range(workers)
+    ]
+    print(f"Started {workers} workers on ports {port}-{port + workers - 1}", flush=True)
+
+    def stop(signum, frame):
+        raise KeyboardInterrupt
+    signal.signal(signal.SIGTERM, stop)
+
+    exit_code = 0
+    try:
+        while all(process.poll() is None for process in processes):
+            time.sleep(1)
+        exit_code = next(process.returncode for process in processes if process.poll() is not None)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for process in processes:
+            if process.poll() is None:
+                process.terminate()
+        for process in processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+    return exit_code
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Run several Streamlit workers of the app on consecutive ports, sharing one memory-mapped dataset.",
+        epilog="Arguments after -- are passed to every `streamlit run`.",
+    )
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("SCLEROBASE_WORKERS", os.cpu_count() or 1)),
+                        help="Number of worker processes (default: $SCLEROBASE_WORKERS, or all CPUs).")
+    parser.add_argument("--port", type=int, default=8501, help="Port of the first worker (default: 8501).")
+    argv = sys.argv[1:] if argv is None else list(argv)
+    streamlit_args = []
+    if "--" in argv:
+        split = argv.index("--")
+        argv, streamlit_args = argv[:split], argv[split + 1:]
+    args = parser.parse_args(argv)
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    sys.exit(serve(args.workers, args.port, streamlit_args))
+
+
+if __name__ == "__main__":
+    main()
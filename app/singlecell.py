@@ -0,0 +1,224 @@
+"""
+Process-wide, read-only access to the single-cell dataset.
+
+The h5ad file is opened once in backed mode, so the expression matrix stays
+on disk. Only the UMAP coordinates, the leiden labels and the columns of the
+genes actually plotted are read into memory, and recently used gene columns
+are kept in an LRU cache.
+
+For the fastest plots, build_singlecell_store converts the h5ad file once
+into plain arrays (float32 UMAP, small-int leiden codes and a CSC
+gene-by-gene expression matrix) that SingleCellStore memory-maps without
+importing anndata or scanpy:
+    python app/singlecell.py
+"""
+import json
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+SINGLECELL_FILENAME = "final_combined_simplified.h5ad"
+SINGLECELL_STORE_DIRNAME = "singlecell_store"
+
+
+class SingleCellAccessor:
+    """Backed, read-only view of an h5ad file for one-gene UMAP and violin plots."""
+
+    def __init__(self, h5ad_path, gene_cache_size=32):
+        import anndata
+
+        self.path = str(h5ad_path)
+        self.adata = anndata.read_h5ad(self.path, backed="r")
+
+        # obs and obsm are held in memory by backed AnnData; only copy what the plots use
+        self.umap = np.asarray(self.adata.obsm["X_umap"], dtype=np.float32)
+        self.leiden = self.adata.obs["leiden"].astype("category")
+        self.leiden_colors = self.adata.uns.get("leiden_colors")
+
+        # Gene plots read raw counts when the file has them, like sc.pl.umap and sc.pl.violin
+        if self.adata.raw is not None:
+            self._matrix = self.adata.raw.X
+            var_names = self.adata.raw.var_names
+        else:
+            self._matrix = self.adata.X
+            var_names = self.adata.var_names
+        self.gene_pos = {name: j for j, name in enumerate(var_names)}
+
+        self.gene_cache_size = gene_cache_size
+        self._gene_cache = OrderedDict()
+        # h5py file handles must not be read from several threads at once
+        self._lock = threading.Lock()
+
+    @property
+    def n_cells(self):
+        return len(self.leiden)
+
+    def gene_vector(self, gene):
+        """Return one gene's expression over all cells as a float32 vector."""
+        with self._lock:
+            if gene in self._gene_cache:
+                self._gene_cache.move_to_end(gene)
+                return self._gene_cache[gene]
+
+            if gene not in self.gene_pos:
+                raise KeyError(f"Gene '{gene}' not found in single-cell data.")
+            column = self._matrix[:, self.gene_pos[gene]]
+            if hasattr(column, "toarray"):
+                column = column.toarray()
+            vector = np.asarray(column, dtype=np.float32).ravel()
+            vector.flags.writeable = False
+
+            self._gene_cache[gene] = vector
+            if len(self._gene_cache) > self.gene_cache_size:
+                self._gene_cache.popitem(last=False)
+            return vector
+
+    def plot_adata(self, gene):
+        """
+        Build a small in-memory AnnData holding only the UMAP, leiden labels and
+        one gene, which scanpy's plotting functions accept in place of the full file.
+        """
+        import anndata
+
+        adata = anndata.AnnData(
+            X=self.gene_vector(gene).reshape(-1, 1),
+            obs=pd.DataFrame({"leiden": self.leiden.to_numpy()}, index=self.adata.obs_names),
+            var=pd.DataFrame(index=[gene]),
+        )
+        adata.obs["leiden"] = adata.obs["leiden"].astype(self.leiden.dtype)
+        adata.obsm["X_umap"] = self.umap
+        if self.leiden_colors is not None:
+            adata.uns["leiden_colors"] = self.leiden_colors
+        return adata
+
+
+_accessors = {}
+_accessors_lock = threading.Lock()
+
+
+def get_singlecell_accessor(single_cell_data_path):
+    """Return the process-wide SingleCellAccessor of the h5ad file in single_cell_data_path."""
+    h5ad_path = str(Path(single_cell_data_path) / SINGLECELL_FILENAME)
+    with _accessors_lock:
+        if h5ad_path not in _accessors:
+            _accessors[h5ad_path] = SingleCellAccessor(h5ad_path)
+        return _accessors[h5ad_path]
+
+
+def build_singlecell_store(h5ad_path, store_path):
+    """
+    Write the arrays SingleCellStore reads from an h5ad file.
+
+    - umap.npy: float32 (cells x 2) UMAP embedding
+    - leiden_codes.npy: int8/int16 cluster code of every cell
+    - expression_{data,indices,indptr}.npy: CSC expression matrix, so the
+      non-zero values of one gene are a contiguous slice
+    - store.json: gene names, cluster names and colours
+    """
+    import anndata
+    from scipy import sparse
+
+    adata = anndata.read_h5ad(str(h5ad_path))
+    if adata.raw is not None:
+        matrix, var_names = adata.raw.X, adata.raw.var_names
+    else:
+        matrix, var_names = adata.X, adata.var_names
+    expression = sparse.csc_matrix(matrix, dtype=np.float32)
+    expression.sort_indices()
+
+    leiden = adata.obs["leiden"].astype("category")
+    code_dtype = np.int8 if len(leiden.cat.categories) < 128 else np.int16
+
+    store_path = Path(store_path)
+    store_path.mkdir(parents=True, exist_ok=True)
+    np.save(store_path / "umap.npy", np.asarray(adata.obsm["X_umap"][:, :2], dtype=np.float32))
+    np.save(store_path / "leiden_codes.npy", leiden.cat.codes.to_numpy().astype(code_dtype))
+    np.save(store_path / "expression_data.npy", expression.data)
+    np.save(store_path / "expression_indices.npy", expression.indices.astype(np.int32))
+    np.save(store_path / "expression_indptr.npy", expression.indptr.astype(np.int64))
+
+    leiden_colors = adata.uns.get("leiden_colors")
+    with open(store_path / "store.json", "w") as store_file:
+        json.dump({
+            "genes": [str(name) for name in var_names],
+            "leiden_categories": [str(name) for name in leiden.cat.categories],
+            "leiden_colors": None if leiden_colors is None else [str(color) for color in leiden_colors],
+        }, store_file)
+
+
+class SingleCellStore:
+    """
+    Memory-mapped single-cell arrays written by build_singlecell_store.
+
+    Reading a gene touches only its slice of the CSC matrix, and nothing here
+    imports anndata or scanpy.
+    """
+
+    def __init__(self, store_path, gene_cache_size=32):
+        store_path = Path(store_path)
+        with open(store_path / "store.json") as store_file:
+            info = json.load(store_file)
+
+        self.umap = np.load(store_path / "umap.npy", mmap_mode="r")
+        self.leiden_codes = np.load(store_path / "leiden_codes.npy", mmap_mode="r")
+        self.leiden_categories = info["leiden_categories"]
+        self.leiden_colors = info["leiden_colors"]
+        self._data = np.load(store_path / "expression_data.npy", mmap_mode="r")
+        self._indices = np.load(store_path / "expression_indices.npy", mmap_mode="r")
+        self._indptr = np.load(store_path / "expression_indptr.npy", mmap_mode="r")
+        self.gene_pos = {gene: j for j, gene in enumerate(info["genes"])}
+
+        self.gene_cache_size = gene_cache_size
+        self._gene_cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def n_cells(self):
+        return len(self.leiden_codes)
+
+    def gene_vector(self, gene):
+        """Return one gene's expression over all cells as a float32 vector."""
+        with self._lock:
+            if gene in self._gene_cache:
+                self._gene_cache.move_to_end(gene)
+                return self._gene_cache[gene]
+
+        if gene not in self.gene_pos:
+            raise KeyError(f"Gene '{gene}' not found in single-cell data.")
+        j = self.gene_pos[gene]
+        start, end = self._indptr[j], self._indptr[j + 1]
+        vector = np.zeros(self.n_cells, dtype=np.float32)
+        vector[self._indices[start:end]] = self._data[start:end]
+        vector.flags.writeable = False
+
+        with self._lock:
+            self._gene_cache[gene] = vector
+            if len(self._gene_cache) > self.gene_cache_size:
+                self._gene_cache.popitem(last=False)
+        return vector
+
+
+_stores = {}
+
+
+def get_singlecell_store(single_cell_data_path):
+    """
+    Return the process-wide SingleCellStore built in single_cell_data_path,
+    or None if build_singlecell_store has not been run.
+    """
+    store_path = Path(single_cell_data_path) / SINGLECELL_STORE_DIRNAME
+    with _accessors_lock:
+        if str(store_path) not in _stores:
+            if not (store_path / "store.json").exists():
+                return None
+            _stores[str(store_path)] = SingleCellStore(store_path)
+        return _stores[str(store_path)]
+
+
+if __name__ == "__main__":
+    CORE_DATA_PATH = Path(__file__).parent.parent / "Core data"
+    build_singlecell_store(CORE_DATA_PATH / SINGLECELL_FILENAME, CORE_DATA_PATH / SINGLECELL_STORE_DIRNAME)
+    print(f"Single-cell store written to {CORE_DATA_PATH / SINGLECELL_STORE_DIRNAME}")
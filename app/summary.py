@@ -0,0 +1,190 @@
+"""
+Per-condition summary statistics of every protein.
+
+ConditionSummary holds, for each (condition, SeqId), the statistics a box
+plot needs: n, mean, SD, quartiles, whisker ends and outliers. These are
+computed for all SeqIds in one vectorized pass per condition, using the
+rules of matplotlib's boxplot_stats. A box plot is then a lookup and an
+ax.bxp draw, and the same numbers give a downloadable table.
+"""
+import numpy as np
+import pandas as pd
+
+# Display order of the cohort's conditions; any other condition follows, sorted
+CONDITION_ORDER = ["Healthy", "VEDOSS", "SSC_low", "SSC_high"]
+STAT_NAMES = ["n", "mean", "sd", "q1", "median", "q3", "whislo", "whishi"]
+WHISKER_IQR = 1.5
+
+
+def order_conditions(conditions):
+    """Sort condition names in CONDITION_ORDER, then alphabetically."""
+    conditions = set(conditions)
+    known = [condition for condition in CONDITION_ORDER if condition in conditions]
+    return known + sorted(conditions - set(known), key=str)
+
+
+def _quantiles(sorted_values, n, probabilities):
+    # Linearly interpolated quantiles (numpy's default) of columns sorted with NaN last
+    n = np.maximum(n, 1)
+    columns = np.arange(sorted_values.shape[1])
+    quantiles = []
+    for p in probabilities:
+        position = p * (n - 1)
+        lower = np.floor(position).astype(np.int64)
+        upper = np.minimum(lower + 1, n - 1)
+        weight = position - lower
+        quantiles.append(sorted_values[lower, columns] * (1 - weight) + sorted_values[upper, columns] * weight)
+    return quantiles
+
+
+def summarize(values):
+    """
+    Box-plot statistics of every column of a samples x SeqId matrix.
+
+    Returns (stats, flier_values, flier_offsets): stats maps each of STAT_NAMES
+    to a per-column vector; the outliers of column j are
+    flier_values[flier_offsets[j]:flier_offsets[j + 1]].
+    """
+    values = np.asarray(values, dtype=np.float64)
+    observed = ~np.isnan(values)
+    n = observed.sum(axis=0)
+    sorted_values = np.sort(values, axis=0)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        total = np.where(observed, values, 0).sum(axis=0)
+        mean = total / n
+        squares = np.where(observed, (values - mean) ** 2, 0).sum(axis=0)
+        sd = np.sqrt(squares / (n - 1))
+    q1, median, q3 = _quantiles(sorted_values, n, [0.25, 0.5, 0.75])
+
+    # Whiskers reach the most extreme values within 1.5 IQR of the box, as in matplotlib
+    iqr = q3 - q1
+    low_bound, high_bound = q1 - WHISKER_IQR * iqr, q3 + WHISKER_IQR * iqr
+    whislo = np.where(observed & (values >= low_bound), values, np.inf).min(axis=0)
+    whislo = np.where(np.isinf(whislo) | (whislo > q1), q1, whislo)
+    whishi = np.where(observed & (values <= high_bound), values, -np.inf).max(axis=0)
+    whishi = np.where(np.isinf(whishi) | (whishi < q3), q3, whishi)
+
+    empty = n == 0
+    stats = {"n": n, "mean": mean, "sd": sd, "q1": q1, "median": median, "q3": q3, "whislo": whislo, "whishi": whishi}
+    for name in STAT_NAMES[1:]:
+        stats[name] = np.where(empty, np.nan, stats[name])
+
+    # Outliers, grouped by column
+    is_flier = observed & ((values < whislo) | (values > whishi))
+    columns, rows = np.nonzero(is_flier.T)
+    flier_values = values[rows, columns]
+    flier_offsets = np.concatenate([[0], np.cumsum(np.bincount(columns, minlength=values.shape[1]))])
+    return stats, flier_values, flier_offsets
+
+
+class ConditionSummary:
+    """
+    Box-plot statistics of every SeqId in every condition, as compact float32 arrays.
+
+    stats[name] has shape (conditions, SeqIds); the outliers of condition c and
+    SeqId j are flier_values[c][flier_offsets[c][j]:flier_offsets[c][j + 1]].
+    """
+
+    def __init__(self, values, groups, seq_ids):
+        """
+        Parameters:
+        - values (np.ndarray): samples x SeqId intensities.
+        - groups (array-like): condition of each sample; missing values are left out.
+        - seq_ids (array-like): SeqId of each column of values.
+        """
+        groups = pd.Series(groups, dtype=object)
+        self.conditions = order_conditions(groups.dropna().unique())
+        self.seq_ids = np.asarray(seq_ids, dtype=object)
+        self.seqid_pos = {seq_id: j for j, seq_id in enumerate(self.seq_ids)}
+
+        per_condition = []
+        self.flier_values, self.flier_offsets = [], []
+        for condition in self.conditions:
+            rows = np.flatnonzero((groups == condition).to_numpy())
+            stats, flier_values, flier_offsets = summarize(values[rows])
+            per_condition.append(stats)
+            self.flier_values.append(flier_values.astype(np.float32))
+            self.flier_offsets.append(flier_offsets.astype(np.int32))
+
+        self.stats = {
+            name: np.array([stats[name] for stats in per_condition], dtype=np.int32 if name == "n" else np.float32)
+            .reshape(len(self.conditions), len(self.seq_ids))
+            for name in STAT_NAMES
+        }
+
+    @classmethod
+    def from_store(cls, store, column="condition"):
+        """Summarize a ProteinStore by a metadata column, or return None if metadata has no such column."""
+        if column not in store.metadata.columns:
+            return None
+        return cls(store.values, store.sample_column(column), store.seq_ids)
+
+    def to_arrays(self):
+        """Return the summary as named numpy arrays, for mapped.save_arrays."""
+        arrays = {"summary.conditions": np.array(self.conditions, dtype=str)}
+        for name in STAT_NAMES:
+            arrays[f"summary.{name}"] = self.stats[name]
+        for c, (values, offsets) in enumerate(zip(self.flier_values, self.flier_offsets)):
+            arrays[f"summary.fliers.{c}"] = values
+            arrays[f"summary.flier_offsets.{c}"] = offsets
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays, seq_ids, seqid_pos=None):
+        """
+        Rebuild a summary from to_arrays output, e.g. memory-mapped by
+        mapped.load_arrays, or return None if it holds no summary.
+        seqid_pos may share the SeqId position map of a ProteinStore.
+        """
+        if "summary.conditions" not in arrays:
+            return None
+        summary = cls.__new__(cls)
+        summary.conditions = arrays["summary.conditions"].tolist()
+        summary.seq_ids = np.asarray(seq_ids, dtype=object)
+        summary.seqid_pos = {seq_id: j for j, seq_id in enumerate(summary.seq_ids)} if seqid_pos is None else seqid_pos
+        summary.stats = {name: arrays[f"summary.{name}"] for name in STAT_NAMES}
+        summary.flier_values = [arrays[f"summary.fliers.{c}"] for c in range(len(summary.conditions))]
+        summary.flier_offsets = [arrays[f"summary.flier_offsets.{c}"] for c in range(len(summary.conditions))]
+        return summary
+
+    def box_stats(self, seq_id):
+        """
+        Return (conditions, stats) of one SeqId for matplotlib's Axes.bxp, leaving
+        out conditions without samples.
+        """
+        j = self.seqid_pos[seq_id]
+        conditions, box_stats = [], []
+        for c, condition in enumerate(self.conditions):
+            if self.stats["n"][c, j] == 0:
+                continue
+            start, end = self.flier_offsets[c][j], self.flier_offsets[c][j + 1]
+            box = {name: float(self.stats[name][c, j]) for name in ["mean", "q1", "q3", "whislo", "whishi"]}
+            box["med"] = float(self.stats["median"][c, j])
+            box["fliers"] = self.flier_values[c][start:end]
+            box["label"] = condition
+            conditions.append(condition)
+            box_stats.append(box)
+        return conditions, box_stats
+
+    def to_frame(self, annotations=None):
+        """
+        Long table with one row per SeqId and condition: the statistics and
+        the outliers as a "; "-separated string, optionally preceded by annotations.
+        """
+        n_conditions, n_seqids = len(self.conditions), len(self.seq_ids)
+        frame = pd.DataFrame({
+            "SeqId": np.tile(self.seq_ids, n_conditions),
+            "condition": np.repeat(self.conditions, n_seqids),
+        })
+        if annotations is not None:
+            extra = annotations.drop(columns="SeqId").reset_index(drop=True)
+            frame = pd.concat([frame, pd.concat([extra] * n_conditions, ignore_index=True)], axis=1)
+        for name in STAT_NAMES:
+            frame[name] = self.stats[name].ravel()
+        frame["outliers"] = [
+            "; ".join(f"{value:g}" for value in values[offsets[j]:offsets[j + 1]])
+            for values, offsets in zip(self.flier_values, self.flier_offsets)
+            for j in range(n_seqids)
+        ]
+        return frame
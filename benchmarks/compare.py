@@ -0,0 +1,82 @@
+"""
+Compare two result files of run_benchmarks.py, e.g. before and after a change.
+
+Prints the median time and peak memory of every benchmark present in both
+files, with the ratio new / base, and exits with status 1 if any time or
+peak memory grew by more than --threshold (so it can gate a CI job).
+
+    python benchmarks/compare.py results/main.json results/branch.json --threshold 1.2
+"""
+import argparse
+import json
+import sys
+
+
+def _key(record):
+    return record["name"], record["variant"], record["samples"], record["seqids"]
+
+
+def compare(base, new, threshold=1.1):
+    """
+    Pair the measured records of two result files.
+
+    Parameters:
+    - base, new (dict): Contents of two run_benchmarks.py result files.
+    - threshold (float): A ratio above this marks a regression.
+
+    Returns:
+    - list of dict: One row per benchmark measured in both files, in the new
+      file's order, with base and new median seconds and peak bytes, their
+      ratios and whether either regressed.
+    """
+    base_records = {_key(record): record for record in base["results"] if "seconds" in record}
+    rows = []
+    for record in new["results"]:
+        before = base_records.get(_key(record))
+        if before is None or "seconds" not in record:
+            continue
+        time_ratio = record["seconds"]["median"] / before["seconds"]["median"]
+        memory_ratio = record["peak_bytes"] / before["peak_bytes"] if before["peak_bytes"] else 1.0
+        rows.append({
+            "name": record["name"],
+            "variant": record["variant"],
+            "samples": record["samples"],
+            "seqids": record["seqids"],
+            "base_seconds": before["seconds"]["median"],
+            "new_seconds": record["seconds"]["median"],
+            "time_ratio": time_ratio,
+            "base_peak_bytes": before["peak_bytes"],
+            "new_peak_bytes": record["peak_bytes"],
+            "memory_ratio": memory_ratio,
+            "regression": time_ratio > threshold or memory_ratio > threshold,
+        })
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files.")
+    parser.add_argument("base", help="Results of the reference version.")
+    parser.add_argument("new", help="Results of the version to check.")
+    parser.add_argument("--threshold", type=float, default=1.1,
+                        help="Ratio new / base above which a time or peak memory is a regression (default: 1.1).")
+    args = parser.parse_args(argv)
+
+    with open(args.base) as base_file, open(args.new) as new_file:
+        base, new = json.load(base_file), json.load(new_file)
+    rows = compare(base, new, args.threshold)
+
+    print(f"{'benchmark':<52} {'base ms':>10} {'new ms':>10} {'time':>7} {'base MB':>9} {'new MB':>9} {'memory':>7}")
+    for row in rows:
+        label = f"{row['name']} [{row['variant']}] {row['samples']}x{row['seqids']}"
+        print(f"{label:<52} {row['base_seconds'] * 1000:>10.1f} {row['new_seconds'] * 1000:>10.1f} "
+              f"{row['time_ratio']:>6.2f}x {row['base_peak_bytes'] / 1024 ** 2:>9.1f} "
+              f"{row['new_peak_bytes'] / 1024 ** 2:>9.1f} {row['memory_ratio']:>6.2f}x"
+              f"{'  <- regression' if row['regression'] else ''}")
+
+    regressions = sum(row["regression"] for row in rows)
+    print(f"{len(rows)} benchmarks compared, {regressions} above {args.threshold:.2f}x", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,387 @@
+"""
+Time and measure the peak memory of the data loading and plotting functions
+on synthetic cohorts of growing size.
+
+For every cohort size (samples x SeqIds) a synthetic dataset is generated
+once (see synthetic.py) and kept in --data-dir. Each benchmark is timed over
+--repeat runs, then run once more under tracemalloc for its peak traced
+memory (Python and numpy allocations). Per-protein benchmarks (filter_data
+and the plots) run over --proteins proteins and also report the time per
+protein. The startup benchmarks time a fresh Python process importing the
+app, and rendering its home page on the cohort from a warm on-disk cache (a
+restarted server's first page). Results are written as JSON for compare.py.
+Every benchmark runs in a forked process, so one that fails or runs out of
+memory is recorded with its error instead of stopping the run.
+
+Examples:
+    python benchmarks/run_benchmarks.py --quick --out results/quick.json
+    python benchmarks/run_benchmarks.py --samples 13 500 2000 --seqids 7000 11000 --out results/full.json
+"""
+import argparse
+import datetime
+import gc
+import json
+import multiprocessing
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+# Run as a script from anywhere: the app's modules are imported flat, as in app/
+BENCHMARKS_PATH = Path(__file__).resolve().parent
+APP_PATH = BENCHMARKS_PATH.parent / "app"
+for path in (str(APP_PATH), str(BENCHMARKS_PATH)):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+import matplotlib
+matplotlib.use("Agg")
+import numpy as np
+import pandas as pd
+
+from datacache import load_dataset
+from dataloader import load_data, load_identifier_index, load_protein_store
+from plots.Correlation import filter_data, plot_correlation
+from plots.boxplot import draw_boxplot, plot_boxplot
+from plots.render import figure_to_png
+from plots.volcano import VolcanoData, build_volcano_figure, update_volcano_figure
+from synthetic import generate_dataset
+
+RESULTS_SCHEMA = 1
+DEFAULT_SAMPLES = [13, 500, 2000]
+DEFAULT_SEQIDS = [7000, 11000]
+# Long-format CSVs beyond this many rows take minutes and gigabytes to write and read
+DEFAULT_MAX_LONG_ROWS = 5_000_000
+DEFAULT_DATA_DIR = BENCHMARKS_PATH / ".cache"
+MAIN_PATH = APP_PATH / "main.py"
+# Run in a fresh interpreter by the startup benchmarks
+FIRST_RENDER_SCRIPT = f"""
+from streamlit.testing.v1 import AppTest
+app = AppTest.from_file({str(MAIN_PATH)!r}, default_timeout=600)
+app.run()
+assert not app.exception, app.exception
+"""
+
+
+def measure(function, repeat=3, calls=1):
+    """
+    Time function over repeat runs, then run it once under tracemalloc.
+
+    Parameters:
+    - function (callable): The work to measure, called without arguments.
+    - repeat (int): Timed runs.
+    - calls (int): Operations each run performs (e.g. proteins plotted), for the time per call.
+
+    Returns:
+    - dict: seconds (min, median, max of the runs), per_call_seconds (median / calls),
+      peak_bytes (peak traced memory of one run) and the run counts.
+    """
+    seconds = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        function()
+        seconds.append(time.perf_counter() - start)
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        function()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    median = statistics.median(seconds)
+    return {
+        "repeat": repeat,
+        "calls": calls,
+        "seconds": {"min": min(seconds), "median": median, "max": max(seconds)},
+        "per_call_seconds": median / calls,
+        "peak_bytes": peak,
+    }
+
+
+def _measure_child(connection, function, repeat, calls):
+    try:
+        connection.send(measure(function, repeat, calls))
+    except Exception as e:
+        connection.send({"error": f"{type(e).__name__}: {e}"})
+    finally:
+        connection.close()
+
+
+def measure_isolated(function, repeat=3, calls=1):
+    """
+    Run measure in a forked child process and return its result, or {"error": ...}.
+
+    A benchmark that exhausts memory then gets its process killed, and the
+    run records it and goes on. The child shares the data the benchmark
+    closes over copy-on-write. Without fork, measure runs in this process.
+    """
+    if "fork" not in multiprocessing.get_all_start_methods():
+        try:
+            return measure(function, repeat, calls)
+        except Exception as e:
+            return {"error": f"{type(e).__name__}: {e}"}
+
+    context = multiprocessing.get_context("fork")
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=_measure_child, args=(sender, function, repeat, calls))
+    process.start()
+    sender.close()
+    try:
+        result = receiver.recv()
+    except EOFError:
+        result = None
+    process.join()
+    if result is None:
+        return {"error": f"benchmark process ended with exit code {process.exitcode} (killed for lack of memory?)"}
+    return result
+
+
+def dataset_paths(data_dir, n_samples, n_seqids, seed, long_format):
+    """Return the paths of a synthetic dataset, generating it unless a complete copy is in data_dir."""
+    directory = Path(data_dir) / f"{n_samples}x{n_seqids}-seed{seed}{'' if long_format else '-adat'}"
+    marker = directory / "paths.json"
+    if marker.exists():
+        return json.loads(marker.read_text())
+    print(f"Generating {n_samples} samples x {n_seqids} SeqIds in {directory}", file=sys.stderr)
+    paths = generate_dataset(directory, n_samples, n_seqids, seed, long_format=long_format)
+    marker.write_text(json.dumps(paths))
+    return paths
+
+
+def run_python(code, environment=None):
+    """Run code in a fresh Python process in app/, raising RuntimeError with the end of its stderr if it fails."""
+    process = subprocess.run([sys.executable, "-c", code], cwd=APP_PATH, env=environment,
+                             capture_output=True, text=True)
+    if process.returncode != 0:
+        raise RuntimeError(f"exit code {process.returncode}: {process.stderr.strip()[-500:]}")
+
+
+def app_environment(paths, cache_dir):
+    """Environment of an app process serving the synthetic cohort of paths, through a manifest next to it."""
+    directory = Path(paths["metadata"]).parent
+    manifest = directory / "datasets.json"
+    if not manifest.exists():
+        manifest.write_text(json.dumps({"cohorts": [{
+            "id": "synthetic", "title": f"Synthetic ({directory.name})",
+            "metadata": Path(paths["metadata"]).name, "proteins": Path(paths["adat"]).name,
+            "contrasts": [{"id": "volcano", "title": "Synthetic", "table": Path(paths["volcano"]).name}],
+        }]}))
+    return {**os.environ, "SCLEROBASE_DATASETS": str(manifest), "SCLEROBASE_CACHE_DIR": str(cache_dir)}
+
+
+def _sample_proteins(store, n_proteins, seed):
+    # EntrezGeneSymbols of proteins spread over the store, the same ones for every run
+    symbols = store.index.values("EntrezGeneSymbol")
+    rng = np.random.default_rng(seed)
+    return [symbols[i] for i in sorted(rng.choice(len(symbols), min(n_proteins, len(symbols)), replace=False))]
+
+
+def benchmarks(paths, n_proteins, seed, long_rows, max_long_rows, cache_dir, only=None):
+    """
+    Yield (name, variant, function, calls, skipped) for every benchmark of one
+    dataset, or for those named in only.
+
+    The functions close over data loaded here, so the time of a benchmark only
+    covers the work it names.
+    """
+    def wanted(name):
+        return not only or name in only
+
+    metadata, store = load_protein_store(paths["metadata"], paths["adat"])
+    proteins = _sample_proteins(store, n_proteins, seed)
+    pairs = [store.filter_data("EntrezGeneSymbol", protein) for protein in proteins]
+    names = [final_data["TargetFullName"].iloc[0] for final_data, _ in pairs]
+    seq_ids = [final_data["SeqId"].iloc[0] for final_data, _ in pairs]
+    volcano = pd.read_csv(paths["volcano"])
+    long_skipped = None
+    if "long" not in paths:
+        long_skipped = "long-format data not generated"
+    elif long_rows > max_long_rows:
+        long_skipped = f"{long_rows} long-format rows > --max-long-rows {max_long_rows}"
+
+    if wanted("startup"):
+        yield "startup", "import main", lambda: run_python("import main"), 1, None
+        environment = app_environment(paths, cache_dir)
+        run_python(FIRST_RENDER_SCRIPT, environment)  # Builds the on-disk cache
+        yield "startup", "first render", lambda: run_python(FIRST_RENDER_SCRIPT, environment), 1, None
+
+    if wanted("load_data"):
+        yield "load_data", "adat", lambda: load_data(paths["metadata"], paths["adat"]), 1, None
+        yield "load_data", "long", lambda: load_data(paths["metadata"], paths["long"]), 1, long_skipped
+    if wanted("load_protein_store"):
+        yield "load_protein_store", "adat", lambda: load_protein_store(paths["metadata"], paths["adat"]), 1, None
+    if wanted("load_dataset"):
+        # The app's path: a warm on-disk cache, built by the first call
+        load_dataset(paths["metadata"], paths["adat"], paths["volcano"], cache_dir=cache_dir)
+        yield "load_dataset", "warm cache", lambda: load_dataset(
+            paths["metadata"], paths["adat"], paths["volcano"], cache_dir=cache_dir), 1, None
+
+    if wanted("filter_data"):
+        yield "filter_data", "store", lambda: [
+            filter_data(store, metadata, protein, "EntrezGeneSymbol") for protein in proteins], len(proteins), None
+        if long_skipped is None:
+            _, long_proteins = load_data(paths["metadata"], paths["long"])
+            yield "filter_data", "long", lambda: [
+                filter_data(long_proteins, metadata, protein, "EntrezGeneSymbol") for protein in proteins
+            ], len(proteins), None
+            del long_proteins
+        else:
+            yield "filter_data", "long", None, len(proteins), long_skipped
+
+    # Plots are encoded like the app's images, since drawing happens when the figure is saved
+    if wanted("plot_correlation"):
+        yield "plot_correlation", "png", lambda: [
+            figure_to_png(plot_correlation(final_data, metadata_info, name))
+            for (final_data, metadata_info), name in zip(pairs, names)], len(proteins), None
+    if wanted("plot_boxplot"):
+        yield "plot_boxplot", "png", lambda: [
+            figure_to_png(plot_boxplot(final_data, metadata_info, name))
+            for (final_data, metadata_info), name in zip(pairs, names)], len(proteins), None
+        yield "plot_boxplot", "precomputed summary", lambda: [
+            figure_to_png(draw_boxplot(*store.condition_summary.box_stats(seq_id), name))
+            for seq_id, name in zip(seq_ids, names)], len(proteins), None
+
+    # plot_volcano needs a Streamlit session; this is its work outside Streamlit:
+    # deriving the arrays, building and restyling the figure, and serializing it for the browser
+    def volcano_figure():
+        data = VolcanoData(volcano)
+        fig = build_volcano_figure(data, "Synthetic")
+        update_volcano_figure(fig, data, 0.6, 0.8, 10)
+        return fig.to_json()
+
+    if wanted("plot_volcano"):
+        yield "plot_volcano", "build and serialize", volcano_figure, 1, None
+        data = VolcanoData(volcano)
+        fig = build_volcano_figure(data, "Synthetic")
+        yield "plot_volcano", "restyle and serialize", lambda: update_volcano_figure(fig, data, 1.0, 0.5, 8).to_json(), 1, None
+
+    # getEntrezGeneSymbol reads the bundled volcano CSV; the same calls on the synthetic one
+    def symbols_cold():
+        load_identifier_index.cache_clear()
+        return [load_identifier_index(paths["volcano"]).symbol("EntrezGeneSymbol", protein) for protein in proteins]
+
+    if wanted("getEntrezGeneSymbol"):
+        yield "getEntrezGeneSymbol", "cold", symbols_cold, len(proteins), None
+        load_identifier_index(paths["volcano"])  # Built here, so forked benchmark processes inherit it
+        yield "getEntrezGeneSymbol", "warm", lambda: [
+            load_identifier_index(paths["volcano"]).symbol("EntrezGeneSymbol", protein) for protein in proteins
+        ], len(proteins), None
+
+
+def run_suite(samples, seqids, repeat=3, n_proteins=10, seed=0, data_dir=DEFAULT_DATA_DIR,
+              max_long_rows=DEFAULT_MAX_LONG_ROWS, only=None):
+    """
+    Run every benchmark on every cohort size and return the result records.
+
+    Parameters:
+    - samples, seqids (list of int): Cohort sizes; every combination is run.
+    - repeat (int): Timed runs of each benchmark.
+    - n_proteins (int): Proteins of the per-protein benchmarks.
+    - seed (int): Seed of the synthetic data and of the protein choice.
+    - data_dir (path): Where generated datasets are kept between runs.
+    - max_long_rows (int): Skip the long-format benchmarks above this many rows.
+    - only (list of str, optional): Names of the benchmarks to run.
+
+    Returns:
+    - list of dict: One record per benchmark and size, with measure's fields,
+      or "skipped"/"error" with the reason.
+    """
+    results = []
+    for n_samples in samples:
+        for n_seqids in seqids:
+            long_rows = n_samples * n_seqids
+            paths = dataset_paths(data_dir, n_samples, n_seqids, seed, long_format=long_rows <= max_long_rows)
+
+            with tempfile.TemporaryDirectory(prefix="benchmark-cache.") as cache_dir:
+                for name, variant, function, calls, skipped in benchmarks(
+                        paths, n_proteins, seed, long_rows, max_long_rows, cache_dir, only):
+                    record = {"name": name, "variant": variant, "samples": n_samples, "seqids": n_seqids}
+                    if skipped:
+                        record["skipped"] = skipped
+                    else:
+                        # A failure is recorded too: where the code stops scaling is a result
+                        record.update(measure_isolated(function, repeat, calls))
+                    results.append(record)
+                    print(format_record(record), file=sys.stderr)
+    return results
+
+
+def format_record(record):
+    """One line of a result record for the console."""
+    label = f"{record['name']} [{record['variant']}] {record['samples']}x{record['seqids']}"
+    if "skipped" in record:
+        return f"{label}: skipped ({record['skipped']})"
+    if "error" in record:
+        return f"{label}: failed ({record['error']})"
+    per_call = f", {record['per_call_seconds'] * 1000:.1f} ms/call" if record["calls"] > 1 else ""
+    return (f"{label}: {record['seconds']['median'] * 1000:.1f} ms median{per_call}, "
+            f"peak {record['peak_bytes'] / 1024 ** 2:.1f} MB")
+
+
+def environment():
+    """Versions and machine details stored with the results, to tell runs apart."""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=BENCHMARKS_PATH, capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    versions = {}
+    for module in ("numpy", "pandas", "matplotlib", "seaborn", "plotly"):
+        try:
+            versions[module] = __import__(module).__version__
+        except ImportError:
+            versions[module] = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "versions": versions,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark data loading and plotting on synthetic cohorts.")
+    parser.add_argument("--samples", type=int, nargs="+", default=DEFAULT_SAMPLES,
+                        help=f"Cohort sizes in samples (default: {DEFAULT_SAMPLES}).")
+    parser.add_argument("--seqids", type=int, nargs="+", default=DEFAULT_SEQIDS,
+                        help=f"Cohort sizes in SeqIds (default: {DEFAULT_SEQIDS}).")
+    parser.add_argument("--quick", action="store_true", help="Only the smallest cohort: 13 samples x 7000 SeqIds.")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs of each benchmark (default: 3).")
+    parser.add_argument("--proteins", type=int, default=10, help="Proteins of the per-protein benchmarks (default: 10).")
+    parser.add_argument("--only", nargs="+", help="Run only these benchmarks, e.g. load_data filter_data.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-long-rows", type=int, default=DEFAULT_MAX_LONG_ROWS,
+                        help=f"Skip long-format benchmarks above this many rows (default: {DEFAULT_MAX_LONG_ROWS}).")
+    parser.add_argument("--data-dir", default=str(DEFAULT_DATA_DIR), help="Where generated datasets are kept.")
+    parser.add_argument("--out", default="benchmark-results.json", help="JSON results file.")
+    args = parser.parse_args(argv)
+
+    samples, seqids = ([13], [7000]) if args.quick else (args.samples, args.seqids)
+    started = datetime.datetime.now(datetime.timezone.utc)
+    results = run_suite(samples, seqids, args.repeat, args.proteins, args.seed, args.data_dir,
+                        args.max_long_rows, args.only)
+
+    out = Path(args.out)
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps({
+        "schema": RESULTS_SCHEMA,
+        "started": started.isoformat(timespec="seconds"),
+        "environment": environment(),
+        "config": {"samples": samples, "seqids": seqids, "repeat": args.repeat,
+                   "proteins": args.proteins, "seed": args.seed},
+        "results": results,
+    }, indent=2))
+    print(f"{len(results)} results written to {out}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+"""
+Synthetic cohorts shaped like the app's data, at any size.
+
+synthetic_cohort draws a SomaScan-like cohort: log-normal intensities with a
+protein-specific level, a condition effect on a few proteins, some missing
+values, several SeqIds for some genes, non-human and control SeqIds, and
+Buffer/QC/Calibrator rows, as in the real ADAT. The write_* functions save it
+in the formats the app reads: the metadata CSV, the ADAT, the long-format
+protein CSV and the volcano (limma results) CSV.
+
+    python benchmarks/synthetic.py --samples 500 --seqids 7000 --out /tmp/synthetic
+"""
+import argparse
+from pathlib import Path
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+CONDITIONS = ["Healthy", "VEDOSS", "SSC_low", "SSC_high"]
+ROW_NAMES = [
+    "PlateId", "PlateRunDate", "ScannerID", "PlatePosition", "SampleId", "SampleType",
+    "PercentDilution", "SampleMatrix", "RowCheck", "NormScale_20", "HybControlNormScale",
+]
+COL_NAMES = [
+    "SeqId", "SeqIdVersion", "SomaId", "TargetFullName", "Target", "UniProt", "EntrezGeneID",
+    "EntrezGeneSymbol", "Organism", "Units", "Type", "Dilution", "PlateScale_Reference",
+]
+# Share of SeqIds measuring a gene already measured by another SeqId, of
+# non-human or control SeqIds, of control rows, and of missing intensities
+SHARED_GENE_RATE = 0.08
+CONTROL_SEQID_RATE = 0.03
+CONTROL_ROW_RATE = 0.05
+MISSING_RATE = 0.005
+# Share of proteins whose level differs between conditions
+DIFFERENTIAL_RATE = 0.05
+
+
+class SyntheticCohort(NamedTuple):
+    """A synthetic cohort: the ADAT's tables and the metadata of its samples."""
+    metadata: pd.DataFrame  # one row per sample
+    intensities: np.ndarray  # ADAT rows x SeqId, float32, NaN where missing
+    col_data: pd.DataFrame  # one row per SeqId, all strings
+    row_data: pd.DataFrame  # one row per ADAT row, all strings
+
+
+def synthetic_cohort(n_samples, n_seqids, seed=0):
+    """
+    Draw a cohort of n_samples samples measured on n_seqids SeqIds.
+
+    Parameters:
+    - n_samples (int): Samples with metadata; the ADAT has about 5% more rows of controls.
+    - n_seqids (int): SeqIds in the ADAT, including about 3% non-human or control ones.
+    - seed (int): Seed of the random generator; the same arguments give the same cohort.
+
+    Returns:
+    - SyntheticCohort
+    """
+    rng = np.random.default_rng(seed)
+
+    # Metadata: conditions in turn, so every condition has samples even for small cohorts
+    conditions = np.array(CONDITIONS)[np.arange(n_samples) % len(CONDITIONS)]
+    sample_ids = np.array([f"SYN-{i:05d}" for i in range(n_samples)], dtype=object)
+    severity = np.select([conditions == "SSC_low", conditions == "SSC_high"], [1, 2], 0)
+    mrss = np.where(severity > 0, rng.integers(1, 16, n_samples) + 15 * (severity - 1), 0)
+    metadata = pd.DataFrame({
+        "ExtIdentifier": [f"EXID{40000000000000 + i}" for i in range(n_samples)],
+        "SubjectID": sample_ids,
+        "age": rng.integers(25, 80, n_samples),
+        "gender": rng.choice(["Female", "Male"], n_samples, p=[0.8, 0.2]),
+        "Lung_Fibrosis": np.where(rng.random(n_samples) < 0.3 * severity, "Yes", "No"),
+        "Total_mRss": mrss,
+        "overall": np.where(conditions == "Healthy", "Healthy", "Scleroderma"),
+        "condition": conditions,
+    })
+
+    # SeqIds: some measure a gene of an earlier SeqId, a few are not human proteins
+    genes = np.arange(n_seqids)
+    shared = np.flatnonzero(rng.random(n_seqids) < SHARED_GENE_RATE)
+    shared = shared[shared > 0]
+    genes[shared] = rng.integers(0, shared)
+    organism = np.where(rng.random(n_seqids) < CONTROL_SEQID_RATE, "Mouse", "Human")
+    col_data = pd.DataFrame({
+        "SeqId": [f"{10000 + j}-{1 + j % 97}" for j in range(n_seqids)],
+        "SeqIdVersion": "3",
+        "SomaId": [f"SL{j:06d}" for j in range(n_seqids)],
+        "TargetFullName": [f"Synthetic protein {gene}" for gene in genes],
+        "Target": [f"SP{gene}" for gene in genes],
+        "UniProt": [f"Q{gene:05d}" for gene in genes],
+        "EntrezGeneID": [str(100000 + gene) for gene in genes],
+        "EntrezGeneSymbol": [f"SYN{gene}" for gene in genes],
+        "Organism": organism,
+        "Units": "RFU",
+        "Type": "Protein",
+        "Dilution": rng.choice(["0.005", "0.5", "20"], n_seqids),
+        "PlateScale_Reference": np.round(rng.lognormal(6, 1, n_seqids), 2).astype(str),
+    })
+
+    # ADAT rows: the samples, then Buffer, QC and Calibrator rows
+    n_controls = max(1, int(n_samples * CONTROL_ROW_RATE))
+    control_types = np.array(["Buffer", "QC", "Calibrator"])[np.arange(n_controls) % 3]
+    n_rows = n_samples + n_controls
+    row_data = pd.DataFrame({
+        "PlateId": [f"PLT{24684 + i // 88}" for i in range(n_rows)],
+        "PlateRunDate": "2023-08-13",
+        "ScannerID": "SG16064525",
+        "PlatePosition": [f"{'ABCDEFGH'[i % 8]}{1 + i // 8 % 11}" for i in range(n_rows)],
+        "SampleId": np.concatenate([sample_ids, [f"CTRL-{i:04d}" for i in range(n_controls)]]),
+        "SampleType": np.concatenate([np.full(n_samples, "Sample"), control_types]),
+        "PercentDilution": "40",
+        "SampleMatrix": "Plasma",
+        "RowCheck": "PASS",
+        "NormScale_20": np.round(rng.normal(1, 0.05, n_rows), 4).astype(str),
+        "HybControlNormScale": np.round(rng.normal(1, 0.1, n_rows), 4).astype(str),
+    })
+
+    # log intensity = protein level + condition effect on a few proteins + noise
+    level = rng.normal(7.5, 1.5, n_seqids)
+    effect = np.where(rng.random(n_seqids) < DIFFERENTIAL_RATE, rng.normal(0, 0.7, n_seqids), 0)
+    row_severity = np.concatenate([severity, np.zeros(n_controls, dtype=int)])
+    log_intensity = level + np.outer(row_severity, effect) + rng.normal(0, 0.4, (n_rows, n_seqids))
+    intensities = np.exp(log_intensity).astype(np.float32)
+    intensities[rng.random((n_rows, n_seqids)) < MISSING_RATE] = np.nan
+
+    return SyntheticCohort(metadata, intensities, col_data, row_data)
+
+
+def write_metadata(cohort, path):
+    """Write the metadata CSV, like somalogic_metadata.csv."""
+    cohort.metadata.to_csv(path, index=False)
+
+
+def write_adat(cohort, path):
+    """Write the cohort as a SomaLogic ADAT with its header, COL_DATA, ROW_DATA and table."""
+    row_names, n_row_fields = list(cohort.row_data.columns), len(cohort.row_data.columns)
+    col_names = list(cohort.col_data.columns)
+    with open(path, "w", encoding="utf-8") as adat:
+        adat.write("!Checksum\tsynthetic\n^HEADER\n!AssayVersion\tv4.1\n!Title\tsynthetic\n")
+        adat.write("^COL_DATA\n!Name\t" + "\t".join(col_names) + "\n!Type\t" + "\t".join(["String"] * len(col_names)) + "\n")
+        adat.write("^ROW_DATA\n!Name\t" + "\t".join(row_names) + "\n!Type\t" + "\t".join(["String"] * n_row_fields) + "\n")
+        adat.write("^TABLE_BEGIN\n")
+        for name in col_names:
+            adat.write("\t" * n_row_fields + name + "\t" + "\t".join(cohort.col_data[name]) + "\n")
+        adat.write("\t".join(row_names) + "\t" * (len(cohort.col_data) + 1) + "\n")
+
+        # Formatted row by row: the text of a 2,000 x 11,000 matrix would take gigabytes
+        for row, values in zip(cohort.row_data.to_numpy(dtype=str), cohort.intensities):
+            text = np.char.mod("%.1f", values)
+            text[np.isnan(values)] = ""
+            adat.write("\t".join(row) + "\t\t" + "\t".join(text) + "\n")
+
+
+def long_table(cohort):
+    """
+    The long-format protein table of the cohort (one row per sample and SeqId),
+    with the columns dataloader.adat_to_long produces.
+    """
+    samples = np.flatnonzero(cohort.row_data["SampleType"].to_numpy() == "Sample")
+    seqids = np.flatnonzero((cohort.col_data["Organism"] == "Human").to_numpy())
+    intensities = cohort.intensities[np.ix_(samples, seqids)]
+    n_samples, n_seqids = intensities.shape
+
+    mrss = cohort.metadata.set_index("SubjectID")["Total_mRss"]
+    sample_ids = cohort.row_data["SampleId"].to_numpy()[samples]
+    proteins = pd.DataFrame({
+        "SampleId": np.tile(sample_ids, n_seqids),
+        "SeqId": np.repeat(cohort.col_data["SeqId"].to_numpy()[seqids], n_samples),
+        "Intensity": intensities.T.ravel(),
+        "mrss": np.tile(mrss.reindex(sample_ids).to_numpy(), n_seqids),
+    })
+    for name in COL_NAMES[1:]:
+        proteins[name] = np.repeat(cohort.col_data[name].to_numpy()[seqids], n_samples)
+    return proteins.dropna(subset=["Intensity"]).reset_index(drop=True)
+
+
+def write_long(cohort, path):
+    """Write the long-format protein CSV that dataloader.load_data reads."""
+    long_table(cohort).to_csv(path, index=False, float_format="%.1f")
+
+
+def write_volcano(cohort, path, seed=0):
+    """Write a volcano CSV with the columns of the limma results table (SSC_all_Healthy_allproteins.csv)."""
+    rng = np.random.default_rng(seed)
+    annotations = cohort.col_data[cohort.col_data["Organism"] == "Human"].reset_index(drop=True)
+    n = len(annotations)
+    p_values = np.where(rng.random(n) < DIFFERENTIAL_RATE, 10 ** -rng.uniform(2, 8, n), rng.uniform(1e-3, 1, n))
+    order = np.argsort(p_values)
+    adjusted = np.empty(n)
+    adjusted[order] = np.minimum(1, np.minimum.accumulate((p_values[order] * n / np.arange(1, n + 1))[::-1])[::-1])
+    volcano = pd.DataFrame({
+        "Row.names": annotations["SeqId"],
+        "logFC": np.sign(rng.normal(size=n)) * rng.gamma(1.5, 0.25, n),
+        "AveExpr": rng.normal(8, 1.5, n),
+        "t": rng.normal(0, 2, n),
+        "P.Value": p_values,
+        "adj.P.Val": adjusted,
+        "B": rng.normal(-4, 1.5, n),
+    })
+    volcano = pd.concat([volcano, annotations], axis=1)
+    volcano.index = pd.RangeIndex(1, n + 1)
+    volcano.to_csv(path, index_label="")
+
+
+def generate_dataset(directory, n_samples, n_seqids, seed=0, long_format=True):
+    """
+    Write a synthetic cohort into directory, in every format the app reads.
+
+    Returns a dict of the paths: metadata, adat, long (unless long_format is False) and volcano.
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    cohort = synthetic_cohort(n_samples, n_seqids, seed)
+    paths = {
+        "metadata": directory / "metadata.csv",
+        "adat": directory / "proteins.adat",
+        "volcano": directory / "volcano.csv",
+    }
+    write_metadata(cohort, paths["metadata"])
+    write_adat(cohort, paths["adat"])
+    write_volcano(cohort, paths["volcano"], seed)
+    if long_format:
+        paths["long"] = directory / "proteins.csv"
+        write_long(cohort, paths["long"])
+    return {name: str(path) for name, path in paths.items()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write a synthetic cohort in the app's file formats.")
+    parser.add_argument("--samples", type=int, default=13)
+    parser.add_argument("--seqids", type=int, default=7000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-long", action="store_true", help="Skip the long-format CSV, which is large.")
+    parser.add_argument("--out", required=True, help="Output directory.")
+    args = parser.parse_args(argv)
+
+    paths = generate_dataset(args.out, args.samples, args.seqids, args.seed, long_format=not args.no_long)
+    for name, path in paths.items():
+        print(f"{name}: {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+import json
+import pytest
+import numpy as np
+import pandas as pd
+from protein_store import ProteinStore
+
+
+@pytest.fixture
+def cohort():
+    """Fixture for 8 subjects in four conditions and three proteins, as (metadata, values, annotations)."""
+    metadata = pd.DataFrame({
+        "SubjectID": [f"S{i}" for i in range(8)],
+        "condition": ["Healthy", "VEDOSS", "SSC_low", "SSC_high"] * 2,
+        "Total_mRss": [0, 0, 5, 20, 0, 2, 8, 30],
+    })
+    values = np.arange(1, 25, dtype=float).reshape(8, 3) * [1, 10, 100]
+    annotations = pd.DataFrame({
+        "SeqId": ["1-1", "2-1", "3-1"],
+        "EntrezGeneID": [101, 102, 103],
+        "EntrezGeneSymbol": ["GA", "GB", "GC"],
+        "TargetFullName": ["Protein A", "Protein B", "Protein C"],
+    })
+    return metadata, values, annotations
+
+
+@pytest.fixture
+def store(cohort):
+    """Fixture for a ProteinStore of the cohort fixture."""
+    metadata, values, annotations = cohort
+    return ProteinStore(values, metadata["SubjectID"], annotations, metadata, mrss=metadata["Total_mRss"])
+
+
+@pytest.fixture
+def cohort_files(tmp_path):
+    """Fixture writing the metadata, long-format protein and volcano CSVs of 4 subjects and two proteins, as {name: path}."""
+    metadata = pd.DataFrame({
+        "SubjectID": ["S1", "S2", "S3", "S4"],
+        "condition": ["Healthy", "Healthy", "SSC_high", "SSC_high"],
+        "Total_mRss": [0, 2, 20, 30],
+    })
+    proteins = pd.DataFrame({
+        "SampleId": ["S1", "S2", "S3", "S4"] * 2,
+        "SeqId": ["1-1"] * 4 + ["2-1"] * 4,
+        "Intensity": [10.0, 12.0, 20.0, 25.0, 5.0, 6.0, 5.5, 7.0],
+        "mrss": [0, 2, 20, 30] * 2,
+        "EntrezGeneID": ["101"] * 4 + ["102"] * 4,
+        "EntrezGeneSymbol": ["GA"] * 4 + ["GB"] * 4,
+        "TargetFullName": ["Protein A"] * 4 + ["Protein B"] * 4,
+        "Target": ["A"] * 4 + ["B"] * 4,
+    })
+    volcano = pd.DataFrame({"SeqId": ["1-1", "2-1"], "Target": ["A", "B"], "logFC": [1.0, 0.0], "P.Value": [0.01, 0.5]})
+
+    paths = {name: tmp_path / f"{name}.csv" for name in ["metadata", "proteins", "volcano"]}
+    metadata.to_csv(paths["metadata"], index=False)
+    proteins.to_csv(paths["proteins"], index=False)
+    volcano.to_csv(paths["volcano"], index=False)
+    return {name: str(path) for name, path in paths.items()}
+
+
+@pytest.fixture
+def write_manifest(tmp_path):
+    """Fixture function writing a datasets.json of the given cohort entries next to the cohort files, returning its path."""
+    def write(cohorts):
+        path = tmp_path / "datasets.json"
+        path.write_text(json.dumps({"cohorts": cohorts}))
+        return path
+    return write
@@ -0,0 +1,123 @@
+import pytest
+import numpy as np
+import pandas as pd
+from dataloader import read_adat, adat_to_long, load_data
+
+
+"""Unit tests for the ADAT reader in dataloader.py:
+ read_adat()
+ adat_to_long()
+ load_data() with an .adat proteins path
+ """
+ROW_NAMES = ["PlateId", "PlateRunDate", "SampleId", "SampleType", "HybControlNormScale"]
+COL_ROWS = {
+    "SeqId": ["1-1", "2-2", "3-3"],
+    "TargetFullName": ["Protein A", "Protein B", "Mouse C"],
+    "Target": ["A", "B", "C"],
+    "EntrezGeneID": ["101", "102|103", "104"],
+    "EntrezGeneSymbol": ["GA", "GB", "GC"],
+    "Organism": ["Human", "Human", "Mouse"],
+    "Type": ["Protein", "Protein", "Protein"],
+    "Dilution": ["20", "0.5", "20"],
+}
+SAMPLE_ROWS = [
+    (["P1", "2023-08-13", "S1", "Sample", "0.9"], ["10.5", "20", "30"]),
+    (["P1", "2023-08-13", "B1", "Buffer", "1.1"], ["1", "2", "3"]),
+    (["P1", "2023-08-13", "S2", "Sample", "1.0"], ["11.5", "", "31"]),
+]
+
+
+@pytest.fixture
+def adat_file(tmp_path):
+    """Fixture writing a minimal ADAT file with one buffer row and one mouse SeqId."""
+    n_row = len(ROW_NAMES)
+    lines = [
+        "!Checksum\tabc",
+        "^HEADER",
+        "!AssayVersion\tv4.1",
+        "^COL_DATA",
+        "!Name\t" + "\t".join(COL_ROWS),
+        "!Type\t" + "\t".join("String" for _ in COL_ROWS),
+        "^ROW_DATA",
+        "!Name\t" + "\t".join(ROW_NAMES),
+        "!Type\t" + "\t".join("String" for _ in ROW_NAMES),
+        "^TABLE_BEGIN",
+    ]
+    for label, values in COL_ROWS.items():
+        lines.append("\t" * n_row + label + "\t" + "\t".join(values))
+    lines.append("\t".join(ROW_NAMES) + "\t" * (len(COL_ROWS["SeqId"]) + 1))
+    for row, values in SAMPLE_ROWS:
+        lines.append("\t".join(row) + "\t\t" + "\t".join(values))
+
+    path = tmp_path / "test.adat"
+    path.write_text("\n".join(lines) + "\n")
+    return str(path)
+
+
+@pytest.fixture
+def metadata():
+    """Fixture for metadata covering one of the two samples."""
+    return pd.DataFrame({"SubjectID": ["S1"], "Total_mRss": [12], "condition": ["SSC_low"]})
+
+
+def test_read_adat_filters_samples_and_proteins(adat_file):
+    """Test that buffer rows and non-human SeqIds are dropped."""
+    adat = read_adat(adat_file)
+
+    assert adat.header["AssayVersion"] == "v4.1"
+    assert adat.header["Checksum"] == "abc"
+    assert list(adat.intensities.index) == ["S1", "S2"]
+    assert list(adat.intensities.columns) == ["1-1", "2-2"]
+    assert adat.intensities.dtypes.eq(np.float32).all()
+    assert adat.intensities.loc["S1", "1-1"] == pytest.approx(10.5)
+    assert np.isnan(adat.intensities.loc["S2", "2-2"])
+
+
+def test_read_adat_without_filters(adat_file):
+    """Test that all rows and SeqIds are kept when filtering is disabled."""
+    adat = read_adat(adat_file, keep_only_samples=False, human_proteins_only=False)
+
+    assert adat.intensities.shape == (3, 3)
+    assert list(adat.row_data["SampleType"]) == ["Sample", "Buffer", "Sample"]
+
+
+@pytest.mark.parametrize("keep_only_samples", [True, False])
+def test_read_adat_blank_lines(adat_file, keep_only_samples):
+    """Test that blank lines in the table, e.g. trailing ones, are skipped rather than read as samples."""
+    with open(adat_file, "a") as adat:
+        adat.write("\n\n")
+    adat = read_adat(adat_file, keep_only_samples=keep_only_samples)
+
+    assert len(adat.row_data) == len(adat.intensities) == (2 if keep_only_samples else 3)
+    assert adat.row_data["SampleId"].notna().all()
+
+
+def test_read_adat_annotation_types(adat_file):
+    """Test that numeric and date annotations are typed and EntrezGeneID stays a string."""
+    adat = read_adat(adat_file)
+
+    assert adat.col_data["Dilution"].tolist() == [20.0, 0.5]
+    assert adat.col_data["EntrezGeneID"].tolist() == ["101", "102|103"]
+    assert pd.api.types.is_datetime64_any_dtype(adat.row_data["PlateRunDate"])
+    assert adat.row_data["HybControlNormScale"].tolist() == [0.9, 1.0]
+
+
+def test_adat_to_long(adat_file, metadata):
+    """Test that the long table only keeps cohort samples and carries mrss and annotations."""
+    proteins = adat_to_long(read_adat(adat_file), metadata)
+
+    assert list(proteins["SampleId"]) == ["S1", "S1"]
+    assert list(proteins["SeqId"]) == ["1-1", "2-2"]
+    assert list(proteins["mrss"]) == [12, 12]
+    assert list(proteins["EntrezGeneSymbol"]) == ["GA", "GB"]
+
+
+def test_load_data_reads_adat(adat_file, metadata, tmp_path):
+    """Test that load_data accepts an .adat proteins path."""
+    metadata_path = tmp_path / "metadata.csv"
+    metadata.to_csv(metadata_path, index=False)
+
+    loaded_metadata, proteins = load_data(str(metadata_path), adat_file)
+
+    assert list(loaded_metadata["SubjectID"]) == ["S1"]
+    assert {"SampleId", "SeqId", "Intensity", "mrss"}.issubset(proteins.columns)
@@ -0,0 +1,150 @@
+import gzip
+import http.client
+import io
+import json
+import threading
+import urllib.request
+
+import pytest
+import numpy as np
+import pandas as pd
+from api import ARROW_TYPE, ProteinApi, make_server
+from protein_store import ProteinStore
+
+
+@pytest.fixture
+def api(cohort):
+    """Fixture for an API over the cohort fixture, with two smoking levels and a missing intensity."""
+    metadata, values, annotations = cohort
+    metadata = metadata.assign(smoker=["Yes", "No"] * 4)
+    values = values.copy()
+    values[7, 0] = np.nan
+    store = ProteinStore(values, metadata["SubjectID"], annotations, metadata, mrss=metadata["Total_mRss"], version="v1")
+    volcano = pd.DataFrame({"SeqId": ["1-1", "2-1", "3-1"], "logFC": [1.5, -0.2, np.nan], "P.Value": [0.01, 0.5, 0.001]})
+    return ProteinApi(metadata, store, volcano)
+
+
+def _json(response):
+    status, headers, body = response
+    assert headers["Content-Type"] == "application/json"
+    return status, json.loads(body)
+
+
+def test_resolve(api):
+    """Test ranked matches across reference types and exact lookups of one type."""
+    status, payload = _json(api.get("/api/v1/resolve?q=ga", {}))
+    assert status == 200
+    assert payload["matches"][0]["value"] == "GA"
+    assert payload["matches"][0]["best_seq_id"] == "1-1"
+
+    _, payload = _json(api.get("/api/v1/resolve?q=102&id_type=EntrezGeneID", {}))
+    assert payload["matches"][0]["seq_ids"] == ["2-1"]
+    assert payload["matches"][0]["symbol"] == "GB"
+
+    assert api.get("/api/v1/resolve?q=NOPE&id_type=EntrezGeneSymbol", {})[0] == 404
+    assert api.get("/api/v1/resolve?q=GA&id_type=Gene", {})[0] == 400
+
+
+def test_protein_table(api):
+    """Test that a protein's measured samples come with their metadata, by SeqId or by identifier."""
+    status, payload = _json(api.get("/api/v1/proteins/GA?id_type=EntrezGeneSymbol", {}))
+    assert status == 200
+    assert payload["seq_id"] == "1-1"
+    assert payload["annotations"]["TargetFullName"] == "Protein A"
+
+    table = pd.DataFrame(payload["table"]["data"], columns=payload["table"]["columns"])
+    assert len(table) == 7
+    assert table["Intensity"].tolist() == [1, 4, 7, 10, 13, 16, 19]
+    assert table["condition"].tolist()[:4] == ["Healthy", "VEDOSS", "SSC_low", "SSC_high"]
+
+    assert api.get("/api/v1/proteins/1-1", {})[2] != b""
+    assert api.get("/api/v1/proteins/GA", {})[0] == 404
+
+
+def test_volcano_contrast(api):
+    """Test the published table, with NaN as null, and a contrast computed from the query."""
+    _, payload = _json(api.get("/api/v1/volcano", {}))
+    assert payload["table"]["data"][2][1] is None
+
+    status, payload = _json(api.get("/api/v1/volcano?column=smoker&case=Yes&control=No", {}))
+    assert status == 200
+    assert payload["contrast"] == "smoker: Yes vs No"
+    assert "adj.P.Val" in payload["table"]["columns"]
+
+    assert api.get("/api/v1/volcano?column=smoker&case=Yes", {})[0] == 400
+    assert api.get("/api/v1/volcano?column=smoker&case=Maybe&control=No", {})[0] == 400
+
+
+def test_conditional_requests(api):
+    """Test that a client's ETag is answered with 304 and an empty body, and differs by encoding and version."""
+    status, headers, body = api.get("/api/v1/volcano", {})
+    assert status == 200
+    status, not_modified, body = api.get("/api/v1/volcano", {"If-None-Match": f'W/{headers["ETag"]}'})
+    assert status == 304
+    assert body == b""
+    assert not_modified["ETag"] == headers["ETag"]
+
+    assert api.get("/api/v1/volcano", {"Accept-Encoding": "gzip"})[1]["ETag"] != headers["ETag"]
+    api.version = "v2"
+    assert api.get("/api/v1/volcano", {"If-None-Match": headers["ETag"]})[0] == 200
+
+
+def test_encodings(api):
+    """Test gzip and Arrow bodies decode to the JSON table's contents."""
+    pa = pytest.importorskip("pyarrow")
+
+    _, headers, body = api.get("/api/v1/proteins/2-1", {"Accept-Encoding": "gzip, deflate"})
+    assert headers["Content-Encoding"] == "gzip"
+    assert json.loads(gzip.decompress(body))["seq_id"] == "2-1"
+
+    _, headers, body = api.get("/api/v1/proteins/2-1?format=arrow", {})
+    assert headers["Content-Type"] == ARROW_TYPE
+    table = pa.ipc.open_stream(io.BytesIO(body)).read_all()
+    assert table.column("Intensity").to_pylist() == [20, 50, 80, 110, 140, 170, 200, 230]
+    assert json.loads(table.schema.metadata[b"seq_id"]) == "2-1"
+
+
+def test_plots(api):
+    """Test that plots are PNG images, and a SeqId without data is not found."""
+    status, headers, body = api.get("/api/v1/plots/GC/boxplot.png?id_type=EntrezGeneSymbol", {})
+    assert status == 200
+    assert headers["Content-Type"] == "image/png"
+    assert body.startswith(b"\x89PNG")
+    assert api.get("/api/v1/plots/9-9/correlation.png", {})[0] == 404
+    assert api.get("/api/v1/plots/1-1/violin.png", {})[0] == 404
+
+
+def test_server(api):
+    """Test a request through the HTTP server."""
+    server = make_server(api, port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{server.server_port}/api/v1") as response:
+            assert response.headers["X-Dataset-Version"] == "v1"
+            assert json.load(response)["seq_ids"] == 3
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_server_error(api, monkeypatch):
+    """Test that an unexpected error is answered with a 500 JSON error, keeping the connection usable."""
+    def fail(path, query, table_format):
+        raise KeyError("logFC")
+    monkeypatch.setattr(api, "_route", fail)
+    server = make_server(api, port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        connection = http.client.HTTPConnection("127.0.0.1", server.server_port)
+        for _ in range(2):
+            connection.request("GET", "/api/v1/volcano")
+            response = connection.getresponse()
+            assert response.status == 500
+            assert response.headers["Cache-Control"] == "no-store"
+            assert json.loads(response.read()) == {"error": "Internal server error."}
+        connection.close()
+    finally:
+        server.shutdown()
+        server.server_close()
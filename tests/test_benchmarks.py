@@ -0,0 +1,66 @@
+import pandas as pd
+import pytest
+from benchmarks.compare import compare
+from benchmarks.run_benchmarks import measure, run_suite
+from benchmarks.synthetic import generate_dataset, synthetic_cohort
+from dataloader import load_data, load_protein_store, read_adat
+
+
+@pytest.fixture(scope="module")
+def dataset(tmp_path_factory):
+    """Fixture writing a synthetic cohort of 20 samples and 300 SeqIds in every format."""
+    return generate_dataset(tmp_path_factory.mktemp("synthetic"), 20, 300, seed=1)
+
+
+def test_synthetic_cohort_is_reproducible():
+    """Test that a seed gives the same cohort, with every condition and some genes on several SeqIds."""
+    cohort = synthetic_cohort(13, 500, seed=3)
+    again = synthetic_cohort(13, 500, seed=3)
+
+    assert (cohort.metadata["condition"].value_counts() > 0).sum() == 4
+    pd.testing.assert_frame_equal(cohort.col_data, again.col_data)
+    assert cohort.col_data["EntrezGeneSymbol"].duplicated().any()
+    assert cohort.intensities.shape == (len(cohort.row_data), 500)
+
+
+def test_formats_load_alike(dataset):
+    """Test that the ADAT and long-format files load into the same store, without controls."""
+    adat = read_adat(dataset["adat"])
+    _, from_adat = load_protein_store(dataset["metadata"], dataset["adat"])
+    _, from_long = load_protein_store(dataset["metadata"], dataset["long"])
+
+    assert set(adat.row_data["SampleType"]) == {"Sample"}
+    assert set(adat.col_data["Organism"]) == {"Human"}
+    assert from_adat.shape == from_long.shape == (20, len(adat.col_data))
+    assert list(from_adat.seq_ids) == list(from_long.seq_ids)
+    assert from_long.values[1, 5] == pytest.approx(from_adat.values[1, 5], rel=0.01)
+
+    metadata, proteins = load_data(dataset["metadata"], dataset["long"])
+    assert set(proteins["SampleId"]) <= set(metadata["SubjectID"])
+    assert (pd.read_csv(dataset["volcano"])["P.Value"] > 0).all()
+
+
+def test_measure():
+    """Test the time and peak memory of a call that allocates a megabyte."""
+    result = measure(lambda: bytearray(1024 ** 2), repeat=2, calls=4)
+
+    assert result["repeat"] == 2
+    assert result["per_call_seconds"] == pytest.approx(result["seconds"]["median"] / 4)
+    assert result["peak_bytes"] >= 1024 ** 2
+
+
+def test_run_suite_and_compare(tmp_path):
+    """Test that the suite records its benchmarks and that compare flags a slower run."""
+    results = run_suite([13], [200], repeat=1, n_proteins=2, data_dir=tmp_path,
+                        only=["filter_data", "getEntrezGeneSymbol"])
+
+    assert {(record["name"], record["variant"]) for record in results} == {
+        ("filter_data", "store"), ("filter_data", "long"),
+        ("getEntrezGeneSymbol", "cold"), ("getEntrezGeneSymbol", "warm"),
+    }
+    assert all(record["calls"] == 2 and record["peak_bytes"] >= 0 for record in results)
+
+    slower = [{**record, "seconds": {"median": record["seconds"]["median"] * 2}} for record in results]
+    rows = compare({"results": results}, {"results": slower}, threshold=1.5)
+    assert len(rows) == 4
+    assert all(row["regression"] and row["time_ratio"] == pytest.approx(2) for row in rows)
@@ -0,0 +1,38 @@
+import pytest
+import numpy as np
+from plots.comparison import comparison_data, plot_comparison_boxplot, plot_comparison_correlation
+
+
+def _selected(*symbols):
+    return [{"protein_id": symbol, "selected_id_type": "EntrezGeneSymbol"} for symbol in symbols]
+
+
+def test_comparison_data(store):
+    """Test that the selected proteins are resolved and sliced together, skipping unknown ones."""
+    seq_ids, labels, values = comparison_data(store, _selected("GC", "GZ", "GA"))
+
+    assert seq_ids == ["3-1", "1-1"]
+    assert labels == ["GC", "GA"]
+    np.testing.assert_array_equal(values, store.values[:, [2, 0]])
+
+
+def test_zscore(store):
+    """Test that z-scoring gives each protein mean 0 and SD 1."""
+    _, _, values = comparison_data(store, _selected("GA", "GB", "GC"), zscore=True)
+
+    np.testing.assert_allclose(values.mean(axis=0), 0, atol=1e-12)
+    np.testing.assert_allclose(values.std(axis=0, ddof=1), 1)
+
+
+@pytest.mark.parametrize("zscore", [False, True])
+def test_small_multiples(store, zscore):
+    """Test that there is one panel per protein in both comparison plots."""
+    seq_ids, labels, values = comparison_data(store, _selected("GA", "GB", "GC"), zscore=zscore)
+
+    correlation = plot_comparison_correlation(store, labels, values, zscore=zscore)
+    assert [ax.get_title() for ax in correlation.axes if ax.get_visible()] == ["GA", "GB", "GC"]
+
+    boxplot = plot_comparison_boxplot(store, seq_ids, labels, values, zscore=zscore)
+    visible = [ax for ax in boxplot.axes if ax.get_visible()]
+    assert len(visible) == 3
+    assert [label.get_text() for label in visible[0].get_xticklabels()] == ["Healthy", "VEDOSS", "SSC_low", "SSC_high"]
@@ -2,7 +2,9 @@ import pytest
 import pandas as pd
 from pandas.errors import ParserError
 from unittest.mock import patch
-from dataloader import load_data
+from dataloader import load_data, read_long_table
+from plots.Correlation import filter_data
+from protein_store import ProteinStore
 
 
 """Unit test for the dataloader.py file. Four functions are tested:
@@ -76,3 +78,37 @@ def test_load_data_empty_files():
 
         assert metadata.empty
         assert proteins.empty
+
+@pytest.fixture
+def long_table_file(tmp_path):
+    """Fixture writing a long-format protein CSV with quoted numbers and numeric-looking identifiers."""
+    path = tmp_path / "proteins_plot.csv"
+    path.write_text(
+        '"SampleId","SeqId","Intensity","mrss","EntrezGeneID","EntrezGeneSymbol","PlateScale_Reference","Lab"\n'
+        '"S1","1-1",10.5,0,"101","GA","1.25","north"\n'
+        '"S2","1-1",20,12,"101","GA","1.25","north"\n'
+        '"S1","2-1",5,0,"102|103","GB|GC","0.5","south"\n'
+        '"S2","2-1",,12,"102|103","GB|GC","0.5","south"\n'
+    )
+    return path
+
+def test_read_long_table(long_table_file):
+    """Test that the long table gets the schema's dtypes, with identifiers as text and quoted numbers parsed."""
+    proteins = read_long_table(long_table_file)
+
+    assert proteins["Intensity"].dtype == "float32" and proteins["PlateScale_Reference"].dtype == "float32"
+    assert proteins["PlateScale_Reference"].tolist() == [1.25, 1.25, 0.5, 0.5]
+    assert proteins["Intensity"].isna().tolist() == [False, False, False, True]
+    for name in ["SampleId", "SeqId", "EntrezGeneID", "EntrezGeneSymbol", "Lab"]:
+        assert proteins[name].dtype == "category"
+    assert list(proteins["EntrezGeneID"].cat.categories) == ["101", "102|103"]
+
+    metadata = pd.DataFrame({"SubjectID": ["S1", "S2"], "condition": ["Healthy", "SSC_high"], "Total_mRss": [0, 12]})
+    final_data, metadata_info = filter_data(proteins, metadata, 101, "EntrezGeneID")
+    assert final_data["Intensity"].tolist() == [10.5, 20.0]
+    assert len(metadata_info) == 2
+
+    store = ProteinStore.from_long(proteins, metadata)
+    assert list(store.sample_ids) == ["S1", "S2"]
+    assert store.annotations["EntrezGeneSymbol"].tolist() == ["GA", "GB|GC"]
+    assert store.best_seqid("EntrezGeneID", 101) == "1-1"
@@ -0,0 +1,49 @@
+import os
+import numpy as np
+import pandas as pd
+from datacache import load_dataset
+
+
+def _load(cohort_files, cache_dir):
+    return load_dataset(cohort_files["metadata"], cohort_files["proteins"], cohort_files["volcano"], cache_dir=cache_dir)
+
+
+def test_cache_round_trip(cohort_files, tmp_path):
+    """Test that a cached load returns the same data as the first, parsing load."""
+    cache_dir = tmp_path / "cache"
+    metadata, store, volcano = _load(cohort_files, cache_dir)
+    cached_metadata, cached_store, cached_volcano = _load(cohort_files, cache_dir)
+
+    assert (cache_dir / store.version / "intensities.npy").exists()
+    assert cached_store.version == store.version
+    pd.testing.assert_frame_equal(cached_metadata, metadata)
+    pd.testing.assert_frame_equal(cached_volcano, volcano)
+    np.testing.assert_array_equal(cached_store.values, store.values)
+    pd.testing.assert_frame_equal(cached_store.best_seqids, store.best_seqids)
+    assert cached_store.index.seqids("EntrezGeneID", 101) == ["1-1"]
+    assert cached_store.index.symbol("Target", "B") == "GB"
+
+
+def test_cache_rebuilds_when_source_changes(cohort_files, tmp_path):
+    """Test that editing a source file gives a new version with the new data."""
+    cache_dir = tmp_path / "cache"
+    _, store, _ = _load(cohort_files, cache_dir)
+
+    volcano = pd.read_csv(cohort_files["volcano"])
+    volcano.loc[0, "logFC"] = 3.0
+    volcano.to_csv(cohort_files["volcano"], index=False)
+
+    _, new_store, new_volcano = _load(cohort_files, cache_dir)
+    assert new_store.version != store.version
+    assert new_volcano.loc[0, "logFC"] == 3.0
+    assert not (cache_dir / store.version).exists()
+
+
+def test_cache_survives_touch(cohort_files, tmp_path):
+    """Test that a new mtime with unchanged content keeps the cached version."""
+    cache_dir = tmp_path / "cache"
+    _, store, _ = _load(cohort_files, cache_dir)
+
+    os.utime(cohort_files["metadata"], ns=(0, 0))
+    _, touched_store, _ = _load(cohort_files, cache_dir)
+    assert touched_store.version == store.version
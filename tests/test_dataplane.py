@@ -0,0 +1,51 @@
+import pytest
+import numpy as np
+import pandas as pd
+from dataplane import column_memory, format_bytes, freeze, nbytes, session_bytes, shared_objects
+
+
+def test_freeze(store):
+    """Test that the store's arrays become read-only and it still serves plots."""
+    freeze(store)
+
+    with pytest.raises(ValueError):
+        store.values[0, 0] = 0
+    assert not store.condition_summary.stats["median"].flags.writeable
+
+    final_data, metadata_info = store.filter_data("EntrezGeneSymbol", "GB")
+    final_data["Intensity"] *= 2
+    assert store.values[0, 1] == 20
+    assert store.annotations.memory_usage(deep=True).sum() > 0
+
+
+def test_shared_objects_are_not_counted(store):
+    """Test that a session holding a handle to shared data costs only the handle."""
+    copy = {"frame": store.protein_frame("1-1")[0]}
+    handle = {"store": store, "seq_id": "1-1"}
+    exclude = shared_objects(store)
+
+    assert nbytes(store) > store.values.nbytes
+    assert nbytes(handle, exclude) < 1000
+    assert nbytes(copy, exclude) > nbytes(handle, exclude)
+
+    sizes = session_bytes({"handle": handle, "copy": copy}, exclude)
+    assert list(sizes) == ["copy", "handle"]
+
+
+def test_column_memory():
+    """Test that columns are reported largest first, counting the strings of object columns."""
+    frame = pd.DataFrame({"Intensity": np.ones(1000, dtype=np.float32), "Target": ["A long target name"] * 1000})
+    frame["Encoded"] = frame["Target"].astype("category")
+
+    report = column_memory(frame)
+    assert list(report.index) == ["Target", "Intensity", "Encoded"]
+    assert report.loc["Intensity", "bytes"] == 4000
+    assert report.loc["Encoded", "dtype"] == "category"
+    assert report["share"].sum() == pytest.approx(1)
+
+
+def test_format_bytes():
+    """Test the units of a byte count."""
+    assert format_bytes(512) == "512 B"
+    assert format_bytes(2048) == "2.0 KB"
+    assert format_bytes(5 * 1024 ** 3) == "5.0 GB"
@@ -0,0 +1,103 @@
+import pytest
+import numpy as np
+import pandas as pd
+from scipy import special, stats
+from protein_store import ProteinStore
+from differential import (
+    Contrast, benjamini_hochberg, contrast_columns, differential_expression, fit_f_dist, moderated_t,
+    trigamma_inverse,
+)
+
+
+@pytest.fixture
+def store():
+    """Fixture for a store of 12 samples in three groups, with 200 proteins of which the first 10 differ."""
+    rng = np.random.default_rng(1)
+    groups = ["Healthy"] * 4 + ["SSC_low"] * 4 + ["SSC_high"] * 4
+    metadata = pd.DataFrame({
+        "SubjectID": [f"S{i}" for i in range(12)],
+        "condition": groups,
+        "Lung_Fibrosis": ["No", "Yes"] * 6,
+        "Total_mRss": rng.integers(0, 40, 12),
+    })
+    log2_values = rng.normal(10, 0.3, size=(12, 200)) * rng.uniform(0.5, 2, 200) ** 0.1
+    log2_values[8:, :10] += 2
+    annotations = pd.DataFrame({
+        "SeqId": [f"{j}-1" for j in range(200)],
+        "Target": [f"P{j}" for j in range(200)],
+        "EntrezGeneSymbol": [f"G{j}" for j in range(200)],
+    })
+    return ProteinStore(2 ** log2_values, metadata["SubjectID"], annotations, metadata)
+
+
+def test_group_means(store):
+    """Test logFC and AveExpr against a direct per-protein fit, and that the shifted proteins are found."""
+    results = differential_expression(store, Contrast("condition", "SSC_high", "Healthy"))
+    y = np.log2(store.values.astype(np.float64))
+    groups = store.metadata["condition"].to_numpy()
+
+    expected_fc = y[groups == "SSC_high"].mean(axis=0) - y[groups == "Healthy"].mean(axis=0)
+    np.testing.assert_allclose(results["logFC"], expected_fc, atol=1e-6)
+    np.testing.assert_allclose(results["AveExpr"], y.mean(axis=0), atol=1e-6)
+    assert list(results["SeqId"]) == list(store.seq_ids)
+    assert {"logFC", "AveExpr", "t", "P.Value", "adj.P.Val", "B", "Target"} <= set(results.columns)
+
+    # The 10 shifted proteins come out on top
+    assert set(results.nsmallest(10, "P.Value")["SeqId"]) == {f"{j}-1" for j in range(10)}
+    assert (results.loc[:9, "B"] > 0).all()
+
+
+def test_moderated_t_formula():
+    """Test the moderated t and p-values against limma's formulas, using fit_f_dist's prior."""
+    rng = np.random.default_rng(2)
+    coef = rng.normal(size=500)
+    s2 = 0.1 * rng.chisquare(6, 500) / 6 * rng.uniform(0.5, 2, 500)
+    df = np.full(500, 6.0)
+    stdev_unscaled = np.full(500, np.sqrt(1 / 4 + 1 / 4))
+
+    s2_prior, df_prior = fit_f_dist(s2, df)
+    expected_t = coef / stdev_unscaled / np.sqrt((df_prior * s2_prior + df * s2) / (df_prior + df))
+    results = moderated_t(coef, stdev_unscaled, s2, df)
+    np.testing.assert_allclose(results["t"], expected_t)
+    np.testing.assert_allclose(results["P.Value"], 2 * stats.t.sf(np.abs(expected_t), df + df_prior))
+
+
+def test_fit_f_dist_recovers_prior():
+    """Test that variances drawn from a scaled F distribution give back its parameters."""
+    rng = np.random.default_rng(3)
+    df, df_prior, s2_prior = 4.0, 10.0, 0.05
+    sigma2 = s2_prior * df_prior / rng.chisquare(df_prior, 20000)
+    s2 = sigma2 * rng.chisquare(df, 20000) / df
+
+    estimated_s2, estimated_df = fit_f_dist(s2, np.full(20000, df))
+    assert estimated_s2 == pytest.approx(s2_prior, rel=0.05)
+    assert estimated_df == pytest.approx(df_prior, rel=0.25)
+
+
+def test_trigamma_inverse():
+    """Test that trigamma_inverse inverts scipy's trigamma."""
+    y = np.array([0.01, 0.5, 3.0, 200.0])
+    np.testing.assert_allclose(trigamma_inverse(special.polygamma(1, y)), y, rtol=1e-6)
+
+
+def test_benjamini_hochberg():
+    """Test BH adjustment against scipy, with NaN p-values left out."""
+    p_values = np.array([0.01, 0.04, np.nan, 0.03, 0.5])
+    adjusted = benjamini_hochberg(p_values)
+    assert np.isnan(adjusted[2])
+    np.testing.assert_allclose(adjusted[~np.isnan(p_values)],
+                               stats.false_discovery_control(p_values[~np.isnan(p_values)]))
+
+
+def test_contrast_columns(store):
+    """Test that grouping columns are offered and identifier or continuous columns are not."""
+    columns = contrast_columns(store.metadata)
+    assert columns["condition"] == ["Healthy", "SSC_high", "SSC_low"]
+    assert columns["Lung_Fibrosis"] == ["No", "Yes"]
+    assert "SubjectID" not in columns and "Total_mRss" not in columns
+
+
+def test_unknown_contrast(store):
+    """Test that a level without samples raises a ValueError."""
+    with pytest.raises(ValueError, match="No samples found"):
+        differential_expression(store, Contrast("condition", "VEDOSS", "Healthy"))
@@ -0,0 +1,54 @@
+import pytest
+import pandas as pd
+from identifiers import IdentifierIndex, normalize_identifier
+
+
+@pytest.fixture
+def annotations():
+    """Fixture for per-SeqId annotations with two aptamers for GA and a composite gene ID."""
+    return pd.DataFrame({
+        "SeqId": ["1-1", "1-2", "2-1", "3-1"],
+        "EntrezGeneID": [101, 101, "102|103", None],
+        "EntrezGeneSymbol": ["GA", "GA", "GB|GC", "GD"],
+        "TargetFullName": ["Protein A", "Protein A", "Complex BC", "Protein D"],
+        "Target": ["A", "A2", "BC", "D"],
+    })
+
+
+def test_normalize_identifier():
+    """Test that int, float and str gene IDs share one key."""
+    assert normalize_identifier(1415) == "1415"
+    assert normalize_identifier(1415.0) == "1415"
+    assert normalize_identifier(" 1415 ") == "1415"
+    assert normalize_identifier("3593|51561") == "3593|51561"
+
+
+def test_many_to_one(annotations):
+    """Test that several SeqIds sharing a value are all returned in order."""
+    index = IdentifierIndex(annotations)
+
+    assert index.seqids("EntrezGeneSymbol", "GA") == ["1-1", "1-2"]
+    assert index.seqids("Target", "A2") == ["1-2"]
+    assert index.seqids("Target", "Z") == []
+
+
+def test_entrez_gene_id_types(annotations):
+    """Test that gene IDs resolve whether given as str or int."""
+    index = IdentifierIndex(annotations)
+
+    assert index.seqids("EntrezGeneID", "101") == ["1-1", "1-2"]
+    assert index.seqids("EntrezGeneID", 101) == ["1-1", "1-2"]
+    assert index.symbol("EntrezGeneID", "102|103") == "GB|GC"
+
+
+def test_symbol_and_values(annotations):
+    """Test canonical symbols and distinct option values."""
+    index = IdentifierIndex(annotations)
+
+    assert index.symbol("TargetFullName", "Protein A") == "GA"
+    assert index.values("EntrezGeneID") == [101, "102|103"]
+    assert ("Target", "D") in index
+    with pytest.raises(ValueError, match="No data found"):
+        index.symbol("Target", "Z")
+    with pytest.raises(KeyError):
+        index.seqids("UniProt", "P43320")
@@ -0,0 +1,78 @@
+import json
+import pytest
+from matplotlib.figure import Figure
+import instrumentation
+from instrumentation import count, rerun_trace, span, summarize_log, summary, timed, trace_breakdown
+from plots.render import RenderCache
+
+
+@pytest.fixture
+def instrumented(tmp_path):
+    """Fixture turning instrumentation on with a log, and off again afterwards."""
+    log = tmp_path / "instrumentation.jsonl"
+    instrumentation.reset()
+    instrumentation.enable(log)
+    yield log
+    instrumentation.disable()
+    instrumentation.reset()
+
+
+def _figure():
+    fig = Figure(figsize=(1, 1))
+    fig.subplots().plot([0, 1], [0, 1])
+    return fig
+
+
+def test_disabled_is_a_no_op():
+    """Test that spans, timed functions and counters record nothing while instrumentation is off."""
+    instrumentation.disable()
+    instrumentation.reset()
+
+    @timed()
+    def double(x):
+        return 2 * x
+
+    with rerun_trace() as trace:
+        with span("get_data"):
+            assert double(2) == 4
+        count("cache.get_data.miss")
+
+    assert trace is None
+    assert summary() == {"spans": {}, "counters": {}}
+
+
+def test_rerun_trace(instrumented):
+    """Test that a rerun's trace collects its spans and counters, including renders on the plot pool."""
+    @timed("filter")
+    def double(x):
+        return 2 * x
+
+    cache = RenderCache(name="test_cache")
+    with rerun_trace(page="home") as trace:
+        with span("get_data", rows=3):
+            double(2)
+        double(3)
+        cache.get_or_render(("correlation", "3474-19", "v1"), _figure)
+        cache.get_or_render(("correlation", "3474-19", "v1"), _figure)
+
+    rows = {row["span"]: row for row in trace_breakdown(trace)}
+    assert rows["filter"]["calls"] == 2
+    assert rows["get_data"]["calls"] == rows["png_encode"]["calls"] == 1
+    assert dict(trace["counters"]) == {"test_cache.miss": 1, "test_cache.hit": 1}
+
+    records = [json.loads(line) for line in instrumented.read_text().splitlines()]
+    assert [record["type"] for record in records][-2:] == ["rerun", "summary"]
+    assert {"name": "get_data", "rows": 3, "rerun": trace["id"]}.items() <= records[1].items()
+    assert records[-2]["page"] == "home" and records[-2]["spans"] == len(trace["spans"])
+
+
+def test_percentiles(instrumented):
+    """Test the nearest-rank p50/p95 of the aggregates and of a log."""
+    for milliseconds in range(1, 101):
+        instrumentation._record("slow", float(milliseconds), {})
+
+    aggregate = summary()["spans"]["slow"]
+    assert (aggregate["count"], aggregate["p50_ms"], aggregate["p95_ms"], aggregate["max_ms"]) == (100, 51, 96, 100)
+
+    lines = instrumented.read_text().splitlines() + ['{"type": "span", "na']
+    assert summarize_log(lines) == {"slow": aggregate}
@@ -0,0 +1,74 @@
+import pytest
+import numpy as np
+import pandas as pd
+from mapped import StringIndex, StringTable, load_arrays, save_arrays
+from protein_store import ProteinStore
+
+
+@pytest.fixture
+def store():
+    """Fixture for 6 subjects in three conditions and three proteins, two sharing a gene."""
+    metadata = pd.DataFrame({
+        "SubjectID": [f"S{i}" for i in range(6)],
+        "condition": ["Healthy", "SSC_low", "SSC_high"] * 2,
+    })
+    values = np.arange(1, 19, dtype=float).reshape(6, 3)
+    values[0, 0] = np.nan
+    annotations = pd.DataFrame({
+        "SeqId": ["1-1", "1-2", "2-1"],
+        "EntrezGeneID": [101, 101, 102],
+        "EntrezGeneSymbol": ["GA", "GA", "GB"],
+        "TargetFullName": ["Protein A", "Protein A", "Protéine B"],
+        "Target": ["A", "A2", "B"],
+    })
+    return ProteinStore(values, metadata["SubjectID"], annotations, metadata)
+
+
+def test_string_table():
+    """Test indexing, slicing and locating strings, including non-ASCII and empty ones."""
+    table = StringTable.from_strings(["beta", "", "Protéine", "alpha"])
+
+    assert len(table) == 4
+    assert table[2] == "Protéine"
+    assert table[-1] == "alpha"
+    assert table[1:3] == ["", "Protéine"]
+    assert table.tolist() == ["beta", "", "Protéine", "alpha"]
+    assert table.locate([0, 5, 6]).tolist() == [0, 1, 2]
+    with pytest.raises(IndexError):
+        table[4]
+
+
+def test_string_index():
+    """Test that positions are found by binary search and unknown keys are missing."""
+    index = StringIndex(StringTable.from_strings(["3-1", "1-1", "2-1"]))
+
+    assert index["1-1"] == 1
+    assert index.get("2-1") == 2
+    assert "9-1" not in index
+    assert 3 not in index
+    with pytest.raises(KeyError):
+        index["9-1"]
+
+
+def test_store_from_mapped_arrays(store, tmp_path):
+    """Test that a store rebuilt from memory-mapped arrays answers like the one that built them."""
+    save_arrays(tmp_path, store.to_arrays())
+    arrays = load_arrays(tmp_path)
+    mapped = ProteinStore(store.values, store.sample_ids, store.annotations, store.metadata, arrays=arrays)
+
+    assert not arrays["best_positions"].flags.writeable
+    assert mapped.best_seqid("EntrezGeneSymbol", "GA") == store.best_seqid("EntrezGeneSymbol", "GA") == "1-2"
+    assert mapped.best_seqid("EntrezGeneID", 101) == "1-2"
+    assert mapped.seqids_for("Target", "A2") == ["1-2"]
+    assert mapped.index.symbol("TargetFullName", "Protéine B") == "GB"
+    assert mapped.seqid_pos["2-1"] == 2
+    pd.testing.assert_frame_equal(mapped.best_seqids, store.best_seqids)
+
+    assert [match.label for match in mapped.search.search("prot")] == [
+        match.label for match in store.search.search("prot")]
+    conditions, boxes = mapped.condition_summary.box_stats("1-1")
+    expected_conditions, expected_boxes = store.condition_summary.box_stats("1-1")
+    assert conditions == expected_conditions
+    for box, expected in zip(boxes, expected_boxes):
+        assert box["med"] == expected["med"]
+        assert box["fliers"].tolist() == expected["fliers"].tolist()
@@ -0,0 +1,47 @@
+import pandas as pd
+import pytest
+from prewarm import Prewarm
+from plots.render import render_cache
+from registry import DatasetRegistry, read_manifest
+
+
+@pytest.fixture
+def registry(cohort_files, write_manifest, tmp_path):
+    """Fixture registry of two long-format cohorts, the second without the Target column its volcano plot needs."""
+    pd.read_csv(cohort_files["volcano"]).drop(columns="Target").to_csv(tmp_path / "untargeted.csv", index=False)
+    path = write_manifest([
+        {"id": "main", "metadata": "metadata.csv", "proteins": "proteins.csv",
+         "contrasts": [{"id": "all", "title": "SSc vs Healthy", "table": "volcano.csv"}]},
+        {"id": "other", "metadata": "metadata.csv", "proteins": "proteins.csv",
+         "contrasts": [{"id": "all", "title": "SSc vs Healthy", "table": "untargeted.csv"}]},
+    ])
+    return DatasetRegistry(read_manifest(path), cache_dir=tmp_path / "cache")
+
+
+def test_prewarm(registry):
+    """Test that the stages load every cohort, keep the default one most recent and render the popular proteins."""
+    prewarm = Prewarm(registry, proteins=["GA"])
+    assert prewarm.start() is prewarm.start()
+    assert prewarm.wait(timeout=120)
+
+    status = prewarm.status()
+    assert list(status) == ["dataset:main", "volcano:main", "libraries", "plots", "dataset:other", "volcano:other"]
+    assert all(status[name]["state"] == "done" for name in list(status)[:-1])
+    assert registry.stats()["loaded"] == ["other", "main"]
+
+    _, proteins, _ = registry.cohort("main")
+    assert render_cache.get(("correlation", "1-1", proteins.version, "Protein A")) is not None
+    assert render_cache.get(("boxplot", "1-1", proteins.version, "Protein A")) is not None
+
+
+def test_failed_stage(registry):
+    """Test that a failed stage is reported and the warm-up goes on with the next ones."""
+    # With "other" as the default cohort, its volcano stage fails second of five
+    registry = DatasetRegistry(reversed(list(registry.cohorts.values())), cache_dir=registry.cache_dir)
+    prewarm = Prewarm(registry).start()
+    assert prewarm.wait(timeout=120)
+
+    status = prewarm.status()
+    assert status["volcano:other"]["state"] == "failed"
+    assert "Target" in status["volcano:other"]["error"]
+    assert [stage["state"] for stage in status.values()] == ["done", "failed", "done", "done", "done"]
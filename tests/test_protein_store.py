@@ -0,0 +1,85 @@
+import pytest
+import numpy as np
+import pandas as pd
+from protein_store import ProteinStore
+from plots.Correlation import filter_data
+
+
+@pytest.fixture
+def metadata():
+    """Fixture for metadata of three subjects."""
+    return pd.DataFrame({
+        "SubjectID": ["S1", "S2", "S3"],
+        "condition": ["Healthy", "SSC_low", "SSC_high"],
+    })
+
+
+@pytest.fixture
+def proteins():
+    """Fixture for a long-format table with two SeqIds for GA, one of which misses a sample."""
+    return pd.DataFrame({
+        "SampleId": ["S1", "S2", "S3", "S1", "S2", "S1", "S2", "S3"],
+        "SeqId": ["1-1", "1-1", "1-1", "1-2", "1-2", "2-1", "2-1", "2-1"],
+        "Intensity": [10.0, 20.0, 30.0, 500.0, 600.0, 5.0, 6.0, 7.0],
+        "mrss": [0, 10, 20, 0, 10, 0, 10, 20],
+        "TargetFullName": ["Protein A"] * 5 + ["Protein B"] * 3,
+        "EntrezGeneSymbol": ["GA"] * 5 + ["GB"] * 3,
+    })
+
+
+def test_from_long_layout(proteins, metadata):
+    """Test that the long table is pivoted into a samples x SeqId float32 matrix."""
+    store = ProteinStore.from_long(proteins, metadata)
+
+    assert store.shape == (3, 3)
+    assert store.values.dtype == np.float32
+    assert store.values.flags["F_CONTIGUOUS"]
+    assert np.isnan(store.values[store.sample_pos["S3"], store.seqid_pos["1-2"]])
+    assert list(store.annotations["SeqId"]) == ["1-1", "1-2", "2-1"]
+
+
+def test_filter_data_contract(proteins, metadata):
+    """Test that filter_data returns the same rows for the store as for the long table."""
+    store = ProteinStore.from_long(proteins, metadata)
+
+    expected_data, expected_metadata = filter_data(proteins, metadata, "GA", "EntrezGeneSymbol")
+    final_data, metadata_info = filter_data(store, metadata, "GA", "EntrezGeneSymbol")
+
+    # 1-1 covers every sample, so it wins over the brighter 1-2
+    assert list(final_data["SeqId"].unique()) == ["1-1"]
+    pd.testing.assert_frame_equal(
+        final_data[expected_data.columns].reset_index(drop=True),
+        expected_data.reset_index(drop=True),
+        check_dtype=False,
+    )
+    pd.testing.assert_frame_equal(metadata_info, expected_metadata)
+
+
+def test_filter_data_unknown_protein(proteins, metadata):
+    """Test that an unknown protein raises the same error as the long table."""
+    store = ProteinStore.from_long(proteins, metadata)
+
+    with pytest.raises(ValueError, match="No data found"):
+        filter_data(store, metadata, "GZ", "EntrezGeneSymbol")
+
+
+def test_best_seqids_table(proteins, metadata):
+    """Test that the best SeqId of every identifier is resolved at load time."""
+    store = ProteinStore.from_long(proteins, metadata)
+
+    best = store.best_seqids.loc[("EntrezGeneSymbol", "GA")]
+    assert best["SeqId"] == "1-1"
+    assert best["patient_count"] == 3
+    assert best["mean_intensity"] == pytest.approx(20.0)
+    assert store.best_seqid("TargetFullName", "Protein B") == "2-1"
+    assert store.best_seqid("EntrezGeneSymbol", "GZ") is None
+
+
+def test_min_coverage_is_configurable(proteins, metadata):
+    """Test that lowering min_coverage lets the brighter, partially covered SeqId win."""
+    store = ProteinStore.from_long(proteins, metadata, min_coverage=2)
+
+    assert store.best_seqid("EntrezGeneSymbol", "GA") == "1-2"
+
+    final_data, _ = filter_data(proteins, metadata, "GA", "EntrezGeneSymbol", min_coverage=2)
+    assert list(final_data["SeqId"].unique()) == ["1-2"]
@@ -0,0 +1,93 @@
+import json
+import threading
+import pandas as pd
+import pytest
+from registry import DatasetRegistry, default_cohorts, read_manifest
+
+
+@pytest.fixture
+def manifest(cohort_files, write_manifest, tmp_path):
+    """Fixture writing two long-format cohorts, the second with two contrast tables, and their manifest."""
+    for name, logfc in [("high", 2.0), ("lung", 3.0)]:
+        pd.DataFrame({"SeqId": ["1-1", "2-1"], "logFC": [logfc, 0.0], "P.Value": [0.01, 0.5]}).to_csv(
+            tmp_path / f"{name}.csv", index=False)
+    return write_manifest([
+        {"id": "plate1", "title": "Plate 1", "metadata": "metadata.csv", "proteins": "proteins.csv",
+         "contrasts": [{"id": "all", "title": "SSc vs Healthy", "table": "volcano.csv"}]},
+        {"id": "plate2", "metadata": "metadata.csv", "proteins": "proteins.csv",
+         "contrasts": [{"id": "high", "title": "SSc High vs Healthy", "table": "high.csv"},
+                       {"id": "lung", "title": "SSc lung fibrosis", "table": "lung.csv"}]},
+    ])
+
+
+def test_read_manifest(manifest):
+    """Test that cohorts are read in order with resolved paths, and that broken manifests are rejected."""
+    plate1, plate2 = read_manifest(manifest)
+
+    assert (plate1.id, plate1.title, plate2.title) == ("plate1", "Plate 1", "plate2")
+    assert plate2.proteins_path == str(manifest.parent / "proteins.csv")
+    assert [table.id for table in plate2.contrasts] == ["high", "lung"]
+
+    entries = json.loads(manifest.read_text())
+    entries["cohorts"][1]["contrasts"][1]["table"] = "missing.csv"
+    manifest.write_text(json.dumps(entries))
+    with pytest.raises(ValueError, match="missing.csv"):
+        read_manifest(manifest)
+
+    entries["cohorts"][1]["id"] = "plate1"
+    entries["cohorts"][1]["contrasts"].pop()
+    manifest.write_text(json.dumps(entries))
+    with pytest.raises(ValueError, match="repeated cohort id"):
+        read_manifest(manifest)
+
+
+def test_lazy_loading(manifest, tmp_path):
+    """Test that cohorts and tables load on first use only, and that the first table comes with its cohort."""
+    registry = DatasetRegistry(read_manifest(manifest), cache_dir=tmp_path / "cache")
+    assert registry.default == "plate1"
+    assert registry.stats()["loaded"] == []
+
+    metadata, store, volcano = registry.cohort("plate2")
+    assert registry.cohort("plate2")[1] is store
+    assert registry.contrast("plate2", "high") is volcano
+    assert registry.contrast("plate2", "lung")["logFC"].iloc[0] == 3.0
+    assert not store.values.flags.writeable
+
+    stats = registry.stats()
+    assert stats["loaded"] == ["plate2", "plate2/lung"]
+    assert (stats["loads"], stats["hits"]) == (2, 2)
+    with pytest.raises(KeyError):
+        registry.contrast("plate2", "all")
+
+
+def test_size_bound(manifest, tmp_path):
+    """Test that the least recently used entries are evicted beyond max_bytes, but never the one just loaded."""
+    registry = DatasetRegistry(read_manifest(manifest), max_bytes=1, cache_dir=tmp_path / "cache")
+
+    registry.cohort("plate1")
+    registry.cohort("plate2")
+    assert registry.stats()["loaded"] == ["plate2"]
+    assert registry.stats()["evictions"] == 1
+
+    registry.cohort("plate1")
+    assert registry.stats()["loads"] == 3
+
+
+def test_concurrent_first_use(manifest, tmp_path):
+    """Test that sessions asking for the same cohort at once share one load."""
+    registry = DatasetRegistry(read_manifest(manifest), cache_dir=tmp_path / "cache")
+    stores = []
+    threads = [threading.Thread(target=lambda: stores.append(registry.cohort("plate1")[1])) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert registry.stats()["loads"] == 1
+    assert all(store is stores[0] for store in stores)
+
+
+def test_without_manifest(tmp_path):
+    """Test that the registry falls back to the original dataset when there is no manifest."""
+    registry = DatasetRegistry.from_manifest(tmp_path / "datasets.json")
+    assert list(registry.cohorts.values()) == default_cohorts()
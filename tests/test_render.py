@@ -0,0 +1,109 @@
+import threading
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import pandas as pd
+from matplotlib.figure import Figure
+from plots.render import RenderCache, figure_to_png
+from plots.Correlation import plot_correlation
+from plots.boxplot import plot_boxplot
+
+
+def _figure():
+    fig = Figure(figsize=(2, 2))
+    fig.subplots().plot([0, 1], [0, 1])
+    return fig
+
+
+def test_figure_to_png_releases_figure():
+    """Test that figures are encoded as PNG and released, whether made with Figure or pyplot."""
+    fig = _figure()
+    image = figure_to_png(fig, dpi=50)
+    assert image.startswith(b"\x89PNG")
+    assert not fig.axes
+
+    pyplot_fig, _ = plt.subplots()
+    figure_to_png(pyplot_fig, dpi=50)
+    assert not plt.fignum_exists(pyplot_fig.number)
+
+
+def test_hits_and_misses():
+    """Test that a key is rendered once and then served from the cache."""
+    cache = RenderCache()
+    renders = []
+
+    def render():
+        renders.append(1)
+        return _figure()
+
+    first = cache.get_or_render(("correlation", "3474-19", "v1", "THBS1"), render)
+    second = cache.get_or_render(("correlation", "3474-19", "v1", "THBS1"), render)
+    assert first is second
+    assert len(renders) == 1
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+    # A new dataset version is a different image
+    cache.get_or_render(("correlation", "3474-19", "v2", "THBS1"), render)
+    assert len(renders) == 2
+
+
+def test_concurrent_requests_share_one_render():
+    """Test that a key requested while it is being rendered is not rendered again."""
+    cache = RenderCache()
+    started, release = threading.Event(), threading.Event()
+    renders = []
+
+    def render():
+        renders.append(1)
+        started.set()
+        release.wait(5)
+        return _figure()
+
+    first = cache.submit("key", render)
+    started.wait(5)
+    second = cache.submit("key", render)
+    release.set()
+    assert first.result() == second.result()
+    assert len(renders) == 1
+
+
+def test_lru_eviction_by_size():
+    """Test that the least recently used images are evicted once max_bytes is exceeded."""
+    cache = RenderCache(max_bytes=10)
+    cache.put("a", b"1234")
+    cache.put("b", b"1234")
+    cache.get("a")
+    cache.put("c", b"1234")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == b"1234" and cache.get("c") == b"1234"
+    assert cache.stats()["bytes"] == 8
+    assert cache.stats()["evictions"] == 1
+
+    # An image larger than the whole cache is not stored
+    cache.put("big", b"x" * 11)
+    assert cache.get("big") is None
+
+
+def test_plots_render_in_parallel_without_pyplot():
+    """Test that correlation and box plots render on worker threads without opening pyplot figures."""
+    metadata = pd.DataFrame({
+        "SubjectID": ["S1", "S2", "S3", "S4"],
+        "condition": ["Healthy", "VEDOSS", "SSC_low", "SSC_high"],
+    })
+    filtered_data = pd.DataFrame({
+        "SampleId": ["S1", "S2", "S3", "S4"],
+        "SeqId": ["1-1"] * 4,
+        "Intensity": [100.0, 200.0, 300.0, 400.0],
+        "mrss": [0, 5, 10, 20],
+    })
+    open_figures = plt.get_fignums()
+    cache = RenderCache()
+    futures = [
+        cache.submit((plot, protein), lambda plot=plot, protein=protein: plot(filtered_data, metadata, protein))
+        for plot in (plot_correlation, plot_boxplot)
+        for protein in ("A", "B", "C")
+    ]
+
+    assert all(future.result().startswith(b"\x89PNG") for future in futures)
+    assert plt.get_fignums() == open_figures
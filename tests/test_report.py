@@ -0,0 +1,44 @@
+import zipfile
+
+import pytest
+import pandas as pd
+import report
+from report import generate_report, select_seqids
+
+
+@pytest.fixture
+def dataset(monkeypatch, cohort, store):
+    """Fixture for the cohort and store fixtures with a volcano table of their three proteins."""
+    metadata, _, _ = cohort
+    volcano = pd.DataFrame({
+        "SeqId": ["1-1", "2-1", "3-1"],
+        "logFC": [1.5, -0.2, -2.0],
+        "P.Value": [0.01, 0.5, 0.001],
+        "adj.P.Val": [0.02, 0.5, 0.003],
+    })
+    monkeypatch.setattr(report, "_dataset", (metadata, store, volcano))
+    return metadata, store, volcano
+
+
+def test_select_seqids(dataset):
+    """Test selection by identifiers and by volcano thresholds, most significant first."""
+    _, store, volcano = dataset
+
+    assert select_seqids(store, volcano, proteins=["GC", "NOPE", "GA", "GC"]) == ["3-1", "1-1"]
+    assert select_seqids(store, volcano, min_logfc=1, max_p=0.05) == ["3-1", "1-1"]
+    assert select_seqids(store, volcano, max_p=0.005) == ["3-1"]
+    assert select_seqids(store, volcano) == ["3-1", "1-1", "2-1"]
+
+
+def test_generate_report(dataset, tmp_path):
+    """Test that a zip report holds both plots of every protein and the index files."""
+    _, _, volcano = dataset
+    table = generate_report(["3-1", "1-1"], volcano, tmp_path / "report.zip", "Test report", workers=2)
+
+    assert list(table["SeqId"]) == ["3-1", "1-1"]
+    assert list(table["EntrezGeneSymbol"]) == ["GC", "GA"]
+    assert list(table["logFC"]) == [-2.0, 1.5]
+    with zipfile.ZipFile(tmp_path / "report.zip") as archive:
+        names = set(archive.namelist())
+    assert {"index.csv", "index.html", "3-1_GC_correlation.png", "3-1_GC_boxplot.png",
+            "1-1_GA_correlation.png", "1-1_GA_boxplot.png"} <= names
@@ -0,0 +1,77 @@
+import pytest
+import numpy as np
+import pandas as pd
+from scipy import stats
+from protein_store import ProteinStore
+from screening import correlation_screen, numeric_columns
+
+
+@pytest.fixture
+def store():
+    """Fixture for 10 subjects and 30 proteins, the first tracking mRSS and the last missing one sample."""
+    rng = np.random.default_rng(4)
+    metadata = pd.DataFrame({
+        "SubjectID": [f"S{i}" for i in range(10)],
+        "condition": ["Healthy", "SSC_high"] * 5,
+        "Total_mRss": rng.integers(0, 40, 10),
+        "age": rng.integers(30, 80, 10),
+    })
+    values = rng.lognormal(8, 0.5, size=(10, 30))
+    values[:, 0] = 1000 + 50 * metadata["Total_mRss"] + rng.normal(0, 20, 10)
+    values[3, 29] = np.nan
+    annotations = pd.DataFrame({"SeqId": [f"{j}-1" for j in range(30)], "Target": [f"P{j}" for j in range(30)]})
+    return ProteinStore(values, metadata["SubjectID"], annotations, metadata)
+
+
+def test_matches_scipy(store):
+    """Test every statistic against scipy, for complete and incomplete SeqIds."""
+    results = correlation_screen(store).set_index("SeqId")
+    mrss = store.metadata["Total_mRss"].to_numpy(dtype=float)
+
+    for seq_id in ["0-1", "5-1", "29-1"]:
+        x = store.values[:, store.seqid_pos[seq_id]].astype(float)
+        ok = ~np.isnan(x)
+        row = results.loc[seq_id]
+        pearson = stats.pearsonr(x[ok], mrss[ok])
+        spearman = stats.spearmanr(x[ok], mrss[ok])
+        fit = stats.linregress(x[ok], mrss[ok])
+
+        assert row["n"] == ok.sum()
+        assert row["pearson_r"] == pytest.approx(pearson.statistic)
+        assert row["pearson_p"] == pytest.approx(pearson.pvalue)
+        assert row["R_squared"] == pytest.approx(pearson.statistic ** 2)
+        assert row["slope"] == pytest.approx(fit.slope)
+        assert row["intercept"] == pytest.approx(fit.intercept)
+        assert row["spearman_rho"] == pytest.approx(spearman.statistic)
+        assert row["spearman_p"] == pytest.approx(spearman.pvalue)
+
+
+def test_ranking_and_adjustment(store):
+    """Test that the table is ranked by p-value and the adjusted p-values are not smaller."""
+    results = correlation_screen(store)
+
+    assert results.loc[0, "SeqId"] == "0-1"
+    assert results["pearson_p"].is_monotonic_increasing
+    assert (results["pearson_adj_p"] >= results["pearson_p"]).all()
+    assert results.loc[0, "Target"] == "P0"
+
+
+def test_two_samples(store):
+    """Test that a SeqId observed in only two samples gets no p-value, instead of p = 0 from r = ±1."""
+    store.values[2:, 7] = np.nan
+    results = correlation_screen(store).set_index("SeqId")
+
+    row = results.loc["7-1"]
+    assert row["n"] == 2
+    assert abs(row["pearson_r"]) == pytest.approx(1)
+    assert np.isnan(row[["pearson_p", "pearson_adj_p", "spearman_p", "spearman_adj_p"]].astype(float)).all()
+    assert results.index[-1] == "7-1"
+
+
+def test_other_columns(store):
+    """Test screening another numeric column, and the columns offered for it."""
+    assert numeric_columns(store.metadata) == ["Total_mRss", "age"]
+    assert len(correlation_screen(store, "age", log2=True)) == 30
+
+    with pytest.raises(ValueError, match="not found"):
+        correlation_screen(store, "Disease_duration")
@@ -0,0 +1,65 @@
+import pytest
+import pandas as pd
+from identifiers import IdentifierIndex
+from search import SearchIndex, trigrams
+
+
+@pytest.fixture
+def search():
+    """Fixture for a search index over four proteins with all four ID types."""
+    annotations = pd.DataFrame({
+        "SeqId": ["1-1", "2-1", "3-1", "4-1"],
+        "EntrezGeneID": [7057, 7058, 7076, 3569],
+        "EntrezGeneSymbol": ["THBS1", "THBS2", "TIMP1", "IL6"],
+        "TargetFullName": ["Thrombospondin-1", "Thrombospondin-2", "Metalloproteinase inhibitor 1", "Interleukin-6"],
+        "Target": ["Thrombospondin-1", "TSP2", "TIMP-1", "IL-6"],
+    })
+    return SearchIndex(IdentifierIndex(annotations))
+
+
+def _labels(matches):
+    return [match.label for match in matches]
+
+
+def test_exact_before_prefix(search):
+    """Test that an exact match ranks before longer prefix matches, case-insensitively."""
+    matches = search.search("thbs")
+    assert _labels(matches)[:2] == ["THBS1 (EntrezGeneSymbol)", "THBS2 (EntrezGeneSymbol)"]
+    assert matches[0].kind == "prefix"
+
+    matches = search.search("il6")
+    assert matches[0].label == "IL6 (EntrezGeneSymbol)"
+    assert matches[0].kind == "exact"
+
+
+def test_all_id_types(search):
+    """Test that one query matches every reference type, each tagged with its own."""
+    assert search.search("7057")[0][:2] == (7057, "EntrezGeneID")
+    assert _labels(search.search("Thrombospondin-1"))[:2] == [
+        "Thrombospondin-1 (TargetFullName)", "Thrombospondin-1 (Target)"]
+
+
+def test_word_prefix_and_substring(search):
+    """Test that a word inside a name and a substring both match, word prefixes first."""
+    assert search.search("inhibitor")[0].label == "Metalloproteinase inhibitor 1 (TargetFullName)"
+    assert search.search("inhibitor")[0].kind == "word prefix"
+    assert search.search("spondin")[0].kind == "substring"
+
+
+def test_typo_tolerance(search):
+    """Test that a misspelled query still finds the protein through trigram similarity."""
+    matches = search.search("thrombospndin 2")
+    assert matches[0].label == "Thrombospondin-2 (TargetFullName)"
+    assert matches[0].kind == "similar"
+    assert search.search("zzzz") == []
+
+
+def test_limit(search):
+    """Test that results are cut to the requested number and an empty query returns none."""
+    assert len(search.search("t", limit=3)) == 3
+    assert search.search("  ") == []
+
+
+def test_trigrams():
+    """Test that words are padded like pg_trgm."""
+    assert trigrams("IL6") == {"  i", " il", "il6", "l6 "}
@@ -0,0 +1,103 @@
+import pytest
+import numpy as np
+import pandas as pd
+import anndata
+from scipy import sparse
+from singlecell import (
+    SingleCellAccessor, SingleCellStore, build_singlecell_store, get_singlecell_accessor,
+    get_singlecell_store, SINGLECELL_FILENAME, SINGLECELL_STORE_DIRNAME,
+)
+from plots.umap import render_umap
+from plots.violin import render_violin
+
+
+@pytest.fixture
+def h5ad_dir(tmp_path):
+    """Fixture writing a small sparse h5ad file with a UMAP and leiden clusters."""
+    rng = np.random.default_rng(0)
+    counts = sparse.random(50, 4, density=0.5, format="csr", random_state=0, dtype=np.float32)
+    adata = anndata.AnnData(
+        X=counts,
+        obs=pd.DataFrame({"leiden": pd.Categorical(rng.integers(0, 3, 50).astype(str))},
+                         index=[f"cell{i}" for i in range(50)]),
+        var=pd.DataFrame(index=["THBS1", "COL1A1", "ACTB", "GAPDH"]),
+    )
+    adata.obsm["X_umap"] = rng.normal(size=(50, 2))
+    adata.write_h5ad(tmp_path / SINGLECELL_FILENAME)
+    return tmp_path, adata
+
+
+def test_gene_vector(h5ad_dir):
+    """Test that one gene column is read from the backed file and cached."""
+    path, adata = h5ad_dir
+    accessor = SingleCellAccessor(path / SINGLECELL_FILENAME, gene_cache_size=2)
+
+    vector = accessor.gene_vector("COL1A1")
+    np.testing.assert_allclose(vector, adata.X[:, 1].toarray().ravel())
+    assert vector.dtype == np.float32
+    assert accessor.gene_vector("COL1A1") is vector
+
+    accessor.gene_vector("ACTB")
+    accessor.gene_vector("GAPDH")
+    assert list(accessor._gene_cache) == ["ACTB", "GAPDH"]
+
+    with pytest.raises(KeyError):
+        accessor.gene_vector("NOTAGENE")
+
+
+def test_plot_adata(h5ad_dir):
+    """Test that the plotting AnnData holds only the UMAP, labels and one gene."""
+    path, adata = h5ad_dir
+    plot_data = SingleCellAccessor(path / SINGLECELL_FILENAME).plot_adata("THBS1")
+
+    assert plot_data.shape == (50, 1)
+    assert list(plot_data.var_names) == ["THBS1"]
+    np.testing.assert_allclose(plot_data.obsm["X_umap"], adata.obsm["X_umap"], rtol=1e-6)
+    assert list(plot_data.obs["leiden"]) == list(adata.obs["leiden"])
+
+
+def test_accessor_is_shared(h5ad_dir):
+    """Test that the file is opened once per process."""
+    path, _ = h5ad_dir
+    assert get_singlecell_accessor(str(path)) is get_singlecell_accessor(str(path))
+
+
+@pytest.fixture
+def store_dir(h5ad_dir):
+    """Fixture building the precomputed single-cell arrays next to the h5ad file."""
+    path, adata = h5ad_dir
+    build_singlecell_store(path / SINGLECELL_FILENAME, path / SINGLECELL_STORE_DIRNAME)
+    return path, adata
+
+
+def test_store_matches_h5ad(store_dir):
+    """Test that the memory-mapped store returns the same data as the h5ad file."""
+    path, adata = store_dir
+    store = SingleCellStore(path / SINGLECELL_STORE_DIRNAME)
+
+    assert store.n_cells == 50
+    assert store.umap.dtype == np.float32
+    assert store.leiden_codes.dtype == np.int8
+    assert [store.leiden_categories[code] for code in store.leiden_codes] == list(adata.obs["leiden"])
+    for j, gene in enumerate(adata.var_names):
+        np.testing.assert_allclose(store.gene_vector(gene), adata.X[:, j].toarray().ravel())
+
+
+def test_get_singlecell_store(h5ad_dir, store_dir):
+    """Test that a missing store gives None and a built one is shared."""
+    path, _ = store_dir
+    assert get_singlecell_store(str(path / "missing")) is None
+    assert get_singlecell_store(str(path)) is get_singlecell_store(str(path))
+
+
+def test_render_from_store(store_dir):
+    """Test that the UMAP and violin renderers draw from the store."""
+    path, _ = store_dir
+    store = SingleCellStore(path / SINGLECELL_STORE_DIRNAME)
+
+    umap_figure = render_umap(store, "THBS1")
+    assert [ax.get_title() for ax in umap_figure.axes[:2]] == ["leiden", "THBS1"]
+
+    violin_figure = render_violin(store, "THBS1")
+    assert violin_figure.axes[0].get_ylabel() == "THBS1"
+    assert len(violin_figure.axes[0].collections) == len(store.leiden_categories)
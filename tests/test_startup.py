@@ -0,0 +1,17 @@
+import json
+from benchmarks.run_benchmarks import run_python
+
+# Libraries that only a plot, a contrast or the single-cell pages need
+DEFERRED_MODULES = ["seaborn", "matplotlib", "scipy.stats", "scipy.special", "scanpy", "anndata"]
+
+
+def test_app_import_defers_heavy_libraries(tmp_path):
+    """Test that importing the app, as a server's cold start does, loads no plotting, statistics or single-cell library."""
+    out = tmp_path / "modules.json"
+    run_python(
+        "import json, sys\n"
+        "import main\n"
+        f"json.dump([name for name in {DEFERRED_MODULES!r} if name in sys.modules], open({str(out)!r}, 'w'))\n"
+    )
+
+    assert json.loads(out.read_text()) == []
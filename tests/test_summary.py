@@ -0,0 +1,67 @@
+import pytest
+import numpy as np
+import pandas as pd
+from matplotlib.cbook import boxplot_stats
+from summary import ConditionSummary, order_conditions, summarize
+
+
+@pytest.fixture
+def values():
+    """Fixture for 9 samples x 40 SeqIds with outliers and missing values."""
+    rng = np.random.default_rng(5)
+    values = rng.lognormal(8, 0.4, size=(9, 40))
+    values[0, :10] *= 20
+    values[1, 5] = np.nan
+    values[:, 39] = np.nan
+    return values
+
+
+def test_summarize_matches_matplotlib(values):
+    """Test quartiles, whiskers, outliers, mean and SD against matplotlib's boxplot_stats."""
+    stats, flier_values, flier_offsets = summarize(values)
+
+    for j in range(39):
+        column = values[:, j][~np.isnan(values[:, j])]
+        expected = boxplot_stats(column)[0]
+        assert stats["n"][j] == len(column)
+        for name, expected_name in [("median", "med"), ("q1", "q1"), ("q3", "q3"),
+                                    ("whislo", "whislo"), ("whishi", "whishi"), ("mean", "mean")]:
+            assert stats[name][j] == pytest.approx(expected[expected_name])
+        assert stats["sd"][j] == pytest.approx(np.std(column, ddof=1))
+        np.testing.assert_allclose(np.sort(flier_values[flier_offsets[j]:flier_offsets[j + 1]]),
+                                   np.sort(expected["fliers"]))
+
+    assert stats["n"][39] == 0 and np.isnan(stats["median"][39])
+
+
+def test_condition_summary(values):
+    """Test the per-condition lookup used by the box plot, in display order."""
+    groups = ["SSC_high", "Healthy", "Healthy", "SSC_high", "Healthy", "SSC_high", None, "Other", "Other"]
+    summary = ConditionSummary(values, groups, [f"{j}-1" for j in range(40)])
+
+    assert summary.conditions == ["Healthy", "SSC_high", "Other"]
+    assert summary.stats["median"].dtype == np.float32
+
+    conditions, box_stats = summary.box_stats("3-1")
+    assert conditions == ["Healthy", "SSC_high", "Other"]
+    healthy = values[[1, 2, 4], 3]
+    assert box_stats[0]["med"] == pytest.approx(np.median(healthy), rel=1e-6)
+    assert box_stats[0]["label"] == "Healthy"
+
+
+def test_to_frame(values):
+    """Test that the downloadable table has one row per SeqId and condition."""
+    summary = ConditionSummary(values, ["Healthy"] * 5 + ["SSC_low"] * 4, [f"{j}-1" for j in range(40)])
+    annotations = pd.DataFrame({"SeqId": [f"{j}-1" for j in range(40)], "Target": [f"P{j}" for j in range(40)]})
+    frame = summary.to_frame(annotations)
+
+    assert len(frame) == 80
+    assert list(frame.columns[:3]) == ["SeqId", "condition", "Target"]
+    row = frame[(frame["SeqId"] == "0-1") & (frame["condition"] == "Healthy")].iloc[0]
+    assert row["Target"] == "P0"
+    assert row["outliers"] != ""
+
+
+def test_order_conditions():
+    """Test that known conditions keep the cohort order and others follow."""
+    assert order_conditions(["SSC_high", "B", "Healthy", "A"]) == ["Healthy", "SSC_high", "A", "B"]
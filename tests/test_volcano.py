@@ -0,0 +1,64 @@
+import pytest
+import numpy as np
+import pandas as pd
+from plots.volcano import (
+    VolcanoData, build_volcano_figure, update_volcano_figure,
+    INCREASE, DECREASE, NOT_SIGNIFICANT, FOLD_CHANGE_ONLY,
+)
+
+
+@pytest.fixture
+def volcano():
+    """Fixture for a volcano table with one protein in each significance category."""
+    return pd.DataFrame({
+        "logFC": [1.5, -1.0, 0.2, 0.8, 0.6],
+        "P.Value": [0.001, 0.01, 0.5, 0.2, 0.01],
+        "Target": ["Up", "Down", "Flat", "FoldOnly", "AtThreshold"],
+    })
+
+
+def test_classify_matches_boolean_masks(volcano):
+    """Test that classification by binary search matches the original .loc rules."""
+    data = VolcanoData(volcano)
+    for threshold in [0.1, 0.6, 0.7, 1.2, 2.0]:
+        expected = np.full(len(volcano), NOT_SIGNIFICANT)
+        passing = volcano["logFC"].abs() > threshold
+        significant = volcano["P.Value"] < 0.05
+        expected[passing & significant & (volcano["logFC"] > 0)] = INCREASE
+        expected[passing & significant & (volcano["logFC"] < 0)] = DECREASE
+        expected[passing & ~significant] = FOLD_CHANGE_ONLY
+        np.testing.assert_array_equal(data.classify(threshold), expected)
+
+    # |logFC| equal to the threshold does not pass, as with the strict > of the original
+    assert data.classify(0.6)[4] == NOT_SIGNIFICANT
+
+
+def test_source_is_not_mutated(volcano):
+    """Test that deriving the arrays leaves the shared DataFrame untouched."""
+    original = volcano.copy()
+    data = VolcanoData(volcano)
+    update_volcano_figure(build_volcano_figure(data, "Title"), data, 0.6, 0.8, 10)
+    pd.testing.assert_frame_equal(volcano, original)
+
+
+def test_figure_is_restyled_in_place(volcano):
+    """Test that slider updates change colours, sizes and lines but keep the trace data."""
+    data = VolcanoData(volcano)
+    fig = build_volcano_figure(data, "Title")
+    x = fig.data[0].x
+
+    update_volcano_figure(fig, data, 0.6, 0.8, 10)
+    update_volcano_figure(fig, data, 1.2, 0.5, 15)
+    assert fig.data[0].x is x
+    assert fig.data[0].type == "scattergl"
+    assert list(fig.data[0].marker.color) == [INCREASE, NOT_SIGNIFICANT, NOT_SIGNIFICANT, NOT_SIGNIFICANT, NOT_SIGNIFICANT]
+    assert fig.data[0].marker.size == 15
+    assert sorted(shape.x0 for shape in fig.layout.shapes if shape.x0 == shape.x1) == [-1.2, 1.2]
+    assert [trace.name for trace in fig.data[1:]] == ["Significant Increase", "Significant Decrease",
+                                                      "Not Significant", "Fold Change Only"]
+
+
+def test_missing_columns():
+    """Test that a table without the volcano columns is rejected."""
+    with pytest.raises(ValueError, match="missing required columns"):
+        VolcanoData(pd.DataFrame({"logFC": [1.0]}))